@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Único punto de acceso a la API interna de pypdf.
+
+EscritorStream y MotorPDF necesitan dos cosas que pypdf no ofrece en su API
+pública: los bytes codificados de un stream (StreamObject._data, para copiarlo
+sin descomprimir y volver a comprimir) y el manejador de cifrado objeto a objeto
+(pypdf._encryption, para cifrar en la misma pasada de escritura). Todo ese acceso
+pasa por aquí.
+
+Sólo se usa el manejador interno con las versiones de pypdf probadas
+(VERSIONES_PROBADAS, las mismas que requirements.txt) y si tiene los métodos
+esperados. Si no, cifrador_aes256 devuelve None y el llamador cifra el archivo
+terminado con PdfWriter.encrypt (cifrar_archivo): es otra pasada, pero con la
+API pública.
+"""
+import os
+import warnings
+
+import pypdf
+from pypdf import PdfReader, PdfWriter
+from pypdf.constants import UserAccessPermissions
+from pypdf.generic import StreamObject
+
+VERSIONES_PROBADAS = ((4, 0), (7, 0))  # [desde, hasta): pypdf>=4.0,<7.0
+
+def version_pypdf():
+    """Versión instalada de pypdf como tupla (mayor, menor)."""
+    partes = []
+    for parte in pypdf.__version__.split(".")[:2]:
+        digitos = "".join(c for c in parte if c.isdigit())
+        partes.append(int(digitos or 0))
+    return tuple(partes + [0] * (2 - len(partes)))
+
+def version_probada():
+    desde, hasta = VERSIONES_PROBADAS
+    return desde <= version_pypdf() < hasta
+
+# --- Bytes codificados de un stream ---
+def _comprobar_datos(stream):
+    if not hasattr(stream, "_data"):
+        raise RuntimeError(f"pypdf {pypdf.__version__} is not supported: "
+                           "install it with: pip install \"pypdf>=4.0,<7.0\"")
+
+def datos_codificados(stream):
+    """Bytes del stream tal como están en el archivo (sin aplicar /Filter)."""
+    _comprobar_datos(stream)
+    return stream._data
+
+def stream_codificado(datos, clase=StreamObject):
+    """Stream nuevo de la clase indicada con datos ya codificados (el llamador pone /Filter)."""
+    stream = clase()
+    _comprobar_datos(stream)
+    stream._data = datos
+    return stream
+
+# --- Cifrado AES-256 ---
+class _Cifrador:
+    """Manejador interno de pypdf: entrada /Encrypt y cifrado de cada objeto."""
+
+    def __init__(self, cifrado, usuario, propietario):
+        self._cifrado = cifrado
+        self.entrada = cifrado.write_entry(usuario, propietario)
+
+    def cifrar(self, obj, num):
+        return self._cifrado.encrypt_object(obj, num, 0)
+
+_avisado = False
+
+def cifrador_aes256(permisos, id_documento, usuario="", propietario=""):
+    """
+    Cifrador AES-256 (R=6) con el valor /P permisos y el primer /ID id_documento,
+    o None si esta versión de pypdf no lo ofrece como se espera. Lanza
+    pypdf.errors.DependencyError si falta la biblioteca criptográfica.
+    """
+    global _avisado
+    try:
+        from pypdf._encryption import EncryptAlgorithm, Encryption
+        utilizable = (version_probada() and hasattr(Encryption, "make")
+                      and hasattr(Encryption, "write_entry") and hasattr(Encryption, "encrypt_object"))
+    except ImportError:
+        utilizable = False
+    if not utilizable:
+        if not _avisado:
+            _avisado = True
+            warnings.warn(f"pypdf {pypdf.__version__} is outside the tested range; "
+                          "encrypting in a second pass", RuntimeWarning)
+        return None
+    return _Cifrador(Encryption.make(EncryptAlgorithm.AES_256, permisos, id_documento),
+                     usuario, propietario)
+
+def comprobar_cifrado():
+    """Lanza pypdf.errors.DependencyError si pypdf no puede cifrar con AES-256."""
+    PdfWriter().encrypt("", "", algorithm="AES-256")
+
+def cifrar_archivo(ruta, permisos, usuario="", propietario=""):
+    """Cifra con AES-256 el PDF ya escrito en ruta, con la API pública (PdfWriter.encrypt)."""
+    temporal = ruta + ".cif"
+    try:
+        writer = PdfWriter(clone_from=PdfReader(ruta))
+        writer.encrypt(usuario, propietario, permissions_flag=UserAccessPermissions(permisos),
+                       algorithm="AES-256")
+        with open(temporal, "wb") as f:
+            writer.write(f)
+        os.replace(temporal, ruta)
+    except BaseException:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
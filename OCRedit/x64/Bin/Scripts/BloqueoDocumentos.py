@@ -1,31 +1,288 @@
+import argparse
+import contextlib
+import glob
+import json
 import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
 import tkinter as tk
-from tkinter import filedialog, messagebox
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tkinter import filedialog, messagebox, simpledialog
 import pikepdf
 
+from Instrumentacion import Informe, contar, etapa, iniciar_registro, memoria_mb, terminar_registro
+
 # Lista de documentos aceptados
 DOCUMENTOS_ACEPTADOS = [".pdf"]
 
-def proteger_pdf(ruta_pdf, permisos_obj):
+# Permisos de pikepdf.Permissions, en el orden de la interfaz
+PERMISOS = [
+    "accessibility", "extract", "modify_annotation", "modify_assembly",
+    "modify_form", "modify_other", "print_lowres", "print_highres",
+]
+
+def permisos_desde_bloqueos(bloqueos):
+    """
+    Construye pikepdf.Permissions a partir de {permiso: True si se bloquea}.
+    Los permisos que no aparecen se bloquean (igual que el valor por defecto de la UI).
+    """
+    return pikepdf.Permissions(**{p: not bloqueos.get(p, True) for p in PERMISOS})
+
+def _permisos_efectivos(permisos_obj):
+    """
+    Permisos tal como quedan guardados con R=6: qpdf concede siempre accessibility
+    y print_highres implica print_lowres. Sirve para comparar con pdf.allow.
+    """
+    efectivos = {p: bool(getattr(permisos_obj, p)) for p in PERMISOS}
+    efectivos["accessibility"] = True
+    efectivos["print_lowres"] = efectivos["print_lowres"] or efectivos["print_highres"]
+    return efectivos
+
+def proteger_archivo(ruta_pdf, permisos_obj, omitir_iguales=True, linealizar=False):
+    """
+    Cifra ruta_pdf con AES-256 (R=6) y los permisos indicados, sin interfaz.
+    Se escribe en un temporal del mismo directorio, con fsync, y se reemplaza el
+    original con os.replace: si el proceso muere el PDF original queda intacto.
+    El temporal recibe los permisos de archivo del original (mkstemp lo crea 0600).
+    linealizar: guardarlo linealizado ("fast web view": un visor web muestra la
+    primera página sin descargar el archivo entero).
+    Devuelve "protected", o "skipped" si omitir_iguales y el archivo ya estaba
+    cifrado con R=6 y los mismos permisos (y linealizado, si se pide). Lanza la
+    excepción si falla.
+    """
+    temporal = None
+    try:
+        with etapa("leer_pdf"):
+            pdf = pikepdf.open(ruta_pdf)
+        contar("bytes_leidos", os.path.getsize(ruta_pdf))
+        with pdf:
+            if (omitir_iguales and pdf.is_encrypted and pdf.encryption.R == 6
+                    and _permisos_efectivos(pdf.allow) == _permisos_efectivos(permisos_obj)
+                    and (pdf.is_linearized or not linealizar)):
+                return "skipped"
+            fd, temporal = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(ruta_pdf)), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                # pikepdf cifra mientras escribe: no pueden medirse por separado
+                with etapa("cifrar"):
+                    pdf.save(
+                        f,
+                        encryption=pikepdf.Encryption(
+                            user="",       # No se requiere contraseña para abrir
+                            owner="",      # No se establece contraseña de propietario
+                            allow=permisos_obj,
+                            R=6            # Cifrado AES-256
+                        ),
+                        linearize=linealizar
+                    )
+                with etapa("escribir"):
+                    f.flush()
+                    os.fsync(f.fileno())
+                contar("bytes_escritos", f.tell())
+        # el original ya está cerrado: en Windows no se puede reemplazar un archivo abierto
+        with etapa("escribir"):
+            shutil.copymode(ruta_pdf, temporal)
+            os.replace(temporal, ruta_pdf)
+        temporal = None
+        return "protected"
+    finally:
+        if temporal is not None:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+
+def proteger_pdf(ruta_pdf, permisos_obj, linealizar=False):
     """
     Aplica restricciones de seguridad al PDF indicado usando el objeto pikepdf.Permissions recibido.
     """
     try:
-        with pikepdf.open(ruta_pdf, allow_overwriting_input=True) as pdf:
-            pdf.save(
-                ruta_pdf,
-                encryption=pikepdf.Encryption(
-                    user="",       # No se requiere contraseña para abrir
-                    owner="",      # No se establece contraseña de propietario
-                    allow=permisos_obj,
-                    R=6            # Cifrado AES-256
-                )
-            )
+        proteger_archivo(ruta_pdf, permisos_obj, omitir_iguales=False, linealizar=linealizar)
         messagebox.showinfo("Finish", "✅ File is protected.")
     except Exception as e:
         messagebox.showerror("Error", f"❌ Can't file protect:\n{e}")
 
-def seleccionar_archivo(vars_permisos):
+# --- Protección por lotes ---
+def expandir_entradas(entradas, recursivo=False):
+    """
+    Convierte carpetas, patrones glob y archivos en la lista de PDF a proteger,
+    sin duplicados y en orden. Las carpetas se recorren con os.scandir.
+    """
+    rutas = []
+    vistos = set()
+
+    def agregar(ruta):
+        clave = os.path.normcase(os.path.abspath(ruta))
+        if clave not in vistos and os.path.splitext(ruta)[1].lower() in DOCUMENTOS_ACEPTADOS:
+            vistos.add(clave)
+            rutas.append(ruta)
+
+    def recorrer(carpeta):
+        with os.scandir(carpeta) as iterador:
+            entradas = sorted(iterador, key=lambda e: e.name)
+        for e in entradas:
+            if e.is_dir():
+                if recursivo:
+                    recorrer(e.path)
+            elif e.is_file():
+                agregar(e.path)
+
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            recorrer(entrada)
+        elif glob.has_magic(entrada):
+            for ruta in sorted(glob.glob(entrada, recursive=True)):
+                if os.path.isfile(ruta):
+                    agregar(ruta)
+        else:
+            agregar(entrada)
+    return rutas
+
+def _proteger_en_proceso(ruta_pdf, bloqueos, medir=False, linealizar=False):
+    """
+    Trabajo de un proceso del pool: devuelve (ruta, estado, mensaje, medidas).
+    medidas es el registro de etapas y contadores con los segundos, o None si no se mide.
+    """
+    if medir:
+        iniciar_registro()
+    inicio = time.perf_counter()
+    try:
+        estado, mensaje = proteger_archivo(ruta_pdf, permisos_desde_bloqueos(bloqueos),
+                                           linealizar=linealizar), ""
+    except Exception as e:
+        estado, mensaje = "failed", str(e)
+    registro = terminar_registro() if medir else None
+    medidas = None
+    if registro is not None:
+        medidas = dict(registro.a_dict(), segundos=time.perf_counter() - inicio, rss_mb=memoria_mb())
+    return ruta_pdf, estado, mensaje, medidas
+
+def proteger_lote(rutas, bloqueos, procesos=0, progreso=None, informe=None, linealizar=False):
+    """
+    Protege todas las rutas en un pool de procesos (0 = todos los núcleos; con 1 se
+    trabaja en este proceso, y así el perfil del informe incluye la protección).
+    bloqueos: {permiso: True si se bloquea}. progreso(hechos, total) opcional.
+    informe: Instrumentacion.Informe opcional, recibe una entrada por archivo.
+    linealizar: guardar cada PDF linealizado (ver proteger_archivo).
+    Devuelve la lista de (ruta, estado, mensaje) en el orden de rutas, con estado
+    "protected", "skipped" o "failed".
+    """
+    procesos = procesos or os.cpu_count() or 1
+    medir = informe is not None
+    resultados = {}
+
+    def recoger(hechos, resultado):
+        ruta, estado, mensaje, medidas = resultado
+        resultados[ruta] = (ruta, estado, mensaje)
+        if informe is not None:
+            informe.registrar(ruta, medidas, (medidas or {}).get("segundos", 0.0), estado=estado,
+                              error=mensaje or None)
+        if progreso is not None:
+            progreso(hechos, len(rutas))
+
+    if procesos == 1:
+        for hechos, ruta in enumerate(rutas, start=1):
+            recoger(hechos, _proteger_en_proceso(ruta, bloqueos, medir, linealizar))
+    else:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            futuros = {pool.submit(_proteger_en_proceso, ruta, bloqueos, medir, linealizar): ruta
+                       for ruta in rutas}
+            for hechos, futuro in enumerate(as_completed(futuros), start=1):
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    # p. ej. BrokenProcessPool si un proceso muere: su archivo cuenta como fallido
+                    resultado = (futuros[futuro], "failed", str(e) or type(e).__name__, None)
+                recoger(hechos, resultado)
+    return [resultados[ruta] for ruta in rutas]
+
+def resumen_lote(resultados):
+    """Resumen del lote: cuentas por estado y la lista de fallos."""
+    resumen = {"total": len(resultados), "protected": 0, "skipped": 0, "failed": 0, "errors": []}
+    for ruta, estado, mensaje in resultados:
+        resumen[estado] += 1
+        if estado == "failed":
+            resumen["errors"].append({"file": ruta, "error": mensaje})
+    return resumen
+
+def texto_resumen(resumen):
+    msg = (f"Files: {resumen['total']}\n"
+           f"Protected: {resumen['protected']}\n"
+           f"Skipped (already protected): {resumen['skipped']}\n"
+           f"Failed: {resumen['failed']}\n")
+    for err in resumen["errors"][:10]:
+        msg += f"\n{err['file']}\n{err['error']}\n"
+    if len(resumen["errors"]) > 10:
+        msg += f"...y {len(resumen['errors'])-10} más.\n"
+    return msg
+
+def bloqueos_desde_ui(vars_permisos):
+    return {p: vars_permisos[p].get() for p in PERMISOS}
+
+def proteger_carpeta(ventana, vars_permisos, estado_var, linealizar_var):
+    """Protege todos los PDF de una carpeta (y subcarpetas)."""
+    carpeta = filedialog.askdirectory(title="Select folder")
+    if not carpeta:
+        return
+    proteger_entradas(ventana, [carpeta], vars_permisos, estado_var, linealizar_var)
+
+def proteger_patron(ventana, vars_permisos, estado_var, linealizar_var):
+    """Protege los PDF de las carpetas y patrones glob que escribe el usuario (separados por ;)."""
+    texto = simpledialog.askstring(
+        "Batch", "Folders or glob patterns, separated by ;\n(e.g. C:\\Docs\\**\\*.pdf)", parent=ventana)
+    if not texto:
+        return
+    entradas = [e.strip() for e in texto.split(";") if e.strip()]
+    proteger_entradas(ventana, entradas, vars_permisos, estado_var, linealizar_var)
+
+def proteger_entradas(ventana, entradas, vars_permisos, estado_var, linealizar_var):
+    """
+    Protege los PDF de entradas (carpetas con sus subcarpetas, patrones glob o
+    archivos; ver expandir_entradas) en segundo plano y muestra un único resumen
+    al terminar.
+    """
+    rutas = expandir_entradas(entradas, recursivo=True)
+    if not rutas:
+        messagebox.showinfo("Info", f"No documents {', '.join(DOCUMENTOS_ACEPTADOS)} found.")
+        return
+
+    bloqueos = bloqueos_desde_ui(vars_permisos)
+    linealizar = linealizar_var.get()
+    eventos = queue.Queue()
+
+    def trabajo():
+        try:
+            resultados = proteger_lote(rutas, bloqueos, progreso=lambda h, t: eventos.put(("progreso", h, t)),
+                                       linealizar=linealizar)
+            eventos.put(("fin", resumen_lote(resultados)))
+        except Exception as e:
+            eventos.put(("error", str(e)))
+
+    def revisar():
+        try:
+            while True:
+                evento = eventos.get_nowait()
+                if evento[0] == "progreso":
+                    estado_var.set(f"Protecting {evento[1]}/{evento[2]}...")
+                    continue
+                estado_var.set("")
+                if evento[0] == "fin":
+                    messagebox.showinfo("Finish", texto_resumen(evento[1]))
+                else:
+                    messagebox.showerror("Error", f"❌ Can't file protect:\n{evento[1]}")
+                return
+        except queue.Empty:
+            pass
+        ventana.after(200, revisar)
+
+    estado_var.set(f"Protecting 0/{len(rutas)}...")
+    threading.Thread(target=trabajo, daemon=True).start()
+    ventana.after(200, revisar)
+
+def seleccionar_archivo(vars_permisos, linealizar_var):
     """
     Abre un cuadro de diálogo para seleccionar el archivo PDF y aplica los permisos seleccionados.
     """
@@ -43,24 +300,15 @@ def seleccionar_archivo(vars_permisos):
         return
 
     # Construir objeto pikepdf.Permissions a partir de las variables (True = bloquear en UI)
-    permisos = pikepdf.Permissions(
-        accessibility=not vars_permisos["accessibility"].get(),
-        extract=not vars_permisos["extract"].get(),
-        modify_annotation=not vars_permisos["modify_annotation"].get(),
-        modify_assembly=not vars_permisos["modify_assembly"].get(),
-        modify_form=not vars_permisos["modify_form"].get(),
-        modify_other=not vars_permisos["modify_other"].get(),
-        print_lowres=not vars_permisos["print_lowres"].get(),
-        print_highres=not vars_permisos["print_highres"].get()
-    )
+    permisos = permisos_desde_bloqueos(bloqueos_desde_ui(vars_permisos))
 
-    proteger_pdf(ruta_pdf, permisos)
+    proteger_pdf(ruta_pdf, permisos, linealizar=linealizar_var.get())
 
-def main():
+def interfaz():
     # Crear ventana principal
     ventana = tk.Tk()
     ventana.title("RCO Blockdf")
-    ventana.geometry("420x420")
+    ventana.geometry("420x570")
     ventana.resizable(False, False)
 
     # Etiqueta principal
@@ -93,9 +341,21 @@ def main():
     tk.Checkbutton(frame_permisos, text="Print lowres", variable=vars_permisos["print_lowres"], anchor="w", justify="left").pack(fill="x", pady=2)
     tk.Checkbutton(frame_permisos, text="Print highres", variable=vars_permisos["print_highres"], anchor="w", justify="left").pack(fill="x", pady=2)
 
+    # Guardar linealizado (fast web view) al reescribir el PDF
+    linealizar_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(ventana, text="Fast web view (linearized)", variable=linealizar_var).pack(pady=(8,0))
+
     # Botón para seleccionar archivo y aplicar permisos
-    boton = tk.Button(ventana, text="Select file", command=lambda: seleccionar_archivo(vars_permisos), font=("Arial", 10), bg="#4CAF50", fg="white")
-    boton.pack(pady=14)
+    boton = tk.Button(ventana, text="Select file", command=lambda: seleccionar_archivo(vars_permisos, linealizar_var), font=("Arial", 10), bg="#4CAF50", fg="white")
+    boton.pack(pady=(8,4))
+
+    # Botón para proteger todos los PDF de una carpeta
+    estado_var = tk.StringVar()
+    boton_carpeta = tk.Button(ventana, text="Select folder (batch)", command=lambda: proteger_carpeta(ventana, vars_permisos, estado_var, linealizar_var), font=("Arial", 10), bg="#2196F3", fg="white")
+    boton_carpeta.pack(pady=4)
+    boton_patron = tk.Button(ventana, text="Folders or patterns (batch)", command=lambda: proteger_patron(ventana, vars_permisos, estado_var, linealizar_var), font=("Arial", 10), bg="#2196F3", fg="white")
+    boton_patron.pack(pady=4)
+    tk.Label(ventana, textvariable=estado_var, font=("Arial", 9)).pack()
 
     # Texto con formatos aceptados
     formatos = tk.Label(ventana, text=f"Documents: {', '.join(DOCUMENTOS_ACEPTADOS)}", font=("Arial", 10))
@@ -112,8 +372,58 @@ def main():
 
     ventana.mainloop()
 
+# --- Línea de comandos ---
+def main(argv=None):
+    """Sin argumentos abre la interfaz; con carpetas, globs o archivos protege por lotes."""
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv:
+        interfaz()
+        return 0
+
+    parser = argparse.ArgumentParser(
+        description="Protect PDF documents in batch (AES-256). All permissions are blocked unless allowed."
+    )
+    parser.add_argument("entradas", nargs="+", help="PDF files, folders or glob patterns")
+    parser.add_argument("-r", "--recursivo", action="store_true", help="include sub-folders")
+    parser.add_argument("--permitir", action="append", default=[], choices=PERMISOS,
+                        help="permission to allow (repeatable)")
+    parser.add_argument("-j", "--procesos", type=int, default=0,
+                        help="parallel processes (0 = all cores)")
+    parser.add_argument("--linealizar", action="store_true",
+                        help="save linearized (fast web view: page 1 shows before the download ends)")
+    parser.add_argument("--informe", help="write the summary report as JSON to this file")
+    parser.add_argument("--metricas", metavar="JSONL",
+                        help="write per-file stage timings, bytes and memory as JSON lines")
+    parser.add_argument("--perfil", metavar="PROF",
+                        help="profile the job with cProfile into this file (use -j 1 to include the workers' work)")
+    args = parser.parse_args(argv)
+
+    rutas = expandir_entradas(args.entradas, recursivo=args.recursivo)
+    if not rutas:
+        print(f"Error: no documents {', '.join(DOCUMENTOS_ACEPTADOS)} found.", file=sys.stderr)
+        return 2
+
+    bloqueos = {p: p not in args.permitir for p in PERMISOS}
+    medicion = contextlib.nullcontext()
+    if args.metricas or args.perfil:
+        medicion = Informe(args.metricas, "proteger", {
+            "entradas": len(rutas), "procesos": args.procesos, "permitidos": args.permitir,
+            "linealizar": args.linealizar,
+        }, perfil=args.perfil)
+    with medicion as informe:
+        resultados = proteger_lote(rutas, bloqueos, procesos=args.procesos, informe=informe,
+                                   linealizar=args.linealizar)
+    resumen = resumen_lote(resultados)
+    print(texto_resumen(resumen))
+    if args.informe:
+        resumen["files"] = [{"file": r, "status": e, "error": m} for r, e, m in resultados]
+        with open(args.informe, "w", encoding="utf-8") as f:
+            json.dump(resumen, f, indent=2, ensure_ascii=False)
+    return 1 if resumen["failed"] else 0
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
 
 #Copyright (c) - Erik Alejandro García Aparcio. 
 
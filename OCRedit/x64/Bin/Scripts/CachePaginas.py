@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Caché en disco de páginas convertidas, direccionada por contenido.
+
+Cada entrada es el PDF de una página que produce MotorPDF.convertir_imagen y se
+guarda bajo una clave calculada con la identidad del archivo (ruta, tamaño y
+mtime, o el hash del contenido) y los parámetros de conversión. Volver a
+ejecutar un proyecto sólo convierte las imágenes que cambiaron.
+
+Es segura entre ejecuciones concurrentes: las escrituras van a un temporal en el
+mismo directorio y se publican con os.replace (atómico), y la expulsión LRU
+tolera que otro proceso haya borrado el archivo antes.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+VERSION_CACHE = 1  # cambiar si cambia el formato de las páginas generadas
+
+class CacheDisco:
+    """
+    Caché LRU en disco con límite de tamaño. Las entradas se reparten en
+    subdirectorios por los dos primeros caracteres de la clave.
+    """
+
+    def __init__(self, directorio, limite_mb=1024, por_hash=False, extension=".pdf"):
+        self.directorio = directorio
+        self.limite_bytes = int(limite_mb * 1024 * 1024)
+        self.por_hash = por_hash
+        self.extension = extension
+        self.aciertos = 0
+        self.fallos = 0
+        self._escrituras = 0
+        os.makedirs(directorio, exist_ok=True)
+
+    # --- Claves ---
+    def identidad(self, ruta):
+        """Identidad del archivo: hash del contenido, o (ruta, tamaño, mtime)."""
+        st = os.stat(ruta)
+        if self.por_hash:
+            h = hashlib.sha256()
+            with open(ruta, "rb") as f:
+                for bloque in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(bloque)
+            return ["sha256", h.hexdigest(), st.st_size]
+        return ["stat", os.path.abspath(ruta), st.st_size, st.st_mtime_ns]
+
+    def clave(self, ruta, parametros):
+        """Clave de la entrada para 'ruta' convertida con 'parametros' (dict serializable)."""
+        datos = json.dumps(
+            [VERSION_CACHE, self.identidad(ruta), parametros],
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(datos.encode("utf-8")).hexdigest()
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, clave[:2], clave + self.extension)
+
+    # --- Lectura / escritura ---
+    def obtener(self, clave):
+        """Devuelve los bytes guardados o None. Un acierto renueva la entrada (LRU)."""
+        ruta = self._ruta(clave)
+        try:
+            with open(ruta, "rb") as f:
+                datos = f.read()
+        except OSError:
+            self.fallos += 1
+            return None
+        try:
+            os.utime(ruta, None)
+        except OSError:
+            pass
+        self.aciertos += 1
+        return datos
+
+    def guardar(self, clave, datos):
+        """Guarda los bytes de forma atómica. Los errores de disco no interrumpen el trabajo."""
+        ruta = self._ruta(clave)
+        try:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            fd, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(datos)
+                os.replace(temporal, ruta)
+            except BaseException:
+                try:
+                    os.remove(temporal)
+                except OSError:
+                    pass
+                raise
+        except OSError:
+            return
+        self._escrituras += 1
+        if self._escrituras % 32 == 0:
+            self.limpiar()
+
+    # --- Expulsión LRU ---
+    def limpiar(self):
+        """Borra las entradas menos usadas hasta quedar por debajo del límite."""
+        entradas = []
+        total = 0
+        for sub in os.scandir(self.directorio):
+            if not sub.is_dir():
+                continue
+            for e in os.scandir(sub.path):
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                if e.name.endswith(".tmp"):
+                    # temporales huérfanos de procesos que murieron a mitad
+                    if time.time() - st.st_mtime > 3600:
+                        _borrar(e.path)
+                    continue
+                entradas.append((st.st_mtime, st.st_size, e.path))
+                total += st.st_size
+        if total <= self.limite_bytes:
+            return
+        entradas.sort()
+        for _, tamano, ruta in entradas:
+            if total <= self.limite_bytes:
+                break
+            if _borrar(ruta):
+                total -= tamano
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+        return True
+    except OSError:
+        return False
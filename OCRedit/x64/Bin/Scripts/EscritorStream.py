@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Escritor de PDF en streaming para trabajos muy grandes.
+
+PdfWriter mantiene en memoria todas las páginas (y sus imágenes) hasta el
+writer.write final, por lo que la memoria crece con el número de páginas.
+EscritorStream copia cada página a disco en cuanto se agrega: sólo guarda en
+memoria los offsets de la tabla xref y la lista de números de página.
+
+Los streams idénticos (fuentes, imágenes, perfiles ICC...) se escriben una sola
+vez aunque vengan de páginas o documentos distintos. Con compactar=True además
+se agrupan los objetos que no son streams en object streams comprimidos con
+Flate, con tabla xref en stream (PDF 1.5).
+
+Lo que pypdf no ofrece en su API pública (bytes codificados de un stream,
+cifrado objeto a objeto) se usa a través de AdaptadorPypdf.
+"""
+import hashlib
+import io
+import os
+import zlib
+
+from pypdf.generic import (
+    ArrayObject, ByteStringObject, DecodedStreamObject, DictionaryObject, IndirectObject,
+    NameObject, NullObject, NumberObject, StreamObject,
+)
+
+from AdaptadorPypdf import (
+    cifrador_aes256, cifrar_archivo, comprobar_cifrado, datos_codificados, stream_codificado,
+)
+from Instrumentacion import etapa
+
+OBJETOS_POR_LOTE = 100  # objetos por object stream
+PROFUNDIDAD_MAX = 32    # nivel máximo de copia anticipada bajo un stream compartido
+
+class EscritorStream:
+    """
+    Escribe un PDF objeto a objeto. Uso:
+
+        escritor = EscritorStream(ruta)
+        for page in reader.pages:
+            escritor.agregar_pagina(page)
+        escritor.cerrar()
+
+    Los objetos referenciados por una página (fuentes, imágenes...) se copian una
+    sola vez por documento de origen; al cambiar de documento se olvida la tabla
+    de equivalencias para que la memoria no crezca.
+
+    Los streams se copian en cuanto se referencian (junto con los objetos de los
+    que dependen) y se identifican por el hash de sus bytes ya renumerados: un
+    stream idéntico a uno ya escrito, de cualquier documento, reutiliza su número.
+    compartidos y bytes_ahorrados cuentan lo que se evitó.
+    """
+
+    def __init__(self, ruta, compactar=False):
+        self.ruta = ruta
+        self.compactar = compactar
+        self._f = open(ruta, "wb")
+        self._f.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+        self._offsets = {}
+        self._siguiente = 3  # 1 = catálogo, 2 = árbol de páginas (se escriben al cerrar)
+        self._paginas = []
+        self._origen = None
+        self._mapa = {}
+        self._pendientes = []
+        self._cifrado = None
+        self._cifrar_al_cerrar = None  # (permisos, usuario, propietario) sin cifrador interno
+        self._num_encrypt = None
+        self._id = None
+        self._compartidos = {}   # huella -> número en la salida (entre documentos)
+        self._en_curso = {}      # referencias en copia anticipada -> número reservado o None
+        self._profundidad = 0
+        self._lote = []          # (número, bytes) pendientes del object stream actual
+        self._comprimidos = {}   # número -> (número del object stream, índice)
+        self.compartidos = 0
+        self.bytes_ahorrados = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        if tipo is None:
+            self.cerrar()
+        else:
+            self.abortar()
+        return False
+
+    @property
+    def num_paginas(self):
+        return len(self._paginas)
+
+    @property
+    def bytes_escritos(self):
+        """Bytes escritos hasta ahora (los objetos del object stream en curso aún no)."""
+        return self._f.tell()
+
+    def _reservar(self):
+        num = self._siguiente
+        self._siguiente += 1
+        return num
+
+    def cifrar(self, permisos, usuario="", propietario=""):
+        """
+        Cifra con AES-256 (R=6) todo lo que se escriba a partir de ahora, en la misma
+        pasada de escritura. permisos es el valor /P. Debe llamarse antes de agregar
+        páginas. Usa el manejador de cifrado de pypdf (requiere cryptography o
+        pycryptodome); si esta versión de pypdf no lo ofrece, el archivo se cifra al
+        cerrar con PdfWriter.encrypt (ver AdaptadorPypdf).
+        """
+        if self._paginas:
+            raise RuntimeError("Encryption must be set before adding pages")
+        self._id = ByteStringObject(os.urandom(16))
+        cifrado = cifrador_aes256(permisos, self._id, usuario, propietario)
+        if cifrado is None:
+            comprobar_cifrado()
+            self._cifrar_al_cerrar = (permisos, usuario, propietario)
+            return
+        self._num_encrypt = self._reservar()
+        self._escribir(self._num_encrypt, cifrado.entrada)
+        self._cifrado = cifrado
+
+    def _escribir(self, num, obj):
+        if self.compactar and not isinstance(obj, StreamObject) and num != self._num_encrypt:
+            # Va al object stream actual; se cifra con él, no objeto a objeto
+            buf = io.BytesIO()
+            obj.write_to_stream(buf)
+            self._lote.append((num, buf.getvalue()))
+            if len(self._lote) >= OBJETOS_POR_LOTE:
+                self._vaciar_lote()
+            return
+        if self._cifrado is not None:
+            with etapa("cifrar"):
+                obj = self._cifrado.cifrar(obj, num)
+        self._offsets[num] = self._f.tell()
+        self._f.write(f"{num} 0 obj\n".encode("ascii"))
+        obj.write_to_stream(self._f)
+        self._f.write(b"\nendobj\n")
+
+    def _vaciar_lote(self):
+        """Escribe los objetos acumulados como un object stream (/Type /ObjStm)."""
+        if not self._lote:
+            return
+        num_lote = self._reservar()
+        cabecera = []
+        cuerpo = io.BytesIO()
+        for indice, (num, datos) in enumerate(self._lote):
+            cabecera.append(f"{num} {cuerpo.tell()}")
+            cuerpo.write(datos)
+            cuerpo.write(b"\n")
+            self._comprimidos[num] = (num_lote, indice)
+        cabecera = (" ".join(cabecera) + "\n").encode("ascii")
+        lote = stream_codificado(zlib.compress(cabecera + cuerpo.getvalue(), 6))
+        lote[NameObject("/Type")] = NameObject("/ObjStm")
+        lote[NameObject("/N")] = NumberObject(len(self._lote))
+        lote[NameObject("/First")] = NumberObject(len(cabecera))
+        lote[NameObject("/Filter")] = NameObject("/FlateDecode")
+        self._lote = []
+        self._escribir(num_lote, lote)
+
+    def _referencia(self, ref):
+        """Número nuevo para una referencia del documento de origen (se copia después)."""
+        clave = (ref.idnum, ref.generation)
+        num = self._mapa.get(clave)
+        if num is None:
+            if clave in self._en_curso:
+                # Ciclo bajo una copia anticipada: el objeto se escribirá con este número
+                num = self._en_curso[clave]
+                if num is None:
+                    num = self._en_curso[clave] = self._reservar()
+                return IndirectObject(num, 0, None)
+            destino = ref.get_object()
+            if isinstance(destino, DictionaryObject) and destino.get("/Type") == "/Page":
+                # Otras páginas (p. ej. destinos de enlaces) no se arrastran a la salida
+                return NullObject()
+            if isinstance(destino, StreamObject) or 0 < self._profundidad < PROFUNDIDAD_MAX:
+                num = self._compartir(clave, destino)
+            else:
+                num = self._reservar()
+                self._pendientes.append((num, destino))
+            self._mapa[clave] = num
+        return IndirectObject(num, 0, None)
+
+    def _compartir(self, clave, destino):
+        """
+        Copia ya el objeto (y lo que referencia) y lo escribe, salvo que uno idéntico
+        esté escrito: entonces devuelve el número de ese.
+        """
+        self._en_curso[clave] = None
+        self._profundidad += 1
+        try:
+            copia = self._copiar_indirecto(destino)
+        finally:
+            self._profundidad -= 1
+            reservado = self._en_curso.pop(clave)
+        if reservado is not None:
+            # Se referencia a sí mismo a través de otros objetos: no se comparte
+            self._escribir(reservado, copia)
+            return reservado
+        buf = io.BytesIO()
+        copia.write_to_stream(buf)
+        huella = hashlib.sha256(buf.getvalue()).digest()
+        num = self._compartidos.get(huella)
+        if num is not None:
+            self.compartidos += 1
+            self.bytes_ahorrados += buf.tell()
+            return num
+        num = self._reservar()
+        self._escribir(num, copia)
+        self._compartidos[huella] = num
+        return num
+
+    def _copiar(self, obj):
+        """Copia un objeto directo cambiando sus referencias por las de la salida."""
+        if isinstance(obj, IndirectObject):
+            return self._referencia(obj)
+        if isinstance(obj, StreamObject):
+            # Los streams deben ser indirectos; uno directo (p. ej. el contenido
+            # creado por add_transformation) se escribe como objeto propio.
+            num = self._reservar()
+            self._pendientes.append((num, obj))
+            return IndirectObject(num, 0, None)
+        if isinstance(obj, DictionaryObject):
+            copia = DictionaryObject()
+            for clave, valor in obj.items():
+                copia[NameObject(clave)] = self._copiar(valor)
+            return copia
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._copiar(v) for v in obj)
+        return obj
+
+    def _copiar_indirecto(self, obj):
+        """Copia el objeto que ocupa un número propio; los streams conservan sus datos codificados."""
+        if isinstance(obj, DecodedStreamObject):
+            # Stream creado o modificado en memoria (p. ej. contenido de add_transformation):
+            # get_data() lo serializa y se comprime con Flate al copiarlo.
+            copia = stream_codificado(zlib.compress(obj.get_data(), 6))
+            for clave, valor in obj.items():
+                if clave not in ("/Length", "/Filter", "/DecodeParms"):
+                    copia[NameObject(clave)] = self._copiar(valor)
+            copia[NameObject("/Filter")] = NameObject("/FlateDecode")
+            return copia
+        if isinstance(obj, StreamObject):
+            copia = stream_codificado(datos_codificados(obj))
+            for clave, valor in obj.items():
+                if clave != "/Length":
+                    copia[NameObject(clave)] = self._copiar(valor)
+            return copia
+        return self._copiar(obj)
+
+    def _vaciar_pendientes(self):
+        while self._pendientes:
+            num, obj = self._pendientes.pop()
+            self._escribir(num, self._copiar_indirecto(obj))
+
+    def agregar_pagina(self, page):
+        """Copia la página (de cualquier PdfReader) y todo lo que referencia al archivo."""
+        origen = page.indirect_reference.pdf if page.indirect_reference is not None else None
+        if origen is not self._origen:
+            self._origen = origen
+            self._mapa = {}
+
+        num = self._reservar()
+        if page.indirect_reference is not None:
+            self._mapa[(page.indirect_reference.idnum, page.indirect_reference.generation)] = num
+
+        copia = DictionaryObject()
+        for clave, valor in page.items():
+            if clave != "/Parent":
+                copia[NameObject(clave)] = self._copiar(valor)
+        copia[NameObject("/Parent")] = IndirectObject(2, 0, None)
+        self._escribir(num, copia)
+        self._vaciar_pendientes()
+        self._paginas.append(num)
+
+    def cerrar(self):
+        """Escribe el árbol de páginas, el catálogo, la tabla xref y cierra el archivo."""
+        paginas = DictionaryObject({
+            NameObject("/Type"): NameObject("/Pages"),
+            NameObject("/Kids"): ArrayObject(IndirectObject(n, 0, None) for n in self._paginas),
+            NameObject("/Count"): NumberObject(len(self._paginas)),
+        })
+        self._escribir(2, paginas)
+        catalogo = DictionaryObject({
+            NameObject("/Type"): NameObject("/Catalog"),
+            NameObject("/Pages"): IndirectObject(2, 0, None),
+        })
+        self._escribir(1, catalogo)
+        if self.compactar:
+            self._vaciar_lote()
+            self._escribir_xref_stream()
+        else:
+            self._escribir_xref()
+        self._f.close()
+        if self._cifrar_al_cerrar is not None:
+            with etapa("cifrar"):
+                cifrar_archivo(self.ruta, *self._cifrar_al_cerrar)
+
+    def _escribir_xref(self):
+        """Tabla xref clásica y trailer."""
+        xref = self._f.tell()
+        total = self._siguiente
+        self._f.write(f"xref\n0 {total}\n0000000000 65535 f \n".encode("ascii"))
+        for num in range(1, total):
+            off = self._offsets.get(num)
+            if off is None:
+                self._f.write(b"0000000000 65535 f \n")
+            else:
+                self._f.write(f"{off:010d} 00000 n \n".encode("ascii"))
+        extra = ""
+        if self._cifrado is not None:
+            hex_id = self._id.hex()
+            extra = f" /Encrypt {self._num_encrypt} 0 R /ID [<{hex_id}> <{hex_id}>]"
+        self._f.write(f"trailer\n<< /Size {total} /Root 1 0 R{extra} >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii"))
+
+    def _escribir_xref_stream(self):
+        """Tabla xref como stream (necesaria para referenciar objetos comprimidos)."""
+        num_xref = self._reservar()
+        xref = self._f.tell()
+        self._offsets[num_xref] = xref
+        total = self._siguiente
+        ancho = max(4, (xref.bit_length() + 7) // 8)
+        libre = b"\x00" + (0).to_bytes(ancho, "big") + (65535).to_bytes(2, "big")
+        filas = io.BytesIO()
+        filas.write(libre)
+        for num in range(1, total):
+            if num in self._comprimidos:
+                lote, indice = self._comprimidos[num]
+                filas.write(b"\x02" + lote.to_bytes(ancho, "big") + indice.to_bytes(2, "big"))
+            elif num in self._offsets:
+                filas.write(b"\x01" + self._offsets[num].to_bytes(ancho, "big") + b"\x00\x00")
+            else:
+                filas.write(libre)
+        tabla = stream_codificado(zlib.compress(filas.getvalue(), 6))
+        tabla[NameObject("/Type")] = NameObject("/XRef")
+        tabla[NameObject("/Size")] = NumberObject(total)
+        tabla[NameObject("/W")] = ArrayObject(NumberObject(n) for n in (1, ancho, 2))
+        tabla[NameObject("/Root")] = IndirectObject(1, 0, None)
+        tabla[NameObject("/Filter")] = NameObject("/FlateDecode")
+        if self._cifrado is not None:
+            tabla[NameObject("/Encrypt")] = IndirectObject(self._num_encrypt, 0, None)
+            tabla[NameObject("/ID")] = ArrayObject([self._id, self._id])
+        # La tabla xref nunca se cifra
+        self._f.write(f"{num_xref} 0 obj\n".encode("ascii"))
+        tabla.write_to_stream(self._f)
+        self._f.write(f"\nendobj\nstartxref\n{xref}\n%%EOF\n".encode("ascii"))
+
+    def abortar(self):
+        """Cierra el archivo sin completarlo (el llamador decide si lo borra)."""
+        try:
+            self._f.close()
+        except Exception:
+            pass
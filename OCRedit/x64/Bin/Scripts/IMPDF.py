@@ -1,41 +1,33 @@
 #!/usr/bin/env python3
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from PIL import Image
+import contextlib
 import os
-import io
-
-try:
-    from pypdf import PdfReader, PdfWriter, Transformation
-    from pypdf.generic import RectangleObject
-except Exception:
-    PdfReader = None
-    PdfWriter = None
-    Transformation = None
-    RectangleObject = None
-
-## Tabla de formatos con equivalencia en puntos
-
-#| Formato        | Medidas (mm)       | Medidas (pulgadas) | Equivalente en píxeles (300 dpi) | Medidas (pts)            |
-#|----------------|--------------------|--------------------|----------------------------------|--------------------------|
-#| Carta (Letter) | 216 × 279 mm       | 8.5 × 11 in        | 2550 × 3300 px                   | 612 × 792 pts            |
-#| Doble Carta    | 432 × 279 mm       | 17 × 11 in         | 5100 × 3300 px                   | 1224 × 792 pts           |
-#| Oficio (Legal) | 216 × 356 mm       | 8.5 × 14 in        | 2550 × 4200 px                   | 612 × 1008 pts           |
-#| A4             | 210 × 297 mm       | 8.27 × 11.7 in     | 2480 × 3508 px                   | 595 × 842 pts            |
-#| A3             | 297 × 420 mm       | 11.7 × 16.5 in     | 3508 × 4961 px                   | 842 × 1188 pts           |
-#| Tabloide       | 279 × 432 mm       | 11 × 17 in         | 3300 × 5100 px                   | 792 × 1224 pts           |
-
-# --- Configuración ---
-A4_WIDTH_PT = 595.276  # puntos (72 pts = 1 inch) ~210 mm
-A4_HEIGHT_PT = 841.89  # puntos ~297 mm
-TARGET_DPI = 300       # DPI objetivo
-
-def pts_to_pixels(points, dpi=TARGET_DPI):
-    inches = points / 72.0
-    return int(round(inches * dpi))
-
-# Lista global de rutas
-archivos_rutas = []
+import queue
+import threading
+from tkinter import ttk
+
+# El motor (sin interfaz) vive en MotorPDF.py
+from MotorPDF import (
+    generar_documento, generar_volumenes, DependenciaFaltante, TrabajoCancelado, BITS_PERMISOS,
+)
+from CachePaginas import CacheDisco
+from Instrumentacion import Informe
+from ListaArchivos import ListaVirtual, ModeloLista
+from Miniaturas import PanelMiniaturas, ServicioMiniaturas
+from Proyectos import cargar_proyecto, es_estructurado, guardar_proyecto as guardar_proyecto_json
+
+# Caché de páginas convertidas: volver a ejecutar un proyecto sólo convierte lo que cambió
+DIR_CACHE = os.path.join(os.environ.get("LOCALAPPDATA") or os.path.expanduser("~"), "OCREdit", "cache_paginas")
+# Miniaturas de la vista previa (PNG pequeños, caché propia)
+DIR_MINIATURAS = os.path.join(os.environ.get("LOCALAPPDATA") or os.path.expanduser("~"), "OCREdit", "miniaturas")
+
+# Lista global de rutas: el modelo es la única fuente de verdad (rutas y selección) y
+# archivos_rutas es su lista, sólo para leerla; los cambios pasan por el modelo
+modelo = ModeloLista()
+archivos_rutas = modelo.rutas
+# Metadatos conocidos de cada ruta (proyectos .json): el motor planifica con ellos
+metadatos_rutas = {}
 
 # --- UI básicas ---
 def seleccionar_archivos():
@@ -46,22 +38,16 @@ def seleccionar_archivos():
         ("All files", "*.*")
     ]
     archivos = filedialog.askopenfilenames(title="Select imagens n PDF", filetypes=tipos)
-    for archivo in archivos:
-        archivos_rutas.append(archivo)
-        lista.insert(tk.END, archivo)
+    modelo.agregar(archivos)
 
 def eliminar_seleccion():
-    sel = lista.curselection()
-    if not sel:
+    if not modelo.seleccion:
         messagebox.showinfo("Info", "Select document")
         return
-    for index in reversed(sel):
-        lista.delete(index)
-        archivos_rutas.pop(index)
+    modelo.eliminar()
 
 def limpiar_lista():
-    archivos_rutas.clear()
-    lista.delete(0, tk.END)
+    modelo.limpiar()
 
 def elegir_destino():
     escritorio = os.path.join(os.path.expanduser("~"), "Desktop")
@@ -74,7 +60,9 @@ def elegir_destino():
     if ruta:
         salida_var.set(ruta)
 
-# --- Guardar/abrir/ejecutar proyecto (.txt) ---
+# --- Guardar/abrir/ejecutar proyecto (.txt o .json con metadatos) ---
+TIPOS_PROYECTO = [("Project", "*.json"), ("Text", "*.txt"), ("All files", "*.*")]
+
 def guardar_proyecto():
     if not archivos_rutas:
         messagebox.showwarning("Message", "List empty, add files.")
@@ -82,114 +70,70 @@ def guardar_proyecto():
     escritorio = os.path.join(os.path.expanduser("~"), "Desktop")
     ruta = filedialog.asksaveasfilename(
         title="Save Proyect As",
-        defaultextension=".txt",
+        defaultextension=".json",
         initialdir=escritorio,
-        filetypes=[("Texto", "*.txt")]
+        filetypes=TIPOS_PROYECTO[:2]
     )
     if not ruta:
         return
     try:
-        with open(ruta, "w", encoding="utf-8") as f:
-            f.write("# Routes proyect - one rute by line\n")
-            for p in archivos_rutas:
-                f.write(p + "\n")
+        if es_estructurado(ruta):
+            for meta in guardar_proyecto_json(ruta, archivos_rutas, previos=metadatos_rutas):
+                metadatos_rutas[meta["ruta"]] = meta
+        else:
+            with open(ruta, "w", encoding="utf-8") as f:
+                f.write("# Routes proyect - one rute by line\n")
+                for p in archivos_rutas:
+                    f.write(p + "\n")
         messagebox.showinfo("Save", f"Project saved:\n{ruta}")
     except Exception as e:
         messagebox.showerror("Error", f"Project could not be saved:\n{e}")
 
-def abrir_proyecto():
-    ruta = filedialog.askopenfilename(
-        title="Open proyect (.txt)",
-        filetypes=[("Text", "*.txt"), ("All files", "*.*")]
-    )
+def _cargar_proyecto(titulo, titulo_omitidas, pregunta):
+    """
+    Pide un proyecto, lo valida y reemplaza la lista actual. Devuelve el número de
+    rutas cargadas, o None si el usuario cancela o el proyecto no puede leerse.
+    """
+    ruta = filedialog.askopenfilename(title=titulo, filetypes=TIPOS_PROYECTO)
     if not ruta:
-        return
+        return None
     try:
-        with open(ruta, "r", encoding="utf-8") as f:
-            lines = f.readlines()
+        entradas, errores = cargar_proyecto(ruta)
     except Exception as e:
         messagebox.showerror("Error", f"File could not be open:\n{e}")
-        return
+        return None
 
-    nuevas_rutas = []
-    errores = []
-    for i, line in enumerate(lines, start=1):
-        line = line.strip()
-        if not line or line.startswith("#"):
-            continue
-        # Expandir ~ y variables de entorno
-        line_expanded = os.path.expanduser(os.path.expandvars(line))
-        if os.path.exists(line_expanded):
-            nuevas_rutas.append(line_expanded)
-        else:
-            errores.append((i, line))
-
-    if errores:
+    if entradas and errores:
         msg = "Some routes do not exist and were omitted:\n"
         for ln, val in errores[:10]:
             msg += f"Linea {ln}: {val}\n"
         if len(errores) > 10:
             msg += f"...y {len(errores)-10} más.\n"
-        msg += "\n Do you want to continue loading the valid routes?"
-        if not messagebox.askyesno("routes omitted", msg):
-            return
+        msg += pregunta
+        if not messagebox.askyesno(titulo_omitidas, msg):
+            return None
 
     # Reemplazar lista actual por las nuevas rutas válidas
-    archivos_rutas.clear()
-    lista.delete(0, tk.END)
-    for p in nuevas_rutas:
-        archivos_rutas.append(p)
-        lista.insert(tk.END, p)
+    for meta in entradas:
+        metadatos_rutas[meta["ruta"]] = meta
+    modelo.reemplazar([meta["ruta"] for meta in entradas])
+    return len(entradas)
 
-    messagebox.showinfo("load proyect", f"Document loaded {len(nuevas_rutas)} valid routes:\n{ruta}")
+def abrir_proyecto():
+    cargadas = _cargar_proyecto("Open proyect", "routes omitted",
+                                "\n Do you want to continue loading the valid routes?")
+    if cargadas is not None:
+        messagebox.showinfo("load proyect", f"Document loaded {cargadas} valid routes.")
 
 def ejecutar_proyecto():
-    ruta = filedialog.askopenfilename(
-        title="Select proyect (.txt)",
-        filetypes=[("Text", "*.txt"), ("All files", "*.*")]
-    )
-    if not ruta:
+    cargadas = _cargar_proyecto("Select proyect", "Do not fount route",
+                                "\nThe project will run with the valid paths. ¿Continue?")
+    if cargadas is None:
         return
-    try:
-        with open(ruta, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-    except Exception as e:
-        messagebox.showerror("Error", f"Can not open file:\n{e}")
-        return
-
-    nuevas_rutas = []
-    errores = []
-    for i, line in enumerate(lines, start=1):
-        line = line.strip()
-        if not line or line.startswith("#"):
-            continue
-        line_expanded = os.path.expanduser(os.path.expandvars(line))
-        if os.path.exists(line_expanded):
-            nuevas_rutas.append(line_expanded)
-        else:
-            errores.append((i, line))
-
-    if not nuevas_rutas:
+    if not cargadas:
         messagebox.showwarning("Message", "No found project.")
         return
 
-    if errores:
-        msg = "Some routes do not exist and were omitted:\n"
-        for ln, val in errores[:10]:
-            msg += f"Linea {ln}: {val}\n"
-        if len(errores) > 10:
-            msg += f"...y {len(errores)-10} más.\n"
-        msg += "\nThe project will run with the valid paths. ¿Continue?"
-        if not messagebox.askyesno("Do not fount route", msg):
-            return
-
-    # Cargar rutas en la lista y en la variable global
-    archivos_rutas.clear()
-    lista.delete(0, tk.END)
-    for p in nuevas_rutas:
-        archivos_rutas.append(p)
-        lista.insert(tk.END, p)
-
     # Preguntar si desea elegir archivo de salida antes de ejecutar
     if not salida_var.get().strip():
         if messagebox.askyesno("out", "select output file."):
@@ -198,133 +142,166 @@ def ejecutar_proyecto():
     # Ejecutar la generación del PDF con las rutas cargadas
     generar_pdf()
 
-# --- Convertir imagen a PDF A4 en memoria escalando siempre ---
-def image_to_a4_pdf_bytes_scale_all(path):
-    """
-    Escala la imagen (upscale o downscale) para que ocupe lo máximo posible dentro de A4
-    manteniendo la relación de aspecto. Devuelve BytesIO con PDF de una página A4.
-    """
-    px_w = pts_to_pixels(A4_WIDTH_PT, TARGET_DPI)
-    px_h = pts_to_pixels(A4_HEIGHT_PT, TARGET_DPI)
-
-    img = Image.open(path).convert("RGB")
-    orig_w, orig_h = img.width, img.height
-
-    # Calcular factor para escalar la imagen hasta que una de las dimensiones llene A4
-    scale_w = px_w / orig_w
-    scale_h = px_h / orig_h
-    scale = min(scale_w, scale_h)  # para que quepa dentro de A4
-    # Si quieres que llene completamente (posible recorte), usar max(scale_w, scale_h)
-    new_w = max(1, int(round(orig_w * scale)))
-    new_h = max(1, int(round(orig_h * scale)))
-
-    # Redimensionar (si scale>1 se amplía; si <1 se reduce)
-    img_resized = img.resize((new_w, new_h), Image.LANCZOS)
-
-    # Crear fondo blanco A4 y pegar la imagen centrada
-    fondo = Image.new("RGB", (px_w, px_h), (255, 255, 255))
-    offset_x = (px_w - new_w) // 2
-    offset_y = (px_h - new_h) // 2
-    fondo.paste(img_resized, (offset_x, offset_y))
-
-    bio = io.BytesIO()
-    fondo.save(bio, format="PDF", resolution=TARGET_DPI)
-    bio.seek(0)
-    return bio
-
-# --- Normalizar página PDF existente a A4 escalando siempre ---
-def normalize_pdf_page_to_a4_scale_all(page):
-    """
-    Escala y centra una página PDF dentro de A4. Calcula factor de escala para que la
-    página quepa en A4 manteniendo aspecto (se escala up o down según sea necesario).
-    """
-    try:
-        w = float(page.mediabox.width)
-        h = float(page.mediabox.height)
-    except Exception:
-        return page
-
-    # factor para que quepa dentro de A4 (si quieres llenar y recortar, usar max)
-    scale = min(A4_WIDTH_PT / w, A4_HEIGHT_PT / h)
-
-    new_w = w * scale
-    new_h = h * scale
-    tx = (A4_WIDTH_PT - new_w) / 2.0
-    ty = (A4_HEIGHT_PT - new_h) / 2.0
-
-    trans = Transformation().scale(scale, scale).translate(tx, ty)
-    try:
-        page.add_transformation(trans)
-    except Exception:
-        # si add_transformation no está disponible, intentar aplicar matrix manualmente
-        pass
-
-    page.mediabox = RectangleObject([0, 0, A4_WIDTH_PT, A4_HEIGHT_PT])
-    try:
-        page.cropbox = RectangleObject([0, 0, A4_WIDTH_PT, A4_HEIGHT_PT])
-    except Exception:
-        pass
-
-    return page
-
 # --- Generación del PDF final (manteniendo streams vivos) ---
 def generar_pdf():
+    """Encola la generación con la lista actual; se ejecuta en segundo plano."""
     if not archivos_rutas:
         messagebox.showwarning("Message", "Load files.")
         return
 
-    if PdfReader is None or PdfWriter is None or Transformation is None or RectangleObject is None:
-        messagebox.showerror("Install", "Install 'pypdf' y 'Pillow' with: pip install pypdf pillow")
-        return
-
     ruta_pdf = salida_var.get().strip()
     if not ruta_pdf:
         escritorio = os.path.join(os.path.expanduser("~"), "Desktop")
         ruta_pdf = os.path.join(escritorio, "OCREdit Document_a4.pdf")
 
-    writer = PdfWriter()
-    temp_streams = []
+    # Bloquear = mismos permisos por defecto que BloqueoDocumentos (todo bloqueado),
+    # aplicados en la misma escritura
+    bloqueos = {p: True for p in BITS_PERMISOS} if bloquear_var.get() else None
 
+    # Volúmenes: vacío o 0 = un solo PDF
+    texto = volumen_var.get().strip() or "0"
+    try:
+        tamano = float(texto) if unidad_var.get() == "MB" else int(texto)
+        if tamano < 0:
+            raise ValueError(texto)
+    except ValueError:
+        messagebox.showwarning("Message", f"Invalid volume size: {texto}")
+        return
+    volumen = None
+    if tamano:
+        volumen = {"paginas_volumen": tamano} if unidad_var.get() == "pages" else \
+                  {"bytes_volumen": int(tamano * 1024 * 1024)}
+
+    metadatos = [metadatos_rutas.get(r) for r in archivos_rutas]
+    cola_trabajos.put((list(archivos_rutas), ruta_pdf, bloqueos, metadatos, metricas_var.get(),
+                       linealizar_var.get(), volumen))
+    _actualizar_estado()
+
+# --- Trabajos en segundo plano ---
+# La generación corre en un hilo (y las imágenes en el pool de procesos del motor) para
+# que la ventana no se congele. El hilo sólo se comunica con la UI mediante eventos_ui,
+# que el bucle de tkinter revisa con after(); los messagebox se muestran siempre aquí.
+cola_trabajos = queue.Queue()     # (rutas, ruta_pdf, bloqueos, metadatos, metricas, linealizar, volumen) pendientes, en orden
+eventos_ui = queue.Queue()        # eventos del hilo de trabajo hacia la UI
+cancelar_evento = threading.Event()
+trabajo_actual = {"ruta_pdf": None, "estado": "Ready."}
+
+def _hilo_trabajos():
+    while True:
+        rutas, ruta_pdf, bloqueos, metadatos, metricas, linealizar, volumen = cola_trabajos.get()
+        cancelar_evento.clear()
+        eventos_ui.put(("inicio", ruta_pdf, len(rutas)))
+        try:
+            cache = CacheDisco(DIR_CACHE)
+        except OSError:
+            cache = None
+        estadisticas = {}
+        # Informe JSON-lines junto al PDF (etapas, bytes y memoria por archivo)
+        ruta_metricas = ruta_pdf + ".metricas.jsonl" if metricas else None
+        try:
+            medicion = contextlib.nullcontext()
+            if ruta_metricas:
+                medicion = Informe(ruta_metricas, "generar", {
+                    "salida": ruta_pdf, "entradas": len(rutas), "cifrado": bloqueos is not None,
+                    "linealizar": linealizar, "volumen": volumen})
+            with medicion as informe:
+                if volumen:
+                    # Varios PDF escritos a la vez, uno por proceso
+                    errores = generar_volumenes(
+                        rutas, ruta_pdf, procesos=0, cache=cache,
+                        progreso=lambda p: eventos_ui.put(("progreso", p)),
+                        cancelar=cancelar_evento, bloqueos=bloqueos, compactar=True,
+                        estadisticas=estadisticas, metadatos=metadatos, informe=informe,
+                        linealizar=linealizar, **volumen,
+                    )
+                else:
+                    errores = generar_documento(
+                        rutas, ruta_pdf, procesos=0, cache=cache,
+                        progreso=lambda p: eventos_ui.put(("progreso", p)),
+                        cancelar=cancelar_evento, bloqueos=bloqueos, compactar=True,
+                        estadisticas=estadisticas, metadatos=metadatos, informe=informe,
+                        linealizar=linealizar,
+                    )
+            eventos_ui.put(("fin", ruta_pdf, errores, estadisticas, ruta_metricas))
+        except TrabajoCancelado:
+            eventos_ui.put(("cancelado", ruta_pdf))
+        except DependenciaFaltante as e:
+            eventos_ui.put(("instalar", str(e)))
+        except Exception as e:
+            eventos_ui.put(("error", f"PDF Can´t generated:\n{e}"))
+
+def cancelar_trabajo():
+    if trabajo_actual["ruta_pdf"] is not None:
+        cancelar_evento.set()
+        _actualizar_estado("Cancelling...")
+
+def _actualizar_estado(texto=None):
+    """Muestra el estado del trabajo actual y cuántos trabajos esperan en la cola."""
+    if texto is not None:
+        trabajo_actual["estado"] = texto
+    en_cola = cola_trabajos.qsize()
+    estado_var.set(trabajo_actual["estado"] + (f"   |   Queued jobs: {en_cola}" if en_cola else ""))
+
+def _procesar_eventos():
     try:
-        for ruta in archivos_rutas:
-            ext = os.path.splitext(ruta)[1].lower()
-            if ext == ".pdf":
-                try:
-                    reader = PdfReader(ruta)
-                    for page in reader.pages:
-                        norm = normalize_pdf_page_to_a4_scale_all(page)
-                        writer.add_page(norm)
-                except Exception as e:
-                    messagebox.showwarning("Message", f"Can´t read PDF: {ruta}\n{e}")
+        while True:
+            evento = eventos_ui.get_nowait()
+            tipo = evento[0]
+            if tipo == "inicio":
+                _, ruta_pdf, total = evento
+                trabajo_actual["ruta_pdf"] = ruta_pdf
+                barra_progreso.config(maximum=max(total, 1), value=0)
+                btn_cancelar.config(state=tk.NORMAL)
+                _actualizar_estado(f"Generating: {os.path.basename(ruta_pdf)}")
+            elif tipo == "progreso":
+                p = evento[1]
+                barra_progreso.config(value=p["hechos"])
+                _actualizar_estado(
+                    f"{p['hechos']}/{p['total']} files, {p['paginas']} pages, "
+                    f"{p['paginas_por_segundo']:.1f} pages/s, ETA {p['eta_s']:.0f}s - "
+                    f"{os.path.basename(p['ruta'])}"
+                )
             else:
-                try:
-                    bio = image_to_a4_pdf_bytes_scale_all(ruta)
-                    temp_streams.append(bio)
-                    mem_reader = PdfReader(bio)
-                    for page in mem_reader.pages:
-                        try:
-                            page.mediabox = RectangleObject([0, 0, A4_WIDTH_PT, A4_HEIGHT_PT])
-                        except Exception:
-                            pass
-                        norm = normalize_pdf_page_to_a4_scale_all(page)
-                        writer.add_page(norm)
-                except Exception as e:
-                    messagebox.showwarning("Error", f"image can´t process: {ruta}\n{e}")
-
-        with open(ruta_pdf, "wb") as f_out:
-            writer.write(f_out)
-
-        messagebox.showinfo("Message", f"PDF generated in: {ruta_pdf}")
-    except Exception as e:
-        messagebox.showerror("Error", f"PDF Can´t generated:\n{e}")
-    finally:
-        for s in temp_streams:
-            try:
-                s.close()
-            except Exception:
-                pass
-
-# --- Funciones de control y reordenado (idénticas a versiones previas) ---
+                trabajo_actual["ruta_pdf"] = None
+                barra_progreso.config(value=0)
+                btn_cancelar.config(state=tk.DISABLED)
+                _actualizar_estado("Ready.")
+                if tipo == "fin":
+                    _, ruta_pdf, errores, estadisticas, ruta_metricas = evento
+                    if errores:
+                        msg = "Some files could not be processed and were omitted:\n"
+                        for r, err in errores[:10]:
+                            msg += f"{r}\n{err}\n"
+                        if len(errores) > 10:
+                            msg += f"...y {len(errores)-10} más.\n"
+                        messagebox.showwarning("Message", msg)
+                    volumenes = estadisticas.get("volumenes") or [ruta_pdf]
+                    msg = f"PDF generated in: {volumenes[0]}"
+                    if len(volumenes) > 1:
+                        msg = f"{len(volumenes)} PDF volumes generated:\n" + "\n".join(volumenes[:10])
+                        if len(volumenes) > 10:
+                            msg += f"\n...y {len(volumenes)-10} más."
+                    if estadisticas["duplicados"]:
+                        msg += (f"\n{estadisticas['duplicados']} repeated images reused: "
+                                f"{estadisticas['bytes_ahorrados'] / 1024:.0f} KB and "
+                                f"{estadisticas['segundos_ahorrados']:.1f}s saved")
+                    if ruta_metricas:
+                        msg += f"\nJob report: {ruta_metricas}"
+                    if cola_trabajos.empty():
+                        messagebox.showinfo("Message", msg)
+                    else:
+                        _actualizar_estado(msg.replace("\n", " - "))
+                elif tipo == "cancelado":
+                    _actualizar_estado(f"Cancelled: {os.path.basename(evento[1])}")
+                elif tipo == "instalar":
+                    messagebox.showerror("Install", evento[1])
+                elif tipo == "error":
+                    messagebox.showerror("Error", evento[1])
+    except queue.Empty:
+        pass
+    root.after(100, _procesar_eventos)
+
+# --- Funciones de control y reordenado (por lotes, sobre el modelo) ---
 def scroll_up():
     lista.yview_scroll(-1, "units")
 
@@ -338,134 +315,128 @@ def page_down():
     lista.yview_scroll(1, "pages")
 
 def move_selected_up():
-    sel = lista.curselection()
-    if not sel:
+    if not modelo.seleccion:
         return
-    for index in sel:
-        if index == 0:
-            continue
-        text = lista.get(index)
-        archivos_rutas[index], archivos_rutas[index-1] = archivos_rutas[index-1], archivos_rutas[index]
-        lista.delete(index)
-        lista.insert(index-1, text)
-        lista.selection_set(index-1)
-    lista.see(max(sel[0]-1,0))
+    modelo.mover(-1)
+    lista.see(min(modelo.seleccion))
 
 def move_selected_down():
-    sel = lista.curselection()
-    if not sel:
+    if not modelo.seleccion:
         return
-    for index in reversed(sel):
-        if index >= lista.size()-1:
-            continue
-        text = lista.get(index)
-        archivos_rutas[index], archivos_rutas[index+1] = archivos_rutas[index+1], archivos_rutas[index]
-        lista.delete(index)
-        lista.insert(index+1, text)
-        lista.selection_set(index+1)
-    lista.see(min(sel[-1]+1, lista.size()-1))
+    modelo.mover(1)
+    lista.see(max(modelo.seleccion))
 
 def move_selected_top():
-    sel = lista.curselection()
-    if not sel:
+    if not modelo.seleccion:
         return
-    items = [lista.get(i) for i in sel]
-    for i in reversed(sel):
-        lista.delete(i)
-        archivos_rutas.pop(i)
-    for i, item in enumerate(items):
-        lista.insert(i, item)
-        archivos_rutas.insert(i, item)
-        lista.selection_set(i)
+    modelo.mover_al_principio()
     lista.see(0)
 
 def move_selected_bottom():
-    sel = lista.curselection()
-    if not sel:
+    if not modelo.seleccion:
         return
-    items = [lista.get(i) for i in sel]
-    for i in reversed(sel):
-        lista.delete(i)
-        archivos_rutas.pop(i)
-    start = lista.size()
-    for i, item in enumerate(items):
-        lista.insert(start + i, item)
-        archivos_rutas.append(item)
-        lista.selection_set(start + i)
-    lista.see(lista.size()-1)
+    modelo.mover_al_final()
+    lista.see(len(modelo) - 1)
 
 # --- Interfaz gráfica ---
-root = tk.Tk()
-root.title("IMG PDF")
-root.geometry("900x560")
-
-main_frame = tk.Frame(root)
-main_frame.pack(fill=tk.BOTH, expand=True, padx=12, pady=12)
-
-list_frame = tk.Frame(main_frame)
-list_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-scrollbar = tk.Scrollbar(list_frame, orient=tk.VERTICAL)
-lista = tk.Listbox(list_frame, width=100, height=22, selectmode=tk.EXTENDED, yscrollcommand=scrollbar.set)
-scrollbar.config(command=lista.yview)
-scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-lista.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-
-control_frame = tk.Frame(main_frame)
-control_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=(8,0))
-
-tk.Label(control_frame, text="Order").pack(pady=(12,2))
-tk.Button(control_frame, text="Up", width=12, command=move_selected_up).pack(pady=2)
-tk.Button(control_frame, text="Down", width=12, command=move_selected_down).pack(pady=2)
-tk.Button(control_frame, text="Top", width=12, command=move_selected_top).pack(pady=2)
-tk.Button(control_frame, text="Bottom", width=12, command=move_selected_bottom).pack(pady=2)
-
-frame_botones = tk.Frame(root)
-frame_botones.pack(fill=tk.X, padx=12, pady=(6,0))
-
-btn_seleccionar = tk.Button(frame_botones, text="Select Files", command=seleccionar_archivos)
-btn_seleccionar.pack(side=tk.LEFT, padx=6, pady=6)
-
-btn_eliminar = tk.Button(frame_botones, text="Delete", command=eliminar_seleccion)
-btn_eliminar.pack(side=tk.LEFT, padx=6, pady=6)
-
-btn_limpiar = tk.Button(frame_botones, text="List in white", command=limpiar_lista)
-btn_limpiar.pack(side=tk.LEFT, padx=6, pady=6)
-
-# Botones de proyecto
-btn_guardar_proy = tk.Button(frame_botones, text="Save Proyect", command=guardar_proyecto)
-btn_guardar_proy.pack(side=tk.LEFT, padx=6, pady=6)
-
-btn_abrir_proy = tk.Button(frame_botones, text="Open proyect", command=abrir_proyecto)
-btn_abrir_proy.pack(side=tk.LEFT, padx=6, pady=6)
-
-btn_ejecutar_proy = tk.Button(frame_botones, text="Run Proyect (.txt)", command=ejecutar_proyecto, bg="#2196F3", fg="white")
-btn_ejecutar_proy.pack(side=tk.LEFT, padx=6, pady=6)
-
-salida_var = tk.StringVar()
-salida_frame = tk.Frame(root)
-salida_frame.pack(fill=tk.X, padx=12, pady=(6,0))
-
-tk.Label(salida_frame, text="Fileout document:").pack(side=tk.LEFT, padx=(0,6))
-salida_entry = tk.Entry(salida_frame, textvariable=salida_var, width=80)
-salida_entry.pack(side=tk.LEFT, padx=(0,6))
-btn_elegir = tk.Button(salida_frame, text="Select...", command=elegir_destino)
-btn_elegir.pack(side=tk.LEFT)
-
-btn_generar = tk.Button(root, text="Genereted PDF", command=generar_pdf, bg="#4CAF50", fg="white")
-btn_generar.pack(pady=12)
-
-help_text = (
-    "Image (.jpg .jpeg .png .bmp .tiff .gif .webp) y archivos .pdf.\n"
-    "Copiright (C) - 2025 Ing. Erik Alejandro García Aparicio. All right reserved."
-)
-tk.Label(root, text=help_text, fg="gray", justify=tk.LEFT).pack(pady=(0,12))
-
-
-root.mainloop()
-
-
-
-
+if __name__ == "__main__":
+    root = tk.Tk()
+    root.title("IMG PDF")
+    root.geometry("1180x620")
+
+    main_frame = tk.Frame(root)
+    main_frame.pack(fill=tk.BOTH, expand=True, padx=12, pady=12)
+
+    list_frame = tk.Frame(main_frame)
+    list_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+    # Sólo las filas visibles se cargan en el Listbox (ver ListaArchivos)
+    lista = ListaVirtual(list_frame, modelo, width=100, height=22)
+    lista.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+    control_frame = tk.Frame(main_frame)
+    control_frame.pack(side=tk.RIGHT, fill=tk.Y, padx=(8,0))
+
+    tk.Label(control_frame, text="Order").pack(pady=(12,2))
+    tk.Button(control_frame, text="Up", width=12, command=move_selected_up).pack(pady=2)
+    tk.Button(control_frame, text="Down", width=12, command=move_selected_down).pack(pady=2)
+    tk.Button(control_frame, text="Top", width=12, command=move_selected_top).pack(pady=2)
+    tk.Button(control_frame, text="Bottom", width=12, command=move_selected_bottom).pack(pady=2)
+
+    # Vista previa: miniaturas de las filas visibles, generadas fuera del hilo de la interfaz
+    servicio_miniaturas = ServicioMiniaturas(DIR_MINIATURAS)
+    panel_miniaturas = PanelMiniaturas(main_frame, servicio_miniaturas, lista)
+    panel_miniaturas.pack(side=tk.RIGHT, fill=tk.Y, padx=(8,0))
+
+    frame_botones = tk.Frame(root)
+    frame_botones.pack(fill=tk.X, padx=12, pady=(6,0))
+
+    btn_seleccionar = tk.Button(frame_botones, text="Select Files", command=seleccionar_archivos)
+    btn_seleccionar.pack(side=tk.LEFT, padx=6, pady=6)
+
+    btn_eliminar = tk.Button(frame_botones, text="Delete", command=eliminar_seleccion)
+    btn_eliminar.pack(side=tk.LEFT, padx=6, pady=6)
+
+    btn_limpiar = tk.Button(frame_botones, text="List in white", command=limpiar_lista)
+    btn_limpiar.pack(side=tk.LEFT, padx=6, pady=6)
+
+    # Botones de proyecto
+    btn_guardar_proy = tk.Button(frame_botones, text="Save Proyect", command=guardar_proyecto)
+    btn_guardar_proy.pack(side=tk.LEFT, padx=6, pady=6)
+
+    btn_abrir_proy = tk.Button(frame_botones, text="Open proyect", command=abrir_proyecto)
+    btn_abrir_proy.pack(side=tk.LEFT, padx=6, pady=6)
+
+    btn_ejecutar_proy = tk.Button(frame_botones, text="Run project", command=ejecutar_proyecto, bg="#2196F3", fg="white")
+    btn_ejecutar_proy.pack(side=tk.LEFT, padx=6, pady=6)
+
+    salida_var = tk.StringVar()
+    salida_frame = tk.Frame(root)
+    salida_frame.pack(fill=tk.X, padx=12, pady=(6,0))
+
+    tk.Label(salida_frame, text="Fileout document:").pack(side=tk.LEFT, padx=(0,6))
+    salida_entry = tk.Entry(salida_frame, textvariable=salida_var, width=80)
+    salida_entry.pack(side=tk.LEFT, padx=(0,6))
+    btn_elegir = tk.Button(salida_frame, text="Select...", command=elegir_destino)
+    btn_elegir.pack(side=tk.LEFT)
+    bloquear_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(salida_frame, text="Lock PDF", variable=bloquear_var).pack(side=tk.LEFT, padx=(6,0))
+    metricas_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(salida_frame, text="Job report", variable=metricas_var).pack(side=tk.LEFT, padx=(6,0))
+
+    # Opciones de salida: linealizado y volúmenes (vacío o 0 = un solo PDF)
+    opciones_frame = tk.Frame(root)
+    opciones_frame.pack(fill=tk.X, padx=12, pady=(4,0))
+    linealizar_var = tk.BooleanVar(value=False)
+    tk.Checkbutton(opciones_frame, text="Fast web view", variable=linealizar_var).pack(side=tk.LEFT)
+    tk.Label(opciones_frame, text="Volumes:").pack(side=tk.LEFT, padx=(12,6))
+    volumen_var = tk.StringVar()
+    tk.Entry(opciones_frame, textvariable=volumen_var, width=8).pack(side=tk.LEFT)
+    unidad_var = tk.StringVar(value="pages")
+    ttk.Combobox(opciones_frame, textvariable=unidad_var, values=("pages", "MB"),
+                 state="readonly", width=6).pack(side=tk.LEFT, padx=(6,0))
+
+    btn_generar = tk.Button(root, text="Genereted PDF", command=generar_pdf, bg="#4CAF50", fg="white")
+    btn_generar.pack(pady=(12,4))
+
+    # Progreso del trabajo en segundo plano
+    progreso_frame = tk.Frame(root)
+    progreso_frame.pack(fill=tk.X, padx=12, pady=(0,6))
+    barra_progreso = ttk.Progressbar(progreso_frame, mode="determinate")
+    barra_progreso.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=(0,6))
+    btn_cancelar = tk.Button(progreso_frame, text="Cancel", command=cancelar_trabajo, state=tk.DISABLED)
+    btn_cancelar.pack(side=tk.LEFT)
+    estado_var = tk.StringVar(value="Ready.")
+    tk.Label(root, textvariable=estado_var, anchor="w").pack(fill=tk.X, padx=12)
+
+    help_text = (
+        "Image (.jpg .jpeg .png .bmp .tiff .gif .webp) y archivos .pdf.\n"
+        "Copiright (C) - 2025 Ing. Erik Alejandro García Aparicio. All right reserved."
+    )
+    tk.Label(root, text=help_text, fg="gray", justify=tk.LEFT).pack(pady=(0,12))
 
 
+    threading.Thread(target=_hilo_trabajos, daemon=True).start()
+    root.after(100, _procesar_eventos)
+    root.mainloop()
+    servicio_miniaturas.cerrar()
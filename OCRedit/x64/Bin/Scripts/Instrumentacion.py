@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Instrumentación opcional de los trabajos de MotorPDF y BloqueoDocumentos.
+
+Las funciones del motor marcan sus etapas con 'with etapa("decodificar"):' o con el
+decorador @medir_etapa. Mientras el hilo no tenga un Registro activo
+(iniciar_registro) no se mide nada y el coste es una comprobación. Con un registro
+activo se suman los segundos de cada etapa y los contadores (contar) de la entrada
+en curso; en los procesos del pool el registro vuelve con el resultado.
+
+Informe escribe el trabajo en JSON-lines: una línea "trabajo" con los parámetros,
+una línea "entrada" por archivo (o página de TIFF) con sus etapas, contadores,
+bytes leídos y escritos y una muestra de memoria, y una línea "resumen" con los
+totales, el pico de memoria y los archivos más lentos. Cada línea se escribe al
+momento: si el trabajo muere, lo medido hasta entonces queda en el informe.
+Con perfil=ruta además se perfila el trabajo con cProfile (el hilo que lo ejecuta;
+los procesos del pool no: para perfilar la conversión úsese un solo proceso).
+
+Etapas: decodificar, redimensionar, detectar_color, codificar, incrustar (datos
+originales sin recomprimir), leer_pdf, normalizar, escribir, cifrar y linealizar.
+cifrar va incluida en escribir (se cifra objeto a objeto al escribirlo); con
+linealizar se cifra en esa segunda escritura, que se mide aparte.
+"""
+import functools
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+FORMATO = "ocredit-metricas"
+VERSION = 1
+UMBRAL_LENTO_S = 2.0  # una entrada es lenta si tarda más que esto...
+FACTOR_LENTO = 4.0    # ...y más que este múltiplo de la mediana
+LENTOS_MAX = 20
+
+# --- Memoria ---
+def _proc_status(campo):
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            for linea in f:
+                if linea.startswith(campo):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def memoria_mb():
+    """RSS actual del proceso en MB, o None si no puede saberse."""
+    valor = _proc_status("VmRSS:")
+    if valor is None and psutil is not None:
+        valor = psutil.Process().memory_info().rss / (1024 * 1024)
+    return valor
+
+def rss_pico(hijos=False):
+    """Pico de RSS en MB del proceso (o del mayor de sus hijos ya terminados); None si no puede saberse."""
+    if not hijos:
+        # En Linux ru_maxrss sobrevive a fork+exec (el hijo hereda el pico del padre);
+        # VmHWM empieza de cero con cada exec
+        valor = _proc_status("VmHWM:")
+        if valor is not None:
+            return valor
+    if resource is not None:
+        pico = resource.getrusage(resource.RUSAGE_CHILDREN if hijos else resource.RUSAGE_SELF).ru_maxrss
+        return pico / (1024 * 1024 if sys.platform == "darwin" else 1024)  # bytes en macOS, KB en Linux
+    if psutil is not None and not hijos:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    return None
+
+# --- Registro de la entrada en curso ---
+class Registro:
+    """Segundos por etapa y contadores de una entrada."""
+
+    def __init__(self):
+        self.etapas = {}
+        self.contadores = {}
+
+    def fusionar(self, datos):
+        """Suma otro registro (o su a_dict(), p. ej. el que vuelve de un proceso del pool)."""
+        if datos is None:
+            return
+        if isinstance(datos, Registro):
+            datos = datos.a_dict()
+        for nombre, segundos in datos.get("etapas", {}).items():
+            self.etapas[nombre] = self.etapas.get(nombre, 0.0) + segundos
+        for nombre, valor in datos.get("contadores", {}).items():
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + valor
+
+    def a_dict(self):
+        return {"etapas": self.etapas, "contadores": self.contadores}
+
+_local = threading.local()
+
+def iniciar_registro():
+    """Activa un Registro nuevo en este hilo y lo devuelve."""
+    _local.registro = Registro()
+    return _local.registro
+
+def terminar_registro():
+    """Desactiva el registro del hilo y lo devuelve (None si no había)."""
+    registro = getattr(_local, "registro", None)
+    _local.registro = None
+    return registro
+
+class etapa:
+    """Contexto que suma su duración a la etapa 'nombre' del registro activo."""
+    __slots__ = ("nombre", "registro", "inicio")
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+
+    def __enter__(self):
+        self.registro = getattr(_local, "registro", None)
+        if self.registro is not None:
+            self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        if self.registro is not None:
+            etapas = self.registro.etapas
+            etapas[self.nombre] = etapas.get(self.nombre, 0.0) + time.perf_counter() - self.inicio
+        return False
+
+def medir_etapa(nombre):
+    """Decorador: cada llamada a la función cuenta como la etapa 'nombre'."""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with etapa(nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+def contar(nombre, valor=1):
+    registro = getattr(_local, "registro", None)
+    if registro is not None:
+        registro.contadores[nombre] = registro.contadores.get(nombre, 0) + valor
+
+# --- Informe del trabajo ---
+class Informe:
+    """
+    Informe JSON-lines de un trabajo. Uso:
+
+        with Informe(ruta_jsonl, "generar", {"procesos": 4}, perfil="job.prof") as informe:
+            ... informe.registrar(ruta, registro, segundos, ...) por cada entrada ...
+
+    El resumen se escribe al salir del with (también si el trabajo falla, con el error).
+    Con ruta None no se escribe nada (p. ej. para sólo perfilar).
+    """
+
+    def __init__(self, ruta, trabajo, parametros=None, perfil=None):
+        self.ruta = ruta
+        self.trabajo = trabajo
+        self.parametros = parametros or {}
+        self.perfil = perfil
+        self.totales = Registro()
+        self.entradas = 0
+        self.segundos = []   # por entrada, para la mediana
+        self.lentos = []     # (segundos, ruta, fotograma)
+        self._f = None
+        self._perfilador = None
+        self._inicio = None
+
+    def _linea(self, datos):
+        if self._f is None:
+            return
+        self._f.write(json.dumps(datos, ensure_ascii=False, default=str) + "\n")
+        self._f.flush()
+
+    def __enter__(self):
+        if self.ruta:
+            self._f = open(self.ruta, "w", encoding="utf-8")
+        self._inicio = time.perf_counter()
+        self._linea({"tipo": "trabajo", "formato": FORMATO, "version": VERSION, "trabajo": self.trabajo,
+                     "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"), "pid": os.getpid(),
+                     "parametros": self.parametros})
+        if self.perfil:
+            import cProfile
+            self._perfilador = cProfile.Profile()
+            self._perfilador.enable()
+        return self
+
+    def registrar(self, ruta, registro=None, segundos=0.0, fotograma=None, **datos):
+        """
+        Escribe la línea de una entrada: registro (Registro o dict) con sus etapas y
+        contadores, segundos totales y cualquier dato extra (estado, error, paginas...).
+        La muestra de memoria es la del dict si trae "rss_mb" (la del proceso del pool
+        que hizo el trabajo); si no, la de este proceso.
+        """
+        medidas = Registro()
+        medidas.fusionar(registro)
+        self.totales.fusionar(medidas)
+        self.entradas += 1
+        self.segundos.append(segundos)
+        if segundos >= UMBRAL_LENTO_S:
+            self.lentos.append((segundos, ruta, fotograma))
+        linea = {"tipo": "entrada", "ruta": ruta}
+        if fotograma is not None:
+            linea["fotograma"] = fotograma
+        linea.update(segundos=round(segundos, 6),
+                     etapas={k: round(v, 6) for k, v in medidas.etapas.items()},
+                     contadores=medidas.contadores,
+                     rss_mb=registro.get("rss_mb") if isinstance(registro, dict) and "rss_mb" in registro
+                     else memoria_mb())
+        linea.update(datos)
+        self._linea(linea)
+
+    def registrar_trabajo(self, registro):
+        """Etapas del trabajo que no son de ninguna entrada (p. ej. el cierre del PDF)."""
+        medidas = Registro()
+        medidas.fusionar(registro)
+        self.totales.fusionar(medidas)
+        self._linea({"tipo": "cierre", "etapas": {k: round(v, 6) for k, v in medidas.etapas.items()},
+                     "contadores": medidas.contadores, "rss_mb": memoria_mb()})
+
+    def _lentos(self):
+        """Entradas que superan UMBRAL_LENTO_S y FACTOR_LENTO veces la mediana, de más a menos lentas."""
+        if not self.segundos:
+            return []
+        limite = max(UMBRAL_LENTO_S, FACTOR_LENTO * statistics.median(self.segundos))
+        lentos = sorted((l for l in self.lentos if l[0] >= limite), key=lambda l: l[0], reverse=True)
+        return [dict({"ruta": r, "segundos": round(s, 3)}, **({} if f is None else {"fotograma": f}))
+                for s, r, f in lentos[:LENTOS_MAX]]
+
+    def __exit__(self, tipo, valor, traza):
+        if self._perfilador is not None:
+            self._perfilador.disable()
+            try:
+                self._perfilador.dump_stats(self.perfil)
+            except OSError:
+                pass
+        resumen = {
+            "tipo": "resumen",
+            "segundos": round(time.perf_counter() - self._inicio, 6),
+            "entradas": self.entradas,
+            "etapas": {k: round(v, 6) for k, v in sorted(self.totales.etapas.items(), key=lambda e: -e[1])},
+            "contadores": self.totales.contadores,
+            "rss_pico_mb": rss_pico(),
+            "rss_pico_hijos_mb": rss_pico(hijos=True),
+            "lentos": self._lentos(),
+        }
+        if self.segundos:
+            resumen["mediana_entrada_s"] = round(statistics.median(self.segundos), 6)
+        if self.perfil:
+            resumen["perfil"] = self.perfil
+        if tipo is not None:
+            resumen["error"] = f"{tipo.__name__}: {valor}"
+        self._linea(resumen)
+        if self._f is not None:
+            self._f.close()
+        return False
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Lista de archivos de IMPDF: un modelo y una vista virtual.
+
+ModeloLista es la única copia de las rutas y de la selección. Sus operaciones
+trabajan por lotes: eliminar o llevar al principio/final k elementos es una sola
+pasada O(n), no k borrados e inserciones sueltos.
+
+ListaVirtual es un tk.Listbox que sólo contiene las filas visibles; al desplazarse
+se rellenan desde el modelo. Dibujar cuesta lo mismo con 20 que con 20.000 rutas,
+y la selección (que vive en el modelo) puede abarcar rangos de cualquier tamaño.
+"""
+import tkinter as tk
+import tkinter.font as tkfont
+
+class ModeloLista:
+    """Rutas en orden y conjunto de índices seleccionados. Avisa a los suscriptores tras cada cambio."""
+
+    def __init__(self):
+        self.rutas = []
+        self.seleccion = set()
+        self._suscriptores = []
+
+    def __len__(self):
+        return len(self.rutas)
+
+    def suscribir(self, funcion):
+        self._suscriptores.append(funcion)
+
+    def _avisar(self):
+        for funcion in self._suscriptores:
+            funcion()
+
+    def seleccionados(self):
+        return sorted(self.seleccion)
+
+    def seleccionar(self, indices):
+        self.seleccion = set(indices)
+        self._avisar()
+
+    # --- Contenido ---
+    def agregar(self, rutas):
+        self.rutas.extend(rutas)
+        self._avisar()
+
+    def reemplazar(self, rutas):
+        # Se modifica la lista en sitio: quien guarde una referencia a rutas la ve actualizada
+        self.rutas[:] = rutas
+        self.seleccion = set()
+        self._avisar()
+
+    def limpiar(self):
+        self.reemplazar([])
+
+    def eliminar(self):
+        """Quita los seleccionados en una pasada."""
+        if self.seleccion:
+            sel = self.seleccion
+            self.rutas[:] = [r for i, r in enumerate(self.rutas) if i not in sel]
+        self.seleccion = set()
+        self._avisar()
+
+    # --- Reordenado por lotes ---
+    def mover(self, paso):
+        """
+        Sube (paso=-1) o baja (paso=1) cada seleccionado una posición. Un bloque de
+        seleccionados que ya toca el borde se queda donde está. O(k).
+        """
+        n = len(self.rutas)
+        rutas = self.rutas
+        nueva = set()
+        for i in sorted(self.seleccion, reverse=paso > 0):
+            j = i + paso
+            if 0 <= j < n and j not in nueva:
+                rutas[i], rutas[j] = rutas[j], rutas[i]
+                nueva.add(j)
+            else:
+                nueva.add(i)
+        self.seleccion = nueva
+        self._avisar()
+
+    def _a_extremo(self, al_principio):
+        sel = self.seleccion
+        if not sel:
+            return
+        movidos = [r for i, r in enumerate(self.rutas) if i in sel]
+        resto = [r for i, r in enumerate(self.rutas) if i not in sel]
+        if al_principio:
+            self.rutas[:] = movidos + resto
+            self.seleccion = set(range(len(movidos)))
+        else:
+            self.rutas[:] = resto + movidos
+            self.seleccion = set(range(len(resto), len(self.rutas)))
+        self._avisar()
+
+    def mover_al_principio(self):
+        self._a_extremo(True)
+
+    def mover_al_final(self):
+        self._a_extremo(False)
+
+class ListaVirtual(tk.Frame):
+    """
+    Vista de un ModeloLista con scrollbar. Sólo las filas visibles están en el
+    Listbox; clic, Shift+clic, Ctrl+clic, arrastre, rueda y teclado se resuelven aquí
+    contra el modelo. Ofrece curselection, size, see y yview_scroll como un Listbox.
+    """
+
+    def __init__(self, padre, modelo, **opciones_listbox):
+        super().__init__(padre)
+        self.modelo = modelo
+        self.inicio = 0      # índice del modelo en la primera fila
+        self._ancla = None   # índice desde el que se extiende la selección con Shift
+        self._cursor = None  # último índice pulsado o alcanzado con el teclado
+        self.al_refrescar = []  # funciones a llamar tras cada refresco (p. ej. las miniaturas)
+        self.barra = tk.Scrollbar(self, orient=tk.VERTICAL, command=self._desde_barra)
+        self.listbox = tk.Listbox(self, selectmode=tk.EXTENDED, activestyle="none",
+                                  exportselection=False, **opciones_listbox)
+        self.barra.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        # alto de una fila del Listbox: interlineado + 1 + borde de selección arriba y abajo
+        self._alto_fila = (tkfont.Font(font=self.listbox.cget("font")).metrics("linespace") + 1
+                           + 2 * int(self.listbox.cget("selectborderwidth")))
+
+        # La selección vive en el modelo: se sustituyen las asociaciones del Listbox
+        lb = self.listbox
+        lb.bind("<Button-1>", self._clic)
+        lb.bind("<Shift-Button-1>", self._clic_shift)
+        lb.bind("<Control-Button-1>", self._clic_control)
+        lb.bind("<B1-Motion>", self._arrastre)
+        lb.bind("<ButtonRelease-1>", lambda e: "break")
+        lb.bind("<Double-Button-1>", lambda e: "break")
+        lb.bind("<MouseWheel>", lambda e: self._rueda(-1 if e.delta > 0 else 1))
+        lb.bind("<Button-4>", lambda e: self._rueda(-1))
+        lb.bind("<Button-5>", lambda e: self._rueda(1))
+        lb.bind("<Up>", lambda e: self._tecla(-1, e))
+        lb.bind("<Down>", lambda e: self._tecla(1, e))
+        lb.bind("<Shift-Up>", lambda e: self._tecla(-1, e, extender=True))
+        lb.bind("<Shift-Down>", lambda e: self._tecla(1, e, extender=True))
+        lb.bind("<Prior>", lambda e: self._tecla(-self._filas(), e))
+        lb.bind("<Next>", lambda e: self._tecla(self._filas(), e))
+        lb.bind("<Home>", lambda e: self._tecla(-len(self.modelo), e))
+        lb.bind("<End>", lambda e: self._tecla(len(self.modelo), e))
+        lb.bind("<Control-a>", self._todo)
+        lb.bind("<Configure>", lambda e: self.refrescar())
+        modelo.suscribir(self.refrescar)
+
+    # --- Interfaz tipo Listbox ---
+    def curselection(self):
+        return tuple(self.modelo.seleccionados())
+
+    def size(self):
+        return len(self.modelo)
+
+    def see(self, indice):
+        filas = self._filas()
+        if indice < self.inicio:
+            self.inicio = indice
+        elif indice >= self.inicio + filas:
+            self.inicio = indice - filas + 1
+        self.refrescar()
+
+    def yview_scroll(self, numero, que):
+        self.inicio += numero * (self._filas() if que == "pages" else 1)
+        self.refrescar()
+
+    def visibles(self):
+        """Rango de índices del modelo que se ven ahora en la lista."""
+        return range(self.inicio, min(len(self.modelo), self.inicio + self._filas() + 1))
+
+    # --- Dibujo ---
+    def _filas(self):
+        """Filas completas que caben en el Listbox."""
+        alto = self.listbox.winfo_height()
+        if alto <= 1:  # todavía sin dibujar
+            alto = int(self.listbox.cget("height")) * self._alto_fila
+        return max(1, alto // self._alto_fila)
+
+    def refrescar(self):
+        """Rellena el Listbox con las filas visibles del modelo y ajusta la barra."""
+        n = len(self.modelo)
+        filas = self._filas()
+        self.inicio = max(0, min(self.inicio, n - filas))
+        fin = min(n, self.inicio + filas + 1)  # +1: fila parcial al pie
+        lb = self.listbox
+        lb.delete(0, tk.END)
+        if fin > self.inicio:
+            lb.insert(tk.END, *self.modelo.rutas[self.inicio:fin])
+            sel = self.modelo.seleccion
+            for i in range(self.inicio, fin):
+                if i in sel:
+                    lb.selection_set(i - self.inicio)
+        if n:
+            self.barra.set(self.inicio / n, min(1.0, (self.inicio + filas) / n))
+        else:
+            self.barra.set(0.0, 1.0)
+        for funcion in self.al_refrescar:
+            funcion()
+
+    def _desde_barra(self, accion, *args):
+        if accion == "moveto":
+            self.inicio = int(float(args[0]) * len(self.modelo))
+            self.refrescar()
+        elif accion == "scroll":
+            self.yview_scroll(int(args[0]), args[1])
+
+    # --- Ratón y teclado ---
+    def _indice(self, evento):
+        """Índice del modelo bajo el puntero, o None si no hay fila."""
+        if not len(self.modelo):
+            return None
+        fila = max(0, min(self.listbox.nearest(evento.y), self._filas()))
+        return min(self.inicio + fila, len(self.modelo) - 1)
+
+    def _clic(self, evento):
+        self.listbox.focus_set()
+        i = self._indice(evento)
+        if i is not None:
+            self._ancla = self._cursor = i
+            self.modelo.seleccionar((i,))
+        return "break"
+
+    def _clic_shift(self, evento):
+        i = self._indice(evento)
+        if i is not None:
+            ancla = i if self._ancla is None else self._ancla
+            self._cursor = i
+            self.modelo.seleccionar(range(min(ancla, i), max(ancla, i) + 1))
+        return "break"
+
+    def _clic_control(self, evento):
+        i = self._indice(evento)
+        if i is not None:
+            self._ancla = self._cursor = i
+            self.modelo.seleccionar(self.modelo.seleccion ^ {i})
+        return "break"
+
+    def _arrastre(self, evento):
+        if self._ancla is None:
+            return "break"
+        if evento.y < 0:
+            self.yview_scroll(-1, "units")
+        elif evento.y > self.listbox.winfo_height():
+            self.yview_scroll(1, "units")
+        i = self._indice(evento)
+        if i is not None:
+            self._cursor = i
+            self.modelo.seleccionar(range(min(self._ancla, i), max(self._ancla, i) + 1))
+        return "break"
+
+    def _rueda(self, paso):
+        self.yview_scroll(paso * 3, "units")
+        return "break"
+
+    def _tecla(self, paso, evento, extender=False):
+        n = len(self.modelo)
+        if not n:
+            return "break"
+        actual = self.inicio if self._cursor is None else self._cursor
+        i = max(0, min(n - 1, actual + paso))
+        self._cursor = i
+        if extender and self._ancla is not None:
+            self.modelo.seleccionar(range(min(self._ancla, i), max(self._ancla, i) + 1))
+        else:
+            self._ancla = i
+            self.modelo.seleccionar((i,))
+        self.see(i)
+        return "break"
+
+    def _todo(self, evento):
+        self.modelo.seleccionar(range(len(self.modelo)))
+        return "break"
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Miniaturas de la lista de archivos de IMPDF.
+
+ServicioMiniaturas las genera en un pool de hilos, sólo para las rutas que se le
+piden (las filas visibles), y las guarda como PNG en una caché LRU en disco
+(CachePaginas.CacheDisco) indexada por la identidad del archivo: al volver a abrir
+un proyecto salen de la caché. Las imágenes se decodifican ya reducidas
+(MotorPDF.abrir_imagen_reducida); de los PDF se usa la primera página.
+
+PanelMiniaturas es el panel de tkinter que las muestra. Nunca espera al pool ni
+consulta el disco: recoge los resultados con after(), como el resto de la
+interfaz. Es el servicio el que comprueba en sus hilos si el archivo cambió
+(ruta, tamaño, mtime) y, sólo entonces, entrega una miniatura nueva que sustituye
+a la que el panel tiene en memoria para esa ruta.
+"""
+import base64
+import io
+import math
+import os
+import queue
+import threading
+import tkinter as tk
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageDraw
+
+from CachePaginas import CacheDisco
+from MotorPDF import abrir_imagen_reducida
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+# PyMuPDF es opcional: si está instalado la primera página de un PDF se renderiza;
+# si no, se usa la imagen más grande de la página (los PDF escaneados son eso).
+try:
+    import pymupdf as fitz
+except ImportError:
+    try:
+        import fitz
+    except ImportError:
+        fitz = None
+
+TAMANO = (60, 84)          # px, proporción de A4
+MINIATURAS_EN_MEMORIA = 512
+
+# --- Generación ---
+def _encajar(ancho, alto, tamano):
+    escala = min(tamano[0] / ancho, tamano[1] / alto)
+    return max(1, int(ancho * escala)), max(1, int(alto * escala))
+
+def _marcador(tamano, texto):
+    """Página en blanco con un texto, para lo que no puede dibujarse."""
+    img = Image.new("RGB", tamano, "white")
+    dibujo = ImageDraw.Draw(img)
+    dibujo.rectangle((0, 0, tamano[0] - 1, tamano[1] - 1), outline=(160, 160, 160))
+    dibujo.text((6, tamano[1] // 2 - 6), texto, fill=(120, 120, 120))
+    return img
+
+def _primera_pagina_pdf(ruta, tamano):
+    if fitz is not None:
+        with fitz.open(ruta) as doc:
+            pagina = doc[0]
+            zoom = min(tamano[0] / pagina.rect.width, tamano[1] / pagina.rect.height)
+            pix = pagina.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    if PdfReader is None:
+        return _marcador(tamano, "PDF")
+    pagina = PdfReader(ruta).pages[0]
+    xobjetos = pagina.get("/Resources", {}).get("/XObject", {})
+    mayor = None
+    for nombre, ref in xobjetos.items():
+        obj = ref.get_object()
+        if obj.get("/Subtype") == "/Image":
+            area = obj.get("/Width", 0) * obj.get("/Height", 0)
+            if mayor is None or area > mayor[0]:
+                mayor = (area, nombre)
+    if mayor is None:
+        return _marcador(tamano, "PDF")
+    img = pagina.images[mayor[1]].image
+    img.draft("RGB", _encajar(img.width, img.height, tamano))  # sólo actúa en JPEG
+    return img.convert("RGB")
+
+def generar_miniatura(ruta, tamano=TAMANO):
+    """Devuelve la miniatura de una imagen o de la primera página de un PDF como PNG."""
+    if ruta.lower().endswith(".pdf"):
+        img = _primera_pagina_pdf(ruta, tamano)
+        img = img.resize(_encajar(img.width, img.height, tamano), Image.LANCZOS)
+    else:
+        img, _, _ = abrir_imagen_reducida(ruta, lambda w, h: _encajar(w, h, tamano))
+    bio = io.BytesIO()
+    img.save(bio, format="PNG", optimize=True)
+    return bio.getvalue()
+
+def identidad(ruta):
+    """(ruta, tamaño, mtime): cambia cuando el archivo cambia en disco."""
+    try:
+        st = os.stat(ruta)
+    except OSError:
+        return (ruta, None, None)
+    return (ruta, st.st_size, st.st_mtime_ns)
+
+# --- Servicio en segundo plano ---
+class ServicioMiniaturas:
+    """
+    Pool de hilos que genera miniaturas bajo demanda. pedir() es inmediato: encola
+    lo que falta y descarta lo pedido antes que ya no se necesite. Los resultados
+    llegan a la cola 'resultados' como (identidad, png o None); una ruta cuya
+    identidad no cambió desde la última entrega no se vuelve a entregar, salvo
+    que el panel la olvide().
+    """
+
+    def __init__(self, directorio_cache, tamano=TAMANO, hilos=2, limite_mb=256):
+        self.tamano = tamano
+        try:
+            self.cache = CacheDisco(directorio_cache, limite_mb=limite_mb, extension=".png")
+        except OSError:
+            self.cache = None
+        self.resultados = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=hilos)
+        self._lock = threading.Lock()
+        self._deseadas = set()
+        self._pendientes = set()
+        self._entregadas = {}  # ruta -> identidad de la última miniatura entregada
+
+    def pedir(self, rutas):
+        """Pide las miniaturas de rutas (sustituye a la petición anterior)."""
+        with self._lock:
+            self._deseadas = set(rutas)
+            nuevas = [r for r in rutas if r not in self._pendientes]
+            self._pendientes.update(nuevas)
+        for ruta in nuevas:
+            self._pool.submit(self._trabajo, ruta)
+
+    def olvidar(self, ruta):
+        """La próxima vez que se pida ruta se entrega aunque no haya cambiado."""
+        with self._lock:
+            self._entregadas.pop(ruta, None)
+
+    def _trabajo(self, ruta):
+        version = identidad(ruta)
+        with self._lock:
+            if ruta not in self._deseadas or self._entregadas.get(ruta) == version:
+                # la fila ya no está a la vista, o su miniatura sigue valiendo
+                self._pendientes.discard(ruta)
+                return
+        datos = None
+        try:
+            clave = None
+            if self.cache is not None:
+                clave = self.cache.clave(ruta, {"miniatura": list(self.tamano)})
+                datos = self.cache.obtener(clave)
+            if datos is None:
+                datos = generar_miniatura(ruta, self.tamano)
+                if clave:
+                    self.cache.guardar(clave, datos)
+        except Exception:
+            datos = None
+        finally:
+            with self._lock:
+                self._pendientes.discard(ruta)
+                self._entregadas[ruta] = version
+        self.resultados.put((version, datos))
+
+    def cerrar(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+# --- Panel ---
+class PanelMiniaturas(tk.Frame):
+    """
+    Rejilla con las miniaturas de las filas visibles de una ListaArchivos.ListaVirtual,
+    con barra de desplazamiento si no caben. Los seleccionados se marcan y un clic
+    en una miniatura la selecciona. Las que no pueden generarse muestran un
+    marcador y no se vuelven a pedir mientras el archivo no cambie.
+    """
+
+    def __init__(self, padre, servicio, vista, columnas=3):
+        super().__init__(padre)
+        self.servicio = servicio
+        self.vista = vista
+        self.modelo = vista.modelo
+        self.columnas = columnas
+        ancho, alto = servicio.tamano
+        self._celda = (ancho + 12, alto + 22)
+        self.canvas = tk.Canvas(self, width=self._celda[0] * columnas, bg="#f0f0f0",
+                                highlightthickness=0, yscrollincrement=self._celda[1])
+        barra = tk.Scrollbar(self, orient=tk.VERTICAL, command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=barra.set)
+        barra.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self._imagenes = OrderedDict()  # ruta -> PhotoImage (LRU en memoria)
+        self._indices = range(0)
+        self._fallo = None              # marcador compartido de las que fallan
+        self.canvas.bind("<Button-1>", self._clic)
+        self.canvas.bind("<MouseWheel>", lambda e: self._rueda(-1 if e.delta > 0 else 1))
+        self.canvas.bind("<Button-4>", lambda e: self._rueda(-1))
+        self.canvas.bind("<Button-5>", lambda e: self._rueda(1))
+        vista.al_refrescar.append(self.actualizar)
+        self.after(100, self._recoger)
+
+    def actualizar(self):
+        """
+        Pide las miniaturas de las filas visibles y redibuja. Se piden todas: el
+        servicio sólo entrega las que faltan o cuyo archivo cambió.
+        """
+        self._indices = self.vista.visibles()
+        rutas = self.modelo.rutas
+        self.servicio.pedir([rutas[i] for i in self._indices])
+        self._dibujar()
+
+    def _dibujar(self):
+        c = self.canvas
+        c.delete("all")
+        ancho, alto = self.servicio.tamano
+        rutas = self.modelo.rutas
+        filas = math.ceil(len(self._indices) / self.columnas)
+        c.configure(scrollregion=(0, 0, self._celda[0] * self.columnas, filas * self._celda[1] + 4))
+        for k, i in enumerate(self._indices):
+            x = (k % self.columnas) * self._celda[0] + 6
+            y = (k // self.columnas) * self._celda[1] + 4
+            foto = self._imagenes.get(rutas[i])
+            if foto is not None:
+                c.create_image(x + ancho // 2, y + alto // 2, image=foto)
+            else:
+                c.create_rectangle(x, y, x + ancho, y + alto, outline="#c0c0c0", fill="white")
+            if i in self.modelo.seleccion:
+                c.create_rectangle(x - 3, y - 3, x + ancho + 3, y + alto + 3, outline="#2196F3", width=2)
+            c.create_text(x + ancho // 2, y + alto + 9, text=str(i + 1), fill="#505050")
+
+    def _clic(self, evento):
+        # coordenadas del canvas, no de la ventana: puede estar desplazado
+        x, y = self.canvas.canvasx(evento.x), self.canvas.canvasy(evento.y)
+        columna = min(int(x // self._celda[0]), self.columnas - 1)
+        k = int(y // self._celda[1]) * self.columnas + columna
+        if 0 <= k < len(self._indices):
+            self.modelo.seleccionar((self._indices[k],))
+
+    def _rueda(self, filas):
+        self.canvas.yview_scroll(filas, "units")
+
+    def _foto_fallo(self):
+        if self._fallo is None:
+            bio = io.BytesIO()
+            _marcador(self.servicio.tamano, "?").save(bio, format="PNG")
+            self._fallo = tk.PhotoImage(data=base64.b64encode(bio.getvalue()), format="png")
+        return self._fallo
+
+    def _recoger(self):
+        nuevas = False
+        try:
+            while True:
+                version, datos = self.servicio.resultados.get_nowait()
+                if datos is None:
+                    # se guarda el marcador para no pedirla en cada refresco
+                    foto = self._foto_fallo()
+                else:
+                    foto = tk.PhotoImage(data=base64.b64encode(datos), format="png")
+                ruta = version[0]
+                self._imagenes[ruta] = foto
+                self._imagenes.move_to_end(ruta)
+                while len(self._imagenes) > MINIATURAS_EN_MEMORIA:
+                    self.servicio.olvidar(self._imagenes.popitem(last=False)[0])
+                nuevas = True
+        except queue.Empty:
+            pass
+        if nuevas:
+            self._dibujar()
+        self.after(100, self._recoger)
@@ -0,0 +1,1776 @@
+#!/usr/bin/env python3
+"""
+Motor de generación de PDF sin interfaz gráfica.
+
+Contiene la conversión de imágenes y la normalización de páginas a A4 que usa
+IMPDF.py, de modo que pueda llamarse desde scripts, servidores sin pantalla o
+desde la línea de comandos:
+
+    python MotorPDF.py -o salida.pdf imagen1.jpg documento.pdf ...
+    python MotorPDF.py -p proyecto.txt -o salida.pdf
+    python MotorPDF.py -p proyecto.txt -o salida.pdf -j 0   (todos los núcleos)
+    python MotorPDF.py -p proyecto.json -o salida.pdf       (proyecto con metadatos)
+    python MotorPDF.py -p proyecto.json -o salida.pdf --linealizar --paginas-volumen 500
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from PIL import Image, ImageChops, features
+
+from CachePaginas import CacheDisco
+from Instrumentacion import (
+    Informe, etapa, iniciar_registro, medir_etapa, memoria_mb, terminar_registro,
+)
+from Proyectos import cargar_proyecto, guardar_proyecto, hash_archivo, vigentes
+
+try:
+    from pypdf import PdfReader, PdfWriter, Transformation
+    from pypdf.constants import UserAccessPermissions
+    from pypdf.errors import DependencyError
+    from pypdf.generic import (
+        ArrayObject, DecodedStreamObject, DictionaryObject, EncodedStreamObject,
+        FloatObject, NameObject, RectangleObject, StreamObject,
+    )
+    from AdaptadorPypdf import datos_codificados, stream_codificado
+    from EscritorStream import EscritorStream
+except Exception:
+    PdfReader = None
+    PdfWriter = None
+    Transformation = None
+    RectangleObject = None
+    EscritorStream = None
+    ArrayObject = DecodedStreamObject = DictionaryObject = EncodedStreamObject = None
+    FloatObject = NameObject = None
+    StreamObject = None
+    UserAccessPermissions = None
+    DependencyError = ImportError
+
+# pikepdf (qpdf) es opcional: sólo hace falta para la salida linealizada
+try:
+    import pikepdf
+except ImportError:
+    pikepdf = None
+
+## Tabla de formatos con equivalencia en puntos
+
+#| Formato        | Medidas (mm)       | Medidas (pulgadas) | Equivalente en píxeles (300 dpi) | Medidas (pts)            |
+#|----------------|--------------------|--------------------|----------------------------------|--------------------------|
+#| Carta (Letter) | 216 × 279 mm       | 8.5 × 11 in        | 2550 × 3300 px                   | 612 × 792 pts            |
+#| Doble Carta    | 432 × 279 mm       | 17 × 11 in         | 5100 × 3300 px                   | 1224 × 792 pts           |
+#| Oficio (Legal) | 216 × 356 mm       | 8.5 × 14 in        | 2550 × 4200 px                   | 612 × 1008 pts           |
+#| A4             | 210 × 297 mm       | 8.27 × 11.7 in     | 2480 × 3508 px                   | 595 × 842 pts            |
+#| A3             | 297 × 420 mm       | 11.7 × 16.5 in     | 3508 × 4961 px                   | 842 × 1188 pts           |
+#| Tabloide       | 279 × 432 mm       | 11 × 17 in         | 3300 × 5100 px                   | 792 × 1224 pts           |
+
+# --- Configuración ---
+A4_WIDTH_PT = 595.276  # puntos (72 pts = 1 inch) ~210 mm
+A4_HEIGHT_PT = 841.89  # puntos ~297 mm
+TARGET_DPI = 300       # DPI objetivo
+
+def pts_to_pixels(points, dpi=TARGET_DPI):
+    inches = points / 72.0
+    return int(round(inches * dpi))
+
+# Parámetros de conversión de imágenes. Se pasan tal cual a los procesos del pool.
+OPCIONES_DEFECTO = {
+    "jpeg_directo": True,  # incrustar JPEG sin decodificar ni recomprimir
+    "modo": "lienzo",      # "lienzo": A4 completo a TARGET_DPI; "nativo": resolución original
+    "dpi_max": None,       # modo nativo: reducir las imágenes que superen estos DPI en la página
+    "calidad_jpeg": 75,    # calidad al recodificar a JPEG (la de Pillow por defecto)
+    "detectar_color": True,  # guardar en gris o bitonal (CCITT G4) las páginas que lo son
+    "bytes_pagina": None,  # presupuesto por imagen: DPI y calidad se eligen para no pasarlo
+}
+MODOS = ("lienzo", "nativo")
+
+def opciones_conversion(**cambios):
+    """Devuelve un dict de opciones de conversión con los valores por defecto aplicados."""
+    desconocidas = set(cambios) - set(OPCIONES_DEFECTO)
+    if desconocidas:
+        raise ValueError(f"Unknown conversion options: {', '.join(sorted(desconocidas))}")
+    opciones = dict(OPCIONES_DEFECTO)
+    opciones.update(cambios)
+    if opciones["modo"] not in MODOS:
+        raise ValueError(f"Unknown mode: {opciones['modo']} (use {', '.join(MODOS)})")
+    return opciones
+
+# --- Permisos (mismos nombres que BloqueoDocumentos / pikepdf.Permissions) ---
+# Bit de /P de cada permiso (ISO 32000, tabla 22)
+BITS_PERMISOS = {
+    "print_lowres": 1 << 2,
+    "modify_other": 1 << 3,
+    "extract": 1 << 4,
+    "modify_annotation": 1 << 5,
+    "modify_form": 1 << 8,
+    "accessibility": 1 << 9,
+    "modify_assembly": 1 << 10,
+    "print_highres": 1 << 11,
+}
+
+def permisos_pdf(bloqueos):
+    """
+    Valor /P para {permiso: True si se bloquea}; los permisos ausentes se bloquean.
+    Se reproduce lo que guarda BloqueoDocumentos (qpdf) con R=6: accessibility
+    siempre concedido y print_highres implica print_lowres, así un documento
+    generado ya protegido no se vuelve a cifrar al pasarlo por el lote.
+    """
+    bloqueos = dict(bloqueos)
+    bloqueos["accessibility"] = False
+    if not bloqueos.get("print_highres", True):
+        bloqueos["print_lowres"] = False
+    p = (2**32 - 1) - 3  # bits reservados a 1, salvo los bits 1 y 2
+    for nombre, bit in BITS_PERMISOS.items():
+        if bloqueos.get(nombre, True):
+            p &= ~bit
+    return p
+
+# --- Abrir imágenes decodificando a escala reducida ---
+def _a_modo_pdf(img):
+    """Convierte a "L" o "RGB", los dos modos que se guardan en el PDF."""
+    if img.mode in ("L", "RGB"):
+        return img
+    return img.convert("L" if img.mode in ("1", "I", "I;16", "F") else "RGB")
+
+NIVELES_JPEG2000 = 5  # niveles de resolución que se piden como máximo a un JPEG 2000
+
+def abrir_imagen_reducida(path, tamano_final, fotograma=0):
+    """
+    Abre la imagen y la deja en el tamaño tamano_final(ancho, alto) -> (ancho, alto),
+    en modo "L" o "RGB". Antes de decodificar calcula el tamaño final y pide al
+    decodificador la escala reducida más cercana por encima: escalado DCT (1/2, 1/4,
+    1/8) en JPEG y niveles de resolución en JPEG 2000. LANCZOS sólo recorre el
+    factor restante (y reduce() entero en los formatos sin escalado nativo).
+    fotograma: página de un TIFF o GIF multipágina; sólo se decodifica esa.
+    Devuelve (img, tamaño_original, formato).
+    """
+    with etapa("decodificar"):
+        img = Image.open(path)
+        if fotograma:
+            img.seek(fotograma)
+        formato = img.format
+        original = img.size
+        destino = tamano_final(*original)
+
+        if destino[0] < original[0] and destino[1] < original[1]:
+            if formato == "JPEG":
+                img.draft("L" if img.mode == "L" else "RGB", destino)
+            elif formato == "JPEG2000":
+                nivel = 0
+                while (nivel < NIVELES_JPEG2000 and original[0] >> (nivel + 1) >= destino[0]
+                       and original[1] >> (nivel + 1) >= destino[1]):
+                    nivel += 1
+                img.reduce = nivel
+        try:
+            img.load()
+        except OSError:
+            if formato != "JPEG2000":
+                raise
+            # el archivo tiene menos niveles de resolución: decodificar completo
+            img = Image.open(path)
+            img.load()
+        img = _a_modo_pdf(img)
+
+    if img.size != destino:
+        with etapa("redimensionar"):
+            img = img.resize(destino, Image.LANCZOS, reducing_gap=3.0)
+    return img, original, formato
+
+# --- Detección de páginas en gris y bitonales ---
+UMBRAL_CROMA = 32           # diferencia entre canales a partir de la cual un píxel tiene color
+FRACCION_COLOR = 0.0002     # fracción de píxeles con color a partir de la cual la página es color
+GRISES_INTERMEDIOS = (48, 247)  # tonos que no son ni negro ni blanco (papel: 248-255);
+                                # los grises claros (sombreados, cabeceras, sellos) cuentan
+FRACCION_INTERMEDIOS = 0.5      # fracción máxima de tonos intermedios entre los píxeles no
+                                # blancos de una página bitonal (bordes suavizados del texto)
+
+@medir_etapa("detectar_color")
+def imagen_compacta(img):
+    """
+    Devuelve la imagen en el modo más compacto que la representa: "1" si es
+    prácticamente blanco y negro (umbral en 128, sin tramado), "L" si no tiene
+    color y "RGB" si lo tiene. img debe estar en modo "1", "L" o "RGB".
+    Una foto o un sombreado tienen sobre todo tonos intermedios; un texto escaneado
+    sólo los tiene en el borde de los trazos. Un gris claro cuenta como intermedio:
+    con el umbral en 128 se perdería.
+    """
+    if img.mode == "1":
+        return img
+    if img.mode == "RGB":
+        r, g, b = img.split()
+        croma = ImageChops.lighter(
+            ImageChops.lighter(ImageChops.difference(r, g), ImageChops.difference(g, b)),
+            ImageChops.difference(r, b),
+        )
+        if sum(croma.histogram()[UMBRAL_CROMA:]) > FRACCION_COLOR * img.width * img.height:
+            return img
+        img = img.convert("L")
+    bajo, alto = GRISES_INTERMEDIOS
+    histograma = img.histogram()
+    if sum(histograma[bajo:alto + 1]) <= FRACCION_INTERMEDIOS * sum(histograma[:alto + 1]):
+        return img.convert("1", dither=Image.Dither.NONE)
+    return img
+
+# --- Convertir imagen a PDF A4 en memoria escalando siempre ---
+def image_to_a4_pdf_bytes_scale_all(path, detectar_color=False, fotograma=0):
+    """
+    Escala la imagen (upscale o downscale) para que ocupe lo máximo posible dentro de A4
+    manteniendo la relación de aspecto. Devuelve BytesIO con PDF de una página A4.
+    Las imágenes enormes se decodifican ya reducidas (ver abrir_imagen_reducida).
+    detectar_color: guardar la página en gris (JPEG) o bitonal (CCITT G4) si la
+    imagen lo es (ver imagen_compacta); si no, siempre en color.
+    fotograma: página de un TIFF o GIF multipágina.
+    """
+    px_w = pts_to_pixels(A4_WIDTH_PT, TARGET_DPI)
+    px_h = pts_to_pixels(A4_HEIGHT_PT, TARGET_DPI)
+
+    def tamano_a4(orig_w, orig_h):
+        # Calcular factor para escalar la imagen hasta que una de las dimensiones llene A4
+        scale_w = px_w / orig_w
+        scale_h = px_h / orig_h
+        scale = min(scale_w, scale_h)  # para que quepa dentro de A4
+        # Si quieres que llene completamente (posible recorte), usar max(scale_w, scale_h)
+        return max(1, int(round(orig_w * scale))), max(1, int(round(orig_h * scale)))
+
+    # Redimensionar (si scale>1 se amplía; si <1 se reduce)
+    img_resized, _, _ = abrir_imagen_reducida(path, tamano_a4, fotograma)
+    new_w, new_h = img_resized.size
+    if detectar_color:
+        img_resized = imagen_compacta(img_resized)
+    modo = img_resized.mode if detectar_color else "RGB"
+
+    # Crear fondo blanco A4 y pegar la imagen centrada
+    with etapa("codificar"):
+        fondo = Image.new(modo, (px_w, px_h), "white")
+        offset_x = (px_w - new_w) // 2
+        offset_y = (px_h - new_h) // 2
+        fondo.paste(img_resized, (offset_x, offset_y))
+
+        bio = io.BytesIO()
+        fondo.save(bio, format="PDF", resolution=TARGET_DPI)
+    bio.seek(0)
+    return bio
+
+# --- PDF de una página con una imagen ya codificada ---
+def _num(valor):
+    return f"{valor:.4f}".rstrip("0").rstrip(".")
+
+def pdf_una_pagina(datos, ancho_px, alto_px, espacio_color="/DeviceRGB", bits=8,
+                   filtro="/DCTDecode", extra_imagen="", caja=None,
+                   ancho_pt=A4_WIDTH_PT, alto_pt=A4_HEIGHT_PT):
+    """
+    Construye un PDF de una página ancho_pt x alto_pt con el stream de imagen 'datos'
+    (ya codificado con 'filtro') colocado mediante una matriz en el contenido, sin
+    remuestrear píxeles. caja=(x, y, ancho, alto) en puntos; por defecto la imagen se
+    escala para ocupar lo máximo posible de la página y se centra.
+    extra_imagen: entradas adicionales del diccionario de la imagen (p. ej. /DecodeParms).
+    Devuelve los bytes del PDF.
+    """
+    if caja is None:
+        escala = min(ancho_pt / ancho_px, alto_pt / alto_px)
+        w = ancho_px * escala
+        h = alto_px * escala
+        caja = ((ancho_pt - w) / 2.0, (alto_pt - h) / 2.0, w, h)
+    x, y, w, h = caja
+
+    contenido = f"q {_num(w)} 0 0 {_num(h)} {_num(x)} {_num(y)} cm /Im0 Do Q".encode("ascii")
+    filtro_txt = f"/Filter {filtro}" if filtro else ""
+    objetos = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_num(ancho_pt)} {_num(alto_pt)}] "
+         f"/Resources << /XObject << /Im0 4 0 R >> /ProcSet [/PDF /ImageB /ImageC] >> "
+         f"/Contents 5 0 R >>").encode("ascii"),
+        (f"<< /Type /XObject /Subtype /Image /Width {ancho_px} /Height {alto_px} "
+         f"/ColorSpace {espacio_color} /BitsPerComponent {bits} {filtro_txt} {extra_imagen} "
+         f"/Length {len(datos)} >>\nstream\n").encode("ascii") + datos + b"\nendstream",
+        f"<< /Length {len(contenido)} >>\nstream\n".encode("ascii") + contenido + b"\nendstream",
+    ]
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for i, obj in enumerate(objetos, start=1):
+        offsets.append(out.tell())
+        out.write(f"{i} 0 obj\n".encode("ascii") + obj + b"\nendobj\n")
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n".encode("ascii"))
+    for off in offsets:
+        out.write(f"{off:010d} 00000 n \n".encode("ascii"))
+    out.write(f"trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii"))
+    return out.getvalue()
+
+# --- JPEG directo: incrustar el stream DCT original ---
+ESPACIOS_JPEG = {"L": "/DeviceGray", "RGB": "/DeviceRGB"}
+
+@medir_etapa("incrustar")
+def jpeg_a_pdf_directo(path, dpi_max=None):
+    """
+    Incrusta el JPEG original (sin decodificar ni recomprimir) en una página A4; el
+    escalado y centrado se hacen con la matriz de colocación. Devuelve los bytes del
+    PDF, o None si el archivo no es un JPEG apto (CMYK, 12 bits, por encima de
+    dpi_max, etc.) y debe convertirse por la ruta normal.
+    """
+    with Image.open(path) as img:
+        if img.format != "JPEG" or img.mode not in ESPACIOS_JPEG:
+            return None
+        ancho_px, alto_px = img.size
+        if tamano_nativo(ancho_px, alto_px, dpi_max) != (ancho_px, alto_px):
+            return None
+        espacio = ESPACIOS_JPEG[img.mode]
+    with open(path, "rb") as f:
+        datos = f.read()
+    return pdf_una_pagina(datos, ancho_px, alto_px, espacio, 8, "/DCTDecode")
+
+# --- TIFF directo: incrustar los datos CCITT o JPEG de una página ---
+FOTOMETRIA_JPEG = {1: "/DeviceGray", 2: "/DeviceRGB", 6: "/DeviceRGB"}  # BlackIsZero, RGB, YCbCr
+SOF_BASE = (0xC0, 0xC1)  # baseline y secuencial extendido (Huffman)
+
+def _tag(img, numero, defecto=None):
+    """Valor de un tag TIFF; los de un solo elemento se devuelven sin tupla."""
+    valor = img.tag_v2.get(numero, defecto)
+    return valor[0] if isinstance(valor, tuple) and len(valor) == 1 else valor
+
+def _segmentos_jpeg(datos):
+    """(marcador, inicio, fin) de los segmentos de cabecera de un JPEG hasta el SOS incluido."""
+    pos = 2
+    segmentos = []
+    while pos + 4 <= len(datos) and datos[pos] == 0xFF:
+        marcador = datos[pos + 1]
+        fin = pos + 2 + int.from_bytes(datos[pos + 2:pos + 4], "big")
+        segmentos.append((marcador, pos, fin))
+        if marcador == 0xDA:
+            return segmentos
+        pos = fin
+    return None
+
+def _unir_tiras_jpeg(tiras, ancho, alto, filas_por_tira):
+    """
+    Une las tiras JPEG de una página de TIFF (cada una es un JPEG con sus propias
+    filas) en un único JPEG baseline: la cabecera de la primera con el alto total y
+    los datos de cada tira separados por marcadores de reinicio (RSTn), que ponen a
+    cero los predictores igual que el comienzo de una tira. Devuelve None si las
+    tiras no lo permiten (progresivas, con DRI propio, cabeceras distintas...).
+    """
+    cabecera = None
+    cuerpos = []
+    for tira in tiras:
+        segmentos = _segmentos_jpeg(tira)
+        if segmentos is None or tira[-2:] != b"\xff\xd9":
+            return None
+        fin_sos = segmentos[-1][2]
+        propia = tira[:fin_sos]
+        if cabecera is None:
+            sof = [sg for sg in segmentos if 0xC0 <= sg[0] <= 0xCF and sg[0] not in (0xC4, 0xC8, 0xCC)]
+            if (len(sof) != 1 or sof[0][0] not in SOF_BASE
+                    or any(sg[0] == 0xDD for sg in segmentos)):
+                return None
+            inicio_sof = sof[0][1]
+            componentes = tira[inicio_sof + 9]
+            factores = [tira[inicio_sof + 11 + 3 * c] for c in range(componentes)]
+            alto_mcu = 8 if componentes == 1 else 8 * max(f & 0x0F for f in factores)
+            ancho_mcu = 8 if componentes == 1 else 8 * max(f >> 4 for f in factores)
+            if filas_por_tira % alto_mcu:
+                return None
+            intervalo = -(-ancho // ancho_mcu) * (filas_por_tira // alto_mcu)
+            if intervalo > 0xFFFF:
+                return None
+            cabecera = propia
+            inicio_sos = segmentos[-1][1]
+        elif (len(propia) != len(cabecera)
+              or propia[:inicio_sof + 5] + propia[inicio_sof + 7:] != cabecera[:inicio_sof + 5] + cabecera[inicio_sof + 7:]):
+            return None
+        cuerpos.append(tira[fin_sos:-2])
+    cabecera = (cabecera[:inicio_sof + 5] + alto.to_bytes(2, "big") + cabecera[inicio_sof + 7:inicio_sos]
+                + b"\xff\xdd\x00\x04" + intervalo.to_bytes(2, "big") + cabecera[inicio_sos:])
+    partes = [cabecera]
+    for i, cuerpo in enumerate(cuerpos):
+        if i:
+            partes.append(bytes((0xFF, 0xD0 + (i - 1) % 8)))
+        partes.append(cuerpo)
+    partes.append(b"\xff\xd9")
+    return b"".join(partes)
+
+@medir_etapa("incrustar")
+def tiff_a_pdf_directo(path, fotograma=0, dpi_max=None):
+    """
+    Incrusta los datos comprimidos de una página de TIFF (sin decodificarla) en una
+    página A4, como jpeg_a_pdf_directo. Vale para las páginas en CCITT (G3 y Huffman
+    modificado, cuyas tiras se concatenan; G4 de una sola tira) con /CCITTFaxDecode
+    y en JPEG con /DCTDecode (tablas JPEGTables insertadas y tiras unidas, ver
+    _unir_tiras_jpeg). Una página G4 de varias tiras se decodifica y vuelve a
+    codificarse en G4: sin pérdida y sin pasar por el lienzo. Devuelve los bytes del
+    PDF, o None si la página no es apta (teselas, orden de bits inverso, orientación,
+    por encima de dpi_max...) y debe convertirse por la ruta normal.
+    """
+    with Image.open(path) as img:
+        if img.format != "TIFF":
+            return None
+        if fotograma:
+            img.seek(fotograma)
+        compresion = img.info.get("compression")
+        offsets = img.tag_v2.get(273)
+        largos = img.tag_v2.get(279)
+        if (compresion not in ("group4", "group3", "tiff_ccitt", "jpeg")
+                or not offsets or not largos or len(offsets) != len(largos)
+                or 322 in img.tag_v2                 # TileWidth: teselas
+                or _tag(img, 266, 1) != 1            # FillOrder
+                or _tag(img, 274, 1) != 1            # Orientation
+                or _tag(img, 284, 1) != 1):          # PlanarConfiguration
+            return None
+        ancho_px, alto_px = img.size
+        if tamano_nativo(ancho_px, alto_px, dpi_max) != (ancho_px, alto_px):
+            return None
+        fotometria = _tag(img, 262)
+        tablas = _tag(img, 347)  # JPEGTables
+        opciones_t4 = _tag(img, 292, 0)  # T4Options
+        filas_por_tira = _tag(img, 278, alto_px)
+        if compresion == "group4" and len(offsets) > 1:
+            if img.mode != "1" or not features.check("libtiff"):
+                return None
+            datos = _codificar_g4(img)
+            fotometria = 1  # Pillow guarda "1" como BlackIsZero
+            offsets = ()
+    tiras = []
+    with open(path, "rb") as f:
+        for inicio, largo in zip(offsets, largos):
+            f.seek(inicio)
+            tiras.append(f.read(largo))
+            if len(tiras[-1]) != largo:
+                return None
+
+    if compresion == "jpeg":
+        if fotometria not in FOTOMETRIA_JPEG:
+            return None
+        datos = tiras[0] if len(tiras) == 1 else _unir_tiras_jpeg(tiras, ancho_px, alto_px, filas_por_tira)
+        if datos is None:
+            return None
+        if tablas:
+            # las tablas van entre el SOI de la página y sus propios segmentos
+            tablas = bytes(tablas)
+            datos = datos[:2] + tablas[2:-2] + datos[2:]
+        # en fotometría RGB las componentes no están en YCbCr
+        extra = "/DecodeParms << /ColorTransform 0 >>" if fotometria == 2 else ""
+        return pdf_una_pagina(datos, ancho_px, alto_px, FOTOMETRIA_JPEG[fotometria], 8, "/DCTDecode", extra)
+
+    if fotometria not in (0, 1):  # WhiteIsZero, BlackIsZero
+        return None
+    if tiras:
+        datos = b"".join(tiras)
+    if compresion == "group4":
+        parametros = "/K -1"
+    elif compresion == "group3":
+        # 1D o 2D según T4Options; los bits de relleno antes de cada EOL (bit 2) los
+        # admite el filtro sin EncodedByteAlign, que significa otra cosa
+        parametros = "/K 1" if opciones_t4 & 1 else "/K 0"
+    else:
+        parametros = "/K 0 /EncodedByteAlign true"  # Huffman modificado: cada fila empieza en un byte
+    parametros += f" /Columns {ancho_px} /Rows {alto_px}"
+    if fotometria == 1:
+        parametros += " /BlackIs1 true"
+    return pdf_una_pagina(datos, ancho_px, alto_px, "/DeviceGray", 1, "/CCITTFaxDecode",
+                          f"/DecodeParms << {parametros} >>")
+
+def incrustar_directo(path, fotograma=0, dpi_max=None):
+    """PDF con los datos comprimidos originales (JPEG o página de TIFF), o None."""
+    if fotograma == 0:
+        datos = jpeg_a_pdf_directo(path, dpi_max)
+        if datos is not None:
+            return datos
+    return tiff_a_pdf_directo(path, fotograma, dpi_max)
+
+# --- Modo nativo: sin lienzo A4, la imagen conserva su resolución ---
+def tamano_nativo(ancho_px, alto_px, dpi_max=None):
+    """
+    Tamaño en píxeles con el que se guarda una imagen en modo nativo: el original, o
+    reducido si al ocupar la página A4 superaría dpi_max. Nunca se amplía.
+    """
+    dpi = 72.0 / min(A4_WIDTH_PT / ancho_px, A4_HEIGHT_PT / alto_px)
+    if dpi_max and dpi > dpi_max:
+        factor = dpi_max / dpi
+        return max(1, int(round(ancho_px * factor))), max(1, int(round(alto_px * factor)))
+    return ancho_px, alto_px
+
+def _codificar_g4(img):
+    """Codifica una imagen "1" en CCITT Group 4 (vía libtiff) y devuelve la tira de datos."""
+    bio = io.BytesIO()
+    # una sola tira, como hace el plugin PDF de Pillow
+    img.save(bio, format="TIFF", compression="group4", strip_size=(img.width + 7) // 8 * img.height)
+    bio.seek(0)
+    with Image.open(bio) as tif:
+        inicio = tif.tag_v2[273]  # StripOffsets
+        largo = tif.tag_v2[279]   # StripByteCounts
+    inicio = inicio[0] if isinstance(inicio, tuple) else inicio
+    largo = largo[0] if isinstance(largo, tuple) else largo
+    return bio.getvalue()[inicio:inicio + largo]
+
+@medir_etapa("codificar")
+def codificar_imagen(img, sin_perdida, calidad_jpeg=75):
+    """
+    Codifica la imagen para un XObject. Devuelve (datos, espacio_color, bits, filtro,
+    extra_imagen). Las imágenes "1" van en CCITT G4 (o Flate a 1 bit si Pillow no
+    tiene libtiff). Para el resto sin_perdida=True usa Flate (capturas, PNG); si no,
+    JPEG con calidad_jpeg.
+    """
+    if img.mode == "1":
+        if features.check("libtiff"):
+            parametros = (f"/DecodeParms << /K -1 /Columns {img.width} /Rows {img.height} "
+                          f"/BlackIs1 true >>")
+            return _codificar_g4(img), "/DeviceGray", 1, "/CCITTFaxDecode", parametros
+        return zlib.compress(img.tobytes(), 6), "/DeviceGray", 1, "/FlateDecode", ""
+    img = _a_modo_pdf(img)
+    espacio = "/DeviceGray" if img.mode == "L" else "/DeviceRGB"
+    if sin_perdida:
+        return zlib.compress(img.tobytes(), 6), espacio, 8, "/FlateDecode", ""
+    bio = io.BytesIO()
+    img.save(bio, format="JPEG", quality=calidad_jpeg)
+    return bio.getvalue(), espacio, 8, "/DCTDecode", ""
+
+def imagen_a_pdf_nativo(path, opciones, fotograma=0):
+    """
+    Coloca la imagen centrada en A4 con la matriz del contenido de la página, sin
+    pintar un lienzo de 2480x3508: los márgenes no ocupan píxeles y las imágenes
+    pequeñas no se amplían. Las que superan opciones["dpi_max"] se reducen.
+    Con opciones["detectar_color"] las páginas en gris o bitonales se codifican
+    como tales. fotograma: página de un TIFF o GIF multipágina. Devuelve los bytes
+    del PDF.
+    """
+    dpi_max = opciones["dpi_max"]
+    if opciones["jpeg_directo"]:
+        datos = incrustar_directo(path, fotograma, dpi_max)
+        if datos is not None:
+            return datos
+
+    img, _, formato = abrir_imagen_reducida(path, lambda w, h: tamano_nativo(w, h, dpi_max), fotograma)
+    if opciones["detectar_color"]:
+        img = imagen_compacta(img)
+    datos, espacio, bits, filtro, extra = codificar_imagen(img, formato != "JPEG", opciones["calidad_jpeg"])
+    return pdf_una_pagina(datos, img.width, img.height, espacio, bits, filtro, extra)
+
+# --- Modo presupuesto: DPI y calidad por página para no pasar de un tamaño ---
+NIVELES_DPI = (300, 250, 200, 150, 120, 100, 75)
+CALIDADES_JPEG = (85, 75, 60)     # por cada nivel de DPI
+CALIDADES_ULTIMO_NIVEL = (45, 30)  # sólo en el DPI más bajo
+BANDAS_ESTIMACION = 8
+SOBRECARGA_PAGINA = 1024       # bytes de cada página en la salida además de la imagen
+SOBRECARGA_DOCUMENTO = 4096    # catálogo, árbol de páginas, xref...
+BYTES_PAGINA_MIN = 8192
+
+def _candidatos(bitonal, sin_perdida, dpi_inicial):
+    """
+    (dpi, calidad) en orden de preferencia; calidad None = sin pérdida (Flate, o G4
+    si la página es bitonal). Se baja antes la calidad que la resolución.
+    """
+    niveles = [dpi_inicial] + [d for d in NIVELES_DPI if d < dpi_inicial]
+    if bitonal:
+        return [(d, None) for d in niveles]
+    candidatos = [(dpi_inicial, None)] if sin_perdida else []
+    for dpi in niveles:
+        candidatos.extend((dpi, q) for q in CALIDADES_JPEG)
+    candidatos.extend((niveles[-1], q) for q in CALIDADES_ULTIMO_NIVEL)
+    return candidatos
+
+def _muestra_bandas(img):
+    """
+    Franjas repartidas a lo alto de la imagen, pegadas en una imagen más pequeña.
+    Devuelve (muestra, fracción de la altura que representa).
+    """
+    alto_banda = max(16, img.height // (BANDAS_ESTIMACION * 8) // 16 * 16)
+    if alto_banda * BANDAS_ESTIMACION * 2 >= img.height:
+        return img, 1.0
+    muestra = Image.new(img.mode, (img.width, alto_banda * BANDAS_ESTIMACION))
+    paso = img.height // BANDAS_ESTIMACION
+    for i in range(BANDAS_ESTIMACION):
+        y = i * paso + (paso - alto_banda) // 2
+        muestra.paste(img.crop((0, y, img.width, y + alto_banda)), (0, i * alto_banda))
+    return muestra, muestra.height / img.height
+
+def imagen_con_presupuesto(path, opciones, fotograma=0):
+    """
+    Coloca la imagen en A4 (como el modo nativo) eligiendo DPI y calidad para que la
+    página no pase de opciones["bytes_pagina"]. Primero estima: codifica sólo unas
+    franjas de la imagen con cada candidato hasta el primero que cabe. Después
+    refina: codifica la página completa y baja al siguiente candidato sólo si la
+    estimación se quedó corta. Si ni el último cabe se usa el último.
+    fotograma: página de un TIFF o GIF multipágina. Devuelve los bytes del PDF.
+    """
+    presupuesto = opciones["bytes_pagina"] - SOBRECARGA_PAGINA
+    dpi_inicial = min(TARGET_DPI, opciones["dpi_max"] or TARGET_DPI)
+    if opciones["jpeg_directo"]:
+        datos = incrustar_directo(path, fotograma, dpi_inicial)
+        if datos is not None and len(datos) <= opciones["bytes_pagina"]:
+            return datos
+
+    base, _, formato = abrir_imagen_reducida(path, lambda w, h: tamano_nativo(w, h, dpi_inicial), fotograma)
+    bitonal = False
+    if opciones["detectar_color"]:
+        compacta = imagen_compacta(base)
+        bitonal = compacta.mode == "1"
+        # las bitonales se reducen en gris y se umbralizan después
+        base = base.convert("L") if bitonal else compacta
+    candidatos = _candidatos(bitonal, formato != "JPEG", dpi_inicial)
+
+    reducidas = {}
+
+    def a_dpi(dpi):
+        if dpi not in reducidas:
+            tam = tamano_nativo(base.width, base.height, dpi)
+            img = base if tam == base.size else base.resize(tam, Image.LANCZOS, reducing_gap=3.0)
+            reducidas.clear()
+            reducidas[dpi] = img.convert("1", dither=Image.Dither.NONE) if bitonal else img
+        return reducidas[dpi]
+
+    def codificar(img, calidad):
+        return codificar_imagen(img, calidad is None, calidad or opciones["calidad_jpeg"])
+
+    inicio = len(candidatos) - 1
+    for i, (dpi, calidad) in enumerate(candidatos):
+        muestra, fraccion = _muestra_bandas(a_dpi(dpi))
+        if len(codificar(muestra, calidad)[0]) / fraccion <= presupuesto:
+            inicio = i
+            break
+    for dpi, calidad in candidatos[inicio:]:
+        img = a_dpi(dpi)
+        datos, espacio, bits, filtro, extra = codificar(img, calidad)
+        if len(datos) <= presupuesto:
+            break
+    return pdf_una_pagina(datos, img.width, img.height, espacio, bits, filtro, extra)
+
+def presupuesto_por_pagina(rutas, limite_bytes, originales=None, metadatos=None, fotogramas=None):
+    """
+    Bytes por página de imagen para que el documento no pase de limite_bytes: se
+    descuenta lo que ocupan los PDF de entrada (su tamaño en disco) y las páginas de
+    imágenes repetidas, y el resto se reparte entre las páginas de las imágenes
+    distintas. None si no hay imágenes. metadatos: como en buscar_duplicados.
+    fotogramas: páginas de cada ruta (contar_fotogramas); por defecto una.
+    """
+    metadatos = metadatos_vigentes(rutas, metadatos)
+    originales = originales or [None] * len(rutas)
+    fotogramas = fotogramas or [1] * len(rutas)
+    fijos = SOBRECARGA_DOCUMENTO
+    imagenes = 0
+    for i, (ruta, original) in enumerate(zip(rutas, originales)):
+        if _es_pdf(ruta):
+            try:
+                fijos += _metadato(metadatos, i, "tamano") or os.path.getsize(ruta)
+            except OSError:
+                pass
+        elif original is None:
+            imagenes += fotogramas[i]
+        else:
+            fijos += SOBRECARGA_PAGINA * fotogramas[i]
+    if not imagenes:
+        return None
+    return max(BYTES_PAGINA_MIN, int((limite_bytes - fijos) / imagenes))
+
+def convertir_imagen(path, opciones=None, fotograma=0):
+    """
+    Convierte una imagen (o la página 'fotograma' de un TIFF o GIF multipágina) en
+    un PDF A4 de una página según 'opciones' (ver opciones_conversion). Con
+    opciones["jpeg_directo"] los JPEG y las páginas de TIFF en CCITT o JPEG se
+    incrustan sin recomprimir (ver incrustar_directo). Devuelve los bytes del PDF.
+    """
+    opciones = opciones or OPCIONES_DEFECTO
+    if opciones["bytes_pagina"]:
+        return imagen_con_presupuesto(path, opciones, fotograma)
+    if opciones["modo"] == "nativo":
+        return imagen_a_pdf_nativo(path, opciones, fotograma)
+    if opciones["jpeg_directo"]:
+        datos = incrustar_directo(path, fotograma)
+        if datos is not None:
+            return datos
+    return image_to_a4_pdf_bytes_scale_all(path, opciones["detectar_color"], fotograma).getvalue()
+
+# --- Normalizar página PDF existente a A4 escalando siempre ---
+def normalize_pdf_page_to_a4_scale_all(page):
+    """
+    Escala y centra una página PDF dentro de A4. Calcula factor de escala para que la
+    página quepa en A4 manteniendo aspecto (se escala up o down según sea necesario).
+    """
+    try:
+        w = float(page.mediabox.width)
+        h = float(page.mediabox.height)
+    except Exception:
+        return page
+
+    # factor para que quepa dentro de A4 (si quieres llenar y recortar, usar max)
+    scale = min(A4_WIDTH_PT / w, A4_HEIGHT_PT / h)
+
+    new_w = w * scale
+    new_h = h * scale
+    tx = (A4_WIDTH_PT - new_w) / 2.0
+    ty = (A4_HEIGHT_PT - new_h) / 2.0
+
+    trans = Transformation().scale(scale, scale).translate(tx, ty)
+    try:
+        page.add_transformation(trans)
+    except Exception:
+        # si add_transformation no está disponible, intentar aplicar matrix manualmente
+        pass
+
+    page.mediabox = RectangleObject([0, 0, A4_WIDTH_PT, A4_HEIGHT_PT])
+    try:
+        page.cropbox = RectangleObject([0, 0, A4_WIDTH_PT, A4_HEIGHT_PT])
+    except Exception:
+        pass
+
+    return page
+
+# --- Normalización rápida: no-op para A4 y Form XObject para el resto ---
+TOLERANCIA_PT = 1.0  # diferencia de tamaño (puntos) que se considera ya A4
+
+def _multiplicar(m1, m2):
+    """Producto de matrices PDF [a b c d e f] (primero m1, luego m2)."""
+    a1, b1, c1, d1, e1, f1 = m1
+    a2, b2, c2, d2, e2, f2 = m2
+    return [a1 * a2 + b1 * c2, a1 * b2 + b1 * d2,
+            c1 * a2 + d1 * c2, c1 * b2 + d1 * d2,
+            e1 * a2 + f1 * c2 + e2, e1 * b2 + f1 * d2 + f2]
+
+def _matriz_rotacion(rotacion, w, h):
+    """Matriz que lleva la caja (0, 0, w, h) a su orientación visible según /Rotate (horario)."""
+    return {
+        0: [1, 0, 0, 1, 0, 0],
+        90: [0, -1, 1, 0, 0, w],
+        180: [-1, 0, 0, -1, w, h],
+        270: [0, 1, -1, 0, h, 0],
+    }[rotacion]
+
+def _puntos(m, valores):
+    """Aplica la matriz m a una lista plana de coordenadas [x0 y0 x1 y1 ...]."""
+    a, b, c, d, e, f = m
+    salida = []
+    for x, y in zip(valores[0::2], valores[1::2]):
+        salida += [a * x + c * y + e, b * x + d * y + f]
+    return salida
+
+def _caja(m, rect):
+    """Rectángulo que contiene a rect [x0 y0 x1 y1] transformado por m."""
+    x0, y0, x1, y1 = rect
+    p = _puntos(m, [x0, y0, x1, y0, x0, y1, x1, y1])
+    return [min(p[0::2]), min(p[1::2]), max(p[0::2]), max(p[1::2])]
+
+def _numeros(valor):
+    return [float(v) for v in valor.get_object()]
+
+def _array(valores):
+    return ArrayObject(FloatObject(_num(v)) for v in valores)
+
+def _apariencia_girada(ap, giro):
+    """
+    Form XObject que dibuja la apariencia ap girada con giro. La original no se toca
+    (puede estar compartida por otras anotaciones): se envuelve.
+    """
+    stream = ap.get_object()
+    matriz = _numeros(stream.get("/Matrix", ArrayObject([1, 0, 0, 1, 0, 0])))
+    form = DecodedStreamObject()
+    form.set_data(("q " + " ".join(_num(v) for v in giro) + " cm /OCRAp0 Do Q").encode("ascii"))
+    form[NameObject("/Type")] = NameObject("/XObject")
+    form[NameObject("/Subtype")] = NameObject("/Form")
+    form[NameObject("/BBox")] = _array(_caja(_multiplicar(matriz, giro), _numeros(stream["/BBox"])))
+    form[NameObject("/Resources")] = DictionaryObject({
+        NameObject("/XObject"): DictionaryObject({NameObject("/OCRAp0"): ap}),
+    })
+    return form
+
+def _transformar_anotaciones(page, matriz, giro=None):
+    """
+    Lleva las anotaciones de la página (enlaces, campos, subrayados...) a la página
+    normalizada: /Rect, /QuadPoints y las demás coordenadas pasan por la misma matriz
+    que el contenido. Con /Rotate (giro: la parte de rotación de la matriz) las
+    apariencias se giran también; el visor ya no lo hace porque la página deja de tener
+    /Rotate. Una anotación que no se entiende se deja como estaba.
+    """
+    anotaciones = page.get("/Annots")
+    if anotaciones is None:
+        return
+    for ref in anotaciones.get_object():
+        annot = ref.get_object()
+        if not isinstance(annot, DictionaryObject):
+            continue
+        try:
+            nuevos = {}
+            if "/Rect" in annot:
+                nuevos["/Rect"] = _array(_caja(matriz, _numeros(annot["/Rect"])))
+            for clave in ("/QuadPoints", "/Vertices", "/L", "/CL"):
+                if clave in annot:
+                    nuevos[clave] = _array(_puntos(matriz, _numeros(annot[clave])))
+            if "/InkList" in annot:
+                nuevos["/InkList"] = ArrayObject(_array(_puntos(matriz, _numeros(trazo)))
+                                                 for trazo in annot["/InkList"].get_object())
+            if giro is not None and "/AP" in annot:
+                apariencias = DictionaryObject()
+                for clave, valor in annot["/AP"].get_object().items():
+                    if isinstance(valor.get_object(), StreamObject):
+                        apariencias[NameObject(clave)] = _apariencia_girada(valor, giro)
+                    else:  # apariencias por estado (/On, /Off...)
+                        apariencias[NameObject(clave)] = DictionaryObject({
+                            NameObject(estado): _apariencia_girada(ap, giro)
+                            for estado, ap in valor.get_object().items()
+                        })
+                nuevos["/AP"] = apariencias
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
+        for clave, valor in nuevos.items():
+            annot[NameObject(clave)] = valor
+
+def _contenido_sin_parsear(page):
+    """
+    Datos del contenido de la página para un Form XObject, sin interpretar operadores.
+    Con un solo stream se reutilizan sus bytes codificados y su /Filter; con un array
+    se decodifica cada parte y se concatenan. Devuelve un StreamObject.
+    """
+    contenido = page.get("/Contents")
+    contenido = contenido.get_object() if contenido is not None else None
+    if isinstance(contenido, EncodedStreamObject):
+        form = stream_codificado(datos_codificados(contenido), EncodedStreamObject)
+        for clave in ("/Filter", "/DecodeParms"):
+            if clave in contenido:
+                form[NameObject(clave)] = contenido[clave]
+        return form
+    form = DecodedStreamObject()
+    if isinstance(contenido, StreamObject):
+        form.set_data(contenido.get_data())
+    elif contenido is not None:
+        form.set_data(b"\n".join(parte.get_object().get_data() for parte in contenido))
+    return form
+
+@medir_etapa("normalizar")
+def normalizar_pagina_a4(page):
+    """
+    Lleva la página a A4 escalada y centrada, como normalize_pdf_page_to_a4_scale_all,
+    pero sin parsear ni reescribir su contenido:
+    - Si ya es A4 (sin rotación y con CropBox = MediaBox) se devuelve tal cual.
+    - Si no, el contenido original pasa a ser un Form XObject (los bytes del stream se
+      reutilizan) recortado a la CropBox, y la página sólo dibuja ese XObject con una
+      matriz que aplica /Rotate, la escala y el centrado.
+    - Las anotaciones se mueven con la misma matriz (_transformar_anotaciones).
+    """
+    try:
+        caja = page.cropbox
+        x0, y0 = float(caja.left), float(caja.bottom)
+        w, h = float(caja.width), float(caja.height)
+        rotacion = int(page.get("/Rotate", 0) or 0) % 360
+    except Exception:
+        return page
+    if w <= 0 or h <= 0 or rotacion not in (0, 90, 180, 270):
+        return normalize_pdf_page_to_a4_scale_all(page)
+
+    mediabox = page.mediabox
+    ya_a4 = (
+        rotacion == 0 and x0 == 0 and y0 == 0
+        and [float(v) for v in mediabox] == [float(v) for v in caja]
+        and abs(w - A4_WIDTH_PT) <= TOLERANCIA_PT and abs(h - A4_HEIGHT_PT) <= TOLERANCIA_PT
+    )
+    if ya_a4:
+        return page
+
+    # tamaño visible (con /Rotate 90 o 270 se intercambian ancho y alto)
+    vis_w, vis_h = (h, w) if rotacion in (90, 270) else (w, h)
+    scale = min(A4_WIDTH_PT / vis_w, A4_HEIGHT_PT / vis_h)
+    tx = (A4_WIDTH_PT - vis_w * scale) / 2.0
+    ty = (A4_HEIGHT_PT - vis_h * scale) / 2.0
+    matriz = _multiplicar([1, 0, 0, 1, -x0, -y0], _matriz_rotacion(rotacion, w, h))
+    matriz = _multiplicar(matriz, [scale, 0, 0, scale, tx, ty])
+
+    form = _contenido_sin_parsear(page)
+    form[NameObject("/Type")] = NameObject("/XObject")
+    form[NameObject("/Subtype")] = NameObject("/Form")
+    form[NameObject("/BBox")] = ArrayObject(FloatObject(v) for v in (x0, y0, x0 + w, y0 + h))
+    if "/Resources" in page:
+        form[NameObject("/Resources")] = page.raw_get("/Resources")
+    if "/Group" in page:
+        form[NameObject("/Group")] = page.raw_get("/Group")
+
+    contenido = DecodedStreamObject()
+    contenido.set_data(("q " + " ".join(_num(v) for v in matriz) + " cm /OCRFx0 Do Q").encode("ascii"))
+    giro = _matriz_rotacion(rotacion, 0, 0) if rotacion else None
+    _transformar_anotaciones(page, matriz, giro)
+    page[NameObject("/Contents")] = contenido
+    page[NameObject("/Resources")] = DictionaryObject({
+        NameObject("/XObject"): DictionaryObject({NameObject("/OCRFx0"): form}),
+    })
+    for clave in ("/Rotate", "/TrimBox", "/BleedBox", "/ArtBox", "/Group"):
+        if clave in page:
+            del page[clave]
+    page.mediabox = RectangleObject([0, 0, A4_WIDTH_PT, A4_HEIGHT_PT])
+    page.cropbox = RectangleObject([0, 0, A4_WIDTH_PT, A4_HEIGHT_PT])
+    return page
+
+# --- Conversión en paralelo (pool de procesos) ---
+def _es_pdf(ruta):
+    return os.path.splitext(ruta)[1].lower() == ".pdf"
+
+def _convertir_imagen(ruta, opciones, fotograma=0, medir=False):
+    """
+    Trabajo de un proceso del pool: convierte la imagen (o una de sus páginas) y devuelve
+    (bytes_pdf, None, segundos, medidas) o (None, mensaje, segundos, medidas). Se
+    devuelven bytes y no objetos PIL para que el paso entre procesos sea barato y no
+    dependa de poder serializar la excepción. medidas: con medir, el registro de la
+    conversión (Instrumentacion.Registro.a_dict más sus segundos); si no, None.
+    """
+    inicio = time.monotonic()
+    if medir:
+        iniciar_registro()
+    try:
+        datos, error = convertir_imagen(ruta, opciones, fotograma), None
+    except Exception as e:
+        datos, error = None, str(e)
+    segundos = time.monotonic() - inicio
+    medidas = None
+    if medir:
+        medidas = dict(terminar_registro().a_dict(), segundos=segundos, rss_mb=memoria_mb())
+    return datos, error, segundos, medidas
+
+def numero_procesos(procesos):
+    """Normaliza el número de procesos: 0 o None = todos los núcleos."""
+    if not procesos:
+        return os.cpu_count() or 1
+    return max(1, int(procesos))
+
+def parametros_cache(opciones):
+    """Parámetros de conversión que forman parte de la clave de la caché de páginas."""
+    parametros = dict(opciones)
+    parametros.update(ancho_pt=A4_WIDTH_PT, alto_pt=A4_HEIGHT_PT, dpi=TARGET_DPI)
+    return parametros
+
+# --- Metadatos del proyecto ---
+class _MetadatosComprobados(list):
+    """Metadatos que ya pasaron por metadatos_vigentes: no se vuelven a comprobar."""
+
+def metadatos_vigentes(rutas, metadatos):
+    """
+    Los metadatos de un proyecto se leen al abrirlo y pueden haber caducado cuando se
+    genera el documento (el archivo se editó o se volvió a escanear). Devuelve la
+    lista con None en las entradas cuyo archivo cambió de tamaño o mtime, para que
+    no se use su sha256, páginas ni tamaño. Una lista ya comprobada se devuelve tal
+    cual (un solo stat por archivo y trabajo).
+    """
+    if metadatos is None or isinstance(metadatos, _MetadatosComprobados):
+        return metadatos
+    return _MetadatosComprobados(vigentes(rutas, metadatos))
+
+def _metadato(metadatos, i, clave):
+    """Valor guardado en el proyecto estructurado para la entrada i, o None."""
+    if metadatos is None or metadatos[i] is None:
+        return None
+    return metadatos[i].get(clave)
+
+# --- Entradas duplicadas ---
+def buscar_duplicados(rutas, metadatos=None):
+    """
+    Devuelve una lista paralela a rutas: para cada imagen con el mismo contenido que
+    otra anterior, el índice de la primera; None para el resto. Sólo se calcula el
+    hash de las imágenes cuyo tamaño coincide con el de otra. metadatos: lista
+    paralela opcional (Proyectos.cargar_proyecto) cuyo tamano y sha256 se usan en
+    lugar de consultar los archivos mientras el tamaño y la fecha de modificación
+    del archivo sigan siendo los guardados.
+    """
+    metadatos = metadatos_vigentes(rutas, metadatos)
+    originales = [None] * len(rutas)
+    por_tamano = {}
+    for i, ruta in enumerate(rutas):
+        if _es_pdf(ruta):
+            continue
+        tamano = _metadato(metadatos, i, "tamano")
+        try:
+            if tamano is None:
+                tamano = os.path.getsize(ruta)
+        except OSError:
+            continue  # el error real lo dará la conversión
+        por_tamano.setdefault(tamano, []).append(i)
+    for indices in por_tamano.values():
+        if len(indices) < 2:
+            continue
+        primeros = {}
+        hashes = {}
+        for i in indices:
+            ruta = os.path.normcase(os.path.abspath(rutas[i]))
+            try:
+                if ruta not in hashes:
+                    hashes[ruta] = _metadato(metadatos, i, "sha256") or hash_archivo(ruta)
+            except OSError:
+                continue
+            originales[i] = primeros.setdefault(hashes[ruta], i)
+            if originales[i] == i:
+                originales[i] = None
+    return originales
+
+def _ultimas_copias(originales):
+    """{índice original: índice de su último duplicado}."""
+    return {o: i for i, o in enumerate(originales) if o is not None}
+
+# --- TIFF y GIF multipágina ---
+EXTENSIONES_MULTIPAGINA = (".tif", ".tiff", ".gif")
+
+def contar_fotogramas(rutas, metadatos=None, originales=None):
+    """
+    Lista paralela a rutas con el número de páginas que aporta cada imagen: los
+    fotogramas de un TIFF o GIF, 1 para el resto (y para los PDF, que se leen
+    aparte). Sólo se leen las cabeceras, nunca los píxeles; con metadatos (ver
+    buscar_duplicados) ni eso. Un duplicado (originales) toma la cuenta de su original.
+    """
+    metadatos = metadatos_vigentes(rutas, metadatos)
+    cuentas = []
+    for i, ruta in enumerate(rutas):
+        n = 1
+        if os.path.splitext(ruta)[1].lower() in EXTENSIONES_MULTIPAGINA:
+            n = _metadato(metadatos, i, "paginas")
+            if not n:
+                try:
+                    with Image.open(ruta) as img:
+                        n = getattr(img, "n_frames", 1)
+                except Exception:
+                    n = 1  # el error real lo dará la conversión
+        cuentas.append(max(1, n))
+    if originales is not None:
+        cuentas = [n if o is None else cuentas[o] for n, o in zip(cuentas, originales)]
+    return cuentas
+
+def iterar_conversiones(rutas, procesos=1, ventana=None, opciones=None, cache=None,
+                        originales=None, estadisticas=None, fotogramas=None, medir=False):
+    """
+    Recorre las rutas en el orden del proyecto y genera, por cada página de imagen,
+    (indice, fotograma, ruta, datos, error, medidas). Los PDF dan una sola tupla con
+    datos y error None (se leen en el proceso principal); para las imágenes datos son
+    los bytes del PDF de una página. medidas: con medir, las etapas y contadores de la
+    conversión medidos en el proceso que la hizo (ver Instrumentacion); si no, None.
+
+    fotogramas: lista de contar_fotogramas. Cada página de un TIFF o GIF multipágina
+    es un trabajo aparte: el proceso que la convierte abre el archivo y salta a ella
+    (seek), así las páginas se reparten entre los procesos y nunca se decodifica el
+    archivo completo.
+
+    Con procesos > 1 las imágenes se convierten en un pool de procesos. Como mucho
+    'ventana' entradas (por defecto 2 por proceso) están en vuelo a la vez, así la
+    memoria no crece con el tamaño del trabajo.
+
+    cache: CachePaginas.CacheDisco opcional. Las páginas ya convertidas con los
+    mismos parámetros se toman de ahí sin pasar por el pool, y las nuevas se guardan.
+    originales: lista de buscar_duplicados; un duplicado no se convierte, recibe los
+    datos de su original. estadisticas: dict opcional donde se suman duplicados y
+    segundos_ahorrados (tiempo de conversión de los originales reutilizados).
+    """
+    opciones = opciones or opciones_conversion()
+    procesos = numero_procesos(procesos)
+    originales = originales or [None] * len(rutas)
+    fotogramas = fotogramas or [1] * len(rutas)
+    ultimas = _ultimas_copias(originales)
+    compartidos = {}  # (índice original, fotograma) -> trabajo
+    pool = ProcessPoolExecutor(max_workers=procesos) if procesos > 1 else None
+    ventana = 1 if pool is None else max(1, ventana or procesos * 2)
+    try:
+        pendientes = deque()
+        for i, ruta in enumerate(rutas):
+            o = originales[i]
+            for f in range(1 if _es_pdf(ruta) else fotogramas[i]):
+                if o is None:
+                    clave, trabajo = _preparar(ruta, pool, opciones, cache, f, medir)
+                    if i in ultimas:
+                        compartidos[(i, f)] = trabajo
+                else:
+                    clave = None
+                    trabajo = compartidos.pop((o, f)) if ultimas[o] == i else compartidos[(o, f)]
+                pendientes.append((i, f, ruta, clave, trabajo, o is not None))
+                while len(pendientes) >= ventana:
+                    yield _resultado(cache, estadisticas, *pendientes.popleft())
+        while pendientes:
+            yield _resultado(cache, estadisticas, *pendientes.popleft())
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+def _preparar(ruta, pool, opciones, cache, fotograma=0, medir=False):
+    """Devuelve (clave_cache, trabajo); trabajo es un Future o (datos, error, segundos, medidas)."""
+    if _es_pdf(ruta):
+        return None, (None, None, 0.0, None)
+    clave = None
+    if cache is not None:
+        parametros = parametros_cache(opciones)
+        if fotograma:
+            parametros["fotograma"] = fotograma
+        try:
+            clave = cache.clave(ruta, parametros)
+        except OSError:
+            clave = None  # el error real lo dará la conversión
+        datos = cache.obtener(clave) if clave else None
+        if datos is not None:
+            return None, (datos, None, 0.0, {"contadores": {"aciertos_cache": 1}} if medir else None)
+    if pool is None:
+        return clave, _convertir_imagen(ruta, opciones, fotograma, medir)
+    return clave, pool.submit(_convertir_imagen, ruta, opciones, fotograma, medir)
+
+def _resultado(cache, estadisticas, indice, fotograma, ruta, clave, trabajo, duplicado):
+    if isinstance(trabajo, tuple):
+        datos, error, segundos, medidas = trabajo
+    else:
+        try:
+            datos, error, segundos, medidas = trabajo.result()
+        except Exception as e:
+            # p. ej. BrokenProcessPool si un proceso muere
+            datos, error, segundos, medidas = None, str(e), 0.0, None
+    if clave and datos is not None:
+        cache.guardar(clave, datos)
+    if duplicado and datos is not None and estadisticas is not None:
+        if fotograma == 0:
+            estadisticas["duplicados"] = estadisticas.get("duplicados", 0) + 1
+        estadisticas["segundos_ahorrados"] = estadisticas.get("segundos_ahorrados", 0.0) + segundos
+    if duplicado and medidas is not None:
+        # la conversión se midió en su original
+        medidas = {"contadores": {"duplicados": 1}}
+    return indice, fotograma, ruta, datos, error, medidas
+
+# --- Dependencias ---
+class DependenciaFaltante(RuntimeError):
+    """Falta (o no sirve) una biblioteca opcional; el mensaje dice cómo instalarla."""
+
+# --- Salida linealizada ("fast web view") ---
+def linealizar_pdf(ruta_pdf, bloqueos=None):
+    """
+    Reescribe ruta_pdf linealizado: el catálogo, la primera página y las tablas de
+    pistas van al principio del archivo, y un visor que lo descarga por HTTP muestra
+    la página 1 sin esperar al resto. Lo hace qpdf (pikepdf). bloqueos: como en
+    generar_documento; se cifra con AES-256 (R=6) en la misma escritura, igual que
+    BloqueoDocumentos. Se escribe en ruta_pdf + ".lin" y se reemplaza al terminar.
+    """
+    if pikepdf is None:
+        raise DependenciaFaltante("Install 'pikepdf' for linearized output with: pip install pikepdf")
+    temporal = ruta_pdf + ".lin"
+    try:
+        with pikepdf.open(ruta_pdf) as pdf:
+            cifrado = None
+            if bloqueos is not None:
+                permisos = pikepdf.Permissions(**{p: not bloqueos.get(p, True) for p in BITS_PERMISOS})
+                cifrado = pikepdf.Encryption(user="", owner="", allow=permisos, R=6)
+            pdf.save(temporal, linearize=True, encryption=cifrado)
+        # el original ya está cerrado: en Windows no se puede reemplazar un archivo abierto
+        os.replace(temporal, ruta_pdf)
+    except BaseException:
+        _borrar_parcial(temporal)
+        raise
+
+# --- Generación del PDF final (manteniendo streams vivos) ---
+class TrabajoCancelado(Exception):
+    """Se lanza cuando se cancela un trabajo; la salida parcial ya se ha borrado."""
+
+def _borrar_parcial(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+def generar_documento(rutas, ruta_pdf, procesos=1, opciones=None, streaming=False, cache=None,
+                      progreso=None, cancelar=None, bloqueos=None, compactar=False,
+                      estadisticas=None, limite_bytes=None, metadatos=None, informe=None,
+                      linealizar=False):
+    """
+    Genera ruta_pdf con las rutas indicadas (imágenes y PDF) normalizadas a A4.
+    Devuelve la lista de errores por archivo como tuplas (ruta, mensaje); los
+    archivos con error se omiten. Lanza DependenciaFaltante si faltan dependencias y
+    OSError si no se puede escribir la salida.
+
+    procesos: número de procesos para convertir imágenes (1 = en este proceso,
+    0 = todos los núcleos). Las páginas se escriben siempre en el orden de rutas.
+    opciones: parámetros de conversión de imágenes (ver opciones_conversion).
+    streaming: escribir cada página a disco en cuanto está lista (EscritorStream)
+    en lugar de acumular el documento en un PdfWriter; la memoria máxima depende
+    entonces del número de procesos y no del número de páginas.
+    cache: CachePaginas.CacheDisco opcional para reutilizar páginas entre ejecuciones.
+    progreso: función opcional que recibe un dict tras cada archivo con las claves
+    hechos, total, paginas, ruta, paginas_por_segundo y eta_s (segundos estimados).
+    cancelar: objeto opcional con is_set() (p. ej. threading.Event); si se activa,
+    el trabajo se detiene con TrabajoCancelado.
+    bloqueos: {permiso: True si se bloquea} para cifrar con AES-256 (R=6) en la misma
+    escritura, como haría BloqueoDocumentos.proteger_pdf después; None = sin cifrar.
+    compactar: compartir los streams idénticos (fuentes, logos, perfiles ICC...) entre
+    páginas y documentos y agrupar el resto de objetos en object streams. Implica
+    streaming: PdfWriter no escribe object streams.
+    estadisticas: dict opcional que se rellena con duplicados (imágenes repetidas en
+    el proyecto), bytes_ahorrados, segundos_ahorrados y bytes_salida. Las imágenes con
+    el mismo contenido se convierten una vez y todas sus páginas usan la misma imagen.
+    limite_bytes: tamaño máximo de la salida. Se reparte entre las imágenes (ver
+    presupuesto_por_pagina) y cada una elige DPI y calidad para caber en su parte
+    (ver imagen_con_presupuesto). Los PDF de entrada se copian tal cual, así que el
+    límite puede no alcanzarse si ellos solos lo superan: compruébese bytes_salida.
+    metadatos: lista paralela a rutas con los metadatos de un proyecto estructurado
+    (Proyectos.cargar_proyecto; None en las entradas sin ellos) para planificar sin
+    volver a abrir los archivos; los de archivos que cambiaron desde que se leyeron
+    se descartan (metadatos_vigentes).
+
+    Cada página de un TIFF o GIF multipágina es una página de la salida.
+    informe: Instrumentacion.Informe opcional (ya abierto con with) donde se registra
+    cada entrada con sus etapas (decodificar, redimensionar, codificar, leer_pdf,
+    normalizar, escribir, cifrar...), páginas, bytes leídos y escritos y memoria; la
+    conversión se mide en el proceso que la hace.
+    linealizar: escribir la salida linealizada ("fast web view", ver linealizar_pdf).
+    Es una segunda escritura con qpdf; si además hay bloqueos, el cifrado se aplica en
+    ella y no en la primera.
+
+    La salida se escribe en ruta_pdf + ".part" y sólo se renombra al terminar, así
+    un trabajo cancelado o fallido no deja un PDF a medias.
+    """
+    if PdfReader is None or PdfWriter is None or Transformation is None or RectangleObject is None:
+        raise DependenciaFaltante("Install 'pypdf' y 'Pillow' with: pip install pypdf pillow")
+    if linealizar and pikepdf is None:
+        raise DependenciaFaltante("Install 'pikepdf' for linearized output with: pip install pikepdf")
+
+    temporal = ruta_pdf + ".part"
+    # con linealizar se cifra al reescribir: qpdf tendría que descifrar lo ya cifrado
+    cifrar = bloqueos is not None and not linealizar
+    temp_streams = []
+    errores = []
+    paginas = [0]
+    streaming = streaming or compactar
+    if estadisticas is None:
+        estadisticas = {}
+    estadisticas.update(duplicados=0, bytes_ahorrados=0, segundos_ahorrados=0.0, bytes_salida=0)
+    metadatos = metadatos_vigentes(rutas, metadatos)
+    originales = buscar_duplicados(rutas, metadatos)
+    fotogramas = contar_fotogramas(rutas, metadatos, originales)
+    if limite_bytes:
+        opciones = dict(opciones or opciones_conversion())
+        opciones["bytes_pagina"] = presupuesto_por_pagina(rutas, limite_bytes, originales, metadatos,
+                                                          fotogramas)
+    ultimas = _ultimas_copias(originales)
+    lectores = {}  # (índice original, fotograma) -> PdfReader de su página, mientras queden duplicados
+    if streaming:
+        escritor = EscritorStream(temporal, compactar=compactar)
+        destino = escritor.agregar_pagina
+    else:
+        writer = PdfWriter()
+
+        def destino(page):
+            nueva = writer.add_page(page)
+            if cifrar:
+                # pypdf cifra los bytes ya serializados del stream y el contenido creado
+                # por add_transformation no los tiene hasta llamar a get_data()
+                contenido = nueva.get("/Contents")
+                if contenido is not None and isinstance(contenido.get_object(), StreamObject):
+                    contenido.get_object().get_data()
+    if cifrar:
+        try:
+            if streaming:
+                escritor.cifrar(permisos_pdf(bloqueos))
+            else:
+                # Antes de agregar páginas: pypdf calcula el /ID serializando el documento
+                writer.encrypt("", "", permissions_flag=UserAccessPermissions(permisos_pdf(bloqueos)),
+                               algorithm="AES-256")
+        except DependencyError:
+            if streaming:
+                escritor.abortar()
+                _borrar_parcial(temporal)
+            raise DependenciaFaltante("Install 'pycryptodome' for encryption with: pip install pycryptodome")
+
+    def agregar_pagina(page):
+        with etapa("escribir"):
+            destino(page)
+        paginas[0] += 1
+
+    def tamano_entrada(indice, ruta):
+        try:
+            return _metadato(metadatos, indice, "tamano") or os.path.getsize(ruta)
+        except OSError:
+            return 0
+
+    inicio = time.monotonic()
+    total = len(rutas)
+    unidades = sum(1 if _es_pdf(r) else n for r, n in zip(rutas, fotogramas))
+    try:
+        for unidad, (indice, fotograma, ruta, datos, error, medidas) in enumerate(
+                iterar_conversiones(rutas, procesos, opciones=opciones, cache=cache,
+                                    originales=originales, estadisticas=estadisticas,
+                                    fotogramas=fotogramas, medir=informe is not None), start=1):
+            original = originales[indice]
+            multipagina = fotogramas[indice] > 1 and not _es_pdf(ruta)
+            if cancelar is not None and cancelar.is_set():
+                raise TrabajoCancelado()
+            if informe is not None:
+                registro = iniciar_registro()
+                inicio_entrada = time.perf_counter()
+                paginas_antes = paginas[0]
+                escritos_antes = escritor.bytes_escritos if streaming else 0
+                errores_antes = len(errores)
+            if _es_pdf(ruta):
+                try:
+                    with etapa("leer_pdf"):
+                        reader = PdfReader(ruta)
+                    for page in reader.pages:
+                        norm = normalizar_pagina_a4(page)
+                        agregar_pagina(norm)
+                except Exception as e:
+                    errores.append((ruta, f"Can´t read PDF: {e}"))
+            elif error is not None:
+                pagina = f"page {fotograma + 1}: " if multipagina else ""
+                errores.append((ruta, f"image can´t process: {pagina}{error}"))
+            else:
+                try:
+                    mem_reader = lectores.get((original, fotograma))
+                    if mem_reader is None:
+                        bio = io.BytesIO(datos)
+                        if not streaming:
+                            temp_streams.append(bio)
+                        with etapa("leer_pdf"):
+                            mem_reader = PdfReader(bio)
+                    else:
+                        # Mismas páginas del mismo lector: la imagen se incrusta una vez
+                        estadisticas["bytes_ahorrados"] += len(datos)
+                        if ultimas[original] == indice:
+                            del lectores[(original, fotograma)]
+                    if indice in ultimas:
+                        lectores[(indice, fotograma)] = mem_reader
+                    for page in mem_reader.pages:
+                        try:
+                            page.mediabox = RectangleObject([0, 0, A4_WIDTH_PT, A4_HEIGHT_PT])
+                        except Exception:
+                            pass
+                        norm = normalizar_pagina_a4(page)
+                        agregar_pagina(norm)
+                except Exception as e:
+                    pagina = f"page {fotograma + 1}: " if multipagina else ""
+                    errores.append((ruta, f"image can´t process: {pagina}{e}"))
+
+            if informe is not None:
+                terminar_registro()
+                registro.fusionar(medidas)
+                leidos = tamano_entrada(indice, ruta) if fotograma == 0 and original is None else 0
+                informe.registrar(
+                    ruta, registro,
+                    segundos=time.perf_counter() - inicio_entrada + (medidas or {}).get("segundos", 0.0),
+                    fotograma=fotograma if multipagina else None,
+                    paginas=paginas[0] - paginas_antes, bytes_leidos=leidos,
+                    bytes_escritos=escritor.bytes_escritos - escritos_antes if streaming else None,
+                    error=errores[-1][1] if len(errores) > errores_antes else None,
+                )
+
+            if progreso is not None:
+                # un archivo está hecho con su última página; la ETA se calcula por páginas
+                hechos = indice + 1 if _es_pdf(ruta) or fotograma == fotogramas[indice] - 1 else indice
+                transcurrido = max(time.monotonic() - inicio, 1e-6)
+                progreso({
+                    "hechos": hechos,
+                    "total": total,
+                    "paginas": paginas[0],
+                    "ruta": ruta,
+                    "paginas_por_segundo": paginas[0] / transcurrido,
+                    "eta_s": transcurrido / unidad * (unidades - unidad),
+                })
+
+        if cancelar is not None and cancelar.is_set():
+            raise TrabajoCancelado()
+        if informe is not None:
+            registro = iniciar_registro()
+        with etapa("escribir"):
+            if streaming:
+                escritor.cerrar()
+            else:
+                with open(temporal, "wb") as f_out:
+                    writer.write(f_out)
+        if linealizar:
+            with etapa("linealizar"):
+                linealizar_pdf(temporal, bloqueos)
+        os.replace(temporal, ruta_pdf)
+        estadisticas["bytes_salida"] = os.path.getsize(ruta_pdf)
+        if informe is not None:
+            terminar_registro()
+            # los duplicados ya se contaron en su entrada
+            trabajo = {k: v for k, v in estadisticas.items() if k != "duplicados"}
+            registro.fusionar({"contadores": dict(trabajo, paginas=paginas[0])})
+            informe.registrar_trabajo(registro)
+    except BaseException:
+        if informe is not None:
+            terminar_registro()
+        if streaming:
+            escritor.abortar()
+        _borrar_parcial(temporal)
+        raise
+    finally:
+        for s in temp_streams:
+            try:
+                s.close()
+            except Exception:
+                pass
+
+    return errores
+
+# --- Volúmenes ---
+ESPERA_CANCELAR_S = 0.2  # cada cuánto se mira cancelar mientras se escriben volúmenes en el pool
+
+def paginas_entradas(rutas, metadatos=None, fotogramas=None):
+    """
+    Páginas que aporta cada entrada: los fotogramas de las imágenes (contar_fotogramas)
+    y las páginas de los PDF, tomadas de los metadatos o de la xref del archivo.
+    """
+    metadatos = metadatos_vigentes(rutas, metadatos)
+    fotogramas = fotogramas or contar_fotogramas(rutas, metadatos)
+    paginas = []
+    for i, ruta in enumerate(rutas):
+        n = fotogramas[i]
+        if _es_pdf(ruta):
+            n = _metadato(metadatos, i, "paginas")
+            if not n:
+                try:
+                    n = len(PdfReader(ruta).pages)
+                except Exception:
+                    n = 1  # el error real lo dará la generación
+        paginas.append(n)
+    return paginas
+
+def planificar_volumenes(paginas, tamanos=None, paginas_volumen=None, bytes_volumen=None):
+    """
+    Reparte las entradas, en orden, en volúmenes de como mucho paginas_volumen páginas
+    y bytes_volumen bytes (según tamanos, estimados). Devuelve listas de índices
+    consecutivos. Una entrada no se parte nunca: si ella sola pasa el límite, va sola.
+    """
+    volumenes = []
+    actual, n_paginas, n_bytes = [], 0, SOBRECARGA_DOCUMENTO
+    for i, p in enumerate(paginas):
+        b = tamanos[i] if tamanos else 0
+        if actual and ((paginas_volumen and n_paginas + p > paginas_volumen)
+                       or (bytes_volumen and n_bytes + b > bytes_volumen)):
+            volumenes.append(actual)
+            actual, n_paginas, n_bytes = [], 0, SOBRECARGA_DOCUMENTO
+        actual.append(i)
+        n_paginas += p
+        n_bytes += b
+    if actual:
+        volumenes.append(actual)
+    return volumenes
+
+def _generar_volumen(rutas, ruta_pdf, metadatos, parametros, cancelar=None, medir=False):
+    """
+    Escribe un volumen (en un proceso del pool o en el propio) y devuelve
+    (errores, estadisticas, segundos, medidas); medidas son las etapas del volumen
+    y la memoria del proceso si medir, o None.
+    """
+    inicio = time.monotonic()
+    estadisticas = {}
+    if medir:
+        iniciar_registro()
+    try:
+        errores = generar_documento(rutas, ruta_pdf, cancelar=cancelar, estadisticas=estadisticas,
+                                    metadatos=metadatos, **parametros)
+    finally:
+        registro = terminar_registro() if medir else None
+    medidas = None
+    if registro is not None:
+        medidas = dict(registro.a_dict(), rss_mb=memoria_mb())
+    return errores, estadisticas, time.monotonic() - inicio, medidas
+
+def generar_volumenes(rutas, ruta_pdf, paginas_volumen=None, bytes_volumen=None, procesos=1,
+                      opciones=None, cache=None, progreso=None, cancelar=None, bloqueos=None,
+                      compactar=True, estadisticas=None, metadatos=None, informe=None,
+                      linealizar=False):
+    """
+    Genera el trabajo en varios PDF (volúmenes) de como mucho paginas_volumen páginas
+    y/o bytes_volumen bytes, llamados como ruta_pdf con _001, _002... antes de la
+    extensión (ruta_pdf tal cual si todo cabe en uno). Cada volumen es un
+    generar_documento completo (A4, cifrado con bloqueos, linealizado si se pide) y
+    se escriben a la vez, uno por proceso (procesos: como en generar_documento).
+    Devuelve la lista de errores por archivo.
+
+    Con bytes_volumen primero se convierten todas las imágenes en el pool para
+    conocer el tamaño real de cada página; quedan en la caché (una temporal si no se
+    da cache) y los volúmenes sólo las leen. Una caché con un límite menor que el
+    trabajo sigue funcionando, pero lo expulsado se convierte otra vez. Con sólo
+    paginas_volumen basta contar páginas y cada volumen convierte las suyas. Una
+    entrada no se parte nunca entre volúmenes.
+
+    estadisticas: las de generar_documento sumadas, más volumenes (rutas escritas).
+    informe: Instrumentacion.Informe opcional, recibe una entrada por volumen.
+    progreso y cancelar: como en generar_documento; con bytes_volumen el progreso
+    recorre las entradas dos veces (al convertir y al escribir). Si un volumen falla
+    o se cancela el trabajo se borran los ya escritos: quedan todos o ninguno. Los
+    volúmenes que se están escribiendo en el pool se detienen entre dos entradas
+    (cancelar no puede pasar a otro proceso: les llega un Event del Manager).
+    """
+    if not paginas_volumen and not bytes_volumen:
+        raise ValueError("paginas_volumen or bytes_volumen is required")
+    opciones = opciones or opciones_conversion()
+    procesos = numero_procesos(procesos)
+    metadatos = metadatos_vigentes(rutas, metadatos or [None] * len(rutas))
+    if estadisticas is None:
+        estadisticas = {}
+    estadisticas.update(duplicados=0, bytes_ahorrados=0, segundos_ahorrados=0.0, bytes_salida=0,
+                        volumenes=[])
+    total = len(rutas)
+    inicio = time.monotonic()
+
+    def avisar(hechos, paginas_hechas, ruta):
+        if progreso is None:
+            return
+        transcurrido = max(time.monotonic() - inicio, 1e-6)
+        progreso({
+            "hechos": hechos,
+            "total": total,
+            "paginas": paginas_hechas,
+            "ruta": ruta,
+            "paginas_por_segundo": paginas_hechas / transcurrido,
+            "eta_s": transcurrido / max(hechos, 1) * (total - hechos),
+        })
+
+    dir_temporal = None
+    escritos = []  # volúmenes terminados, para borrarlos si el trabajo no se completa
+    try:
+        originales = buscar_duplicados(rutas, metadatos)
+        fotogramas = contar_fotogramas(rutas, metadatos, originales)
+        paginas = paginas_entradas(rutas, metadatos, fotogramas)
+        tamanos = None
+        if bytes_volumen:
+            if cache is None:
+                dir_temporal = tempfile.mkdtemp(prefix="ocredit_volumenes_")
+                cache = CacheDisco(dir_temporal, limite_mb=2**30)  # temporal: sin límite
+            tamanos = [0] * total
+            convertidas = 0
+            for indice, fotograma, ruta, datos, error, _ in iterar_conversiones(
+                    rutas, procesos, opciones=opciones, cache=cache, originales=originales,
+                    fotogramas=fotogramas):
+                if cancelar is not None and cancelar.is_set():
+                    raise TrabajoCancelado()
+                if _es_pdf(ruta):
+                    try:
+                        tamanos[indice] = os.path.getsize(ruta)
+                    except OSError:
+                        pass
+                elif datos is not None:
+                    tamanos[indice] += len(datos) + SOBRECARGA_PAGINA
+                convertidas += 1
+                if _es_pdf(ruta) or fotograma == fotogramas[indice] - 1:
+                    avisar(indice + 1, convertidas, ruta)
+
+        planes = planificar_volumenes(paginas, tamanos, paginas_volumen, bytes_volumen)
+        if len(planes) == 1:
+            destinos = [ruta_pdf]
+        else:
+            base, extension = os.path.splitext(ruta_pdf)
+            ancho = max(3, len(str(len(planes))))
+            destinos = [f"{base}_{n:0{ancho}d}{extension}" for n in range(1, len(planes) + 1)]
+        trabajos = [([rutas[i] for i in plan], destino, _MetadatosComprobados(metadatos[i] for i in plan))
+                    for plan, destino in zip(planes, destinos)]
+        parametros = dict(opciones=opciones, cache=cache, bloqueos=bloqueos, compactar=compactar,
+                          streaming=True, linealizar=linealizar)
+        medir = informe is not None
+        errores = []
+        hechos = [0, 0]  # entradas, páginas
+
+        def recoger(k, errores_volumen, est, segundos, medidas):
+            entradas, destino, _ = trabajos[k]
+            errores.extend(errores_volumen)
+            for clave in ("duplicados", "bytes_ahorrados", "segundos_ahorrados", "bytes_salida"):
+                estadisticas[clave] += est[clave]
+            hechos[0] += len(entradas)
+            hechos[1] += sum(paginas[i] for i in planes[k])
+            if informe is not None:
+                informe.registrar(destino, medidas, segundos, entradas=len(entradas),
+                                  paginas=sum(paginas[i] for i in planes[k]),
+                                  bytes_escritos=est["bytes_salida"],
+                                  error=f"{len(errores_volumen)} files omitted" if errores_volumen else None)
+            avisar(hechos[0], hechos[1], destino)
+
+        if procesos == 1 or len(trabajos) == 1:
+            for k, (entradas, destino, meta) in enumerate(trabajos):
+                resultado = _generar_volumen(entradas, destino, meta, parametros, cancelar, medir)
+                escritos.append(destino)
+                recoger(k, *resultado)
+        else:
+            with multiprocessing.Manager() as gestor, \
+                    ProcessPoolExecutor(max_workers=min(procesos, len(trabajos))) as pool:
+                parada = gestor.Event()
+                futuros = {pool.submit(_generar_volumen, entradas, destino, meta, parametros, parada, medir): k
+                           for k, (entradas, destino, meta) in enumerate(trabajos)}
+                en_curso = set(futuros)
+                try:
+                    while en_curso:
+                        listos, en_curso = wait(en_curso, timeout=ESPERA_CANCELAR_S,
+                                                return_when=FIRST_COMPLETED)
+                        if cancelar is not None and cancelar.is_set():
+                            raise TrabajoCancelado()
+                        for futuro in listos:
+                            k = futuros[futuro]
+                            resultado = futuro.result()
+                            escritos.append(trabajos[k][1])
+                            recoger(k, *resultado)
+                except BaseException:
+                    # los volúmenes en curso paran en su próxima entrada (y borran su
+                    # temporal); se esperan para borrar también los que terminaron
+                    parada.set()
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    escritos.extend(trabajos[k][1] for f, k in futuros.items()
+                                    if not f.cancelled() and f.exception() is None
+                                    and trabajos[k][1] not in escritos)
+                    raise
+    except BaseException:
+        for destino in escritos:
+            _borrar_parcial(destino)
+        raise
+    finally:
+        if dir_temporal is not None:
+            shutil.rmtree(dir_temporal, ignore_errors=True)
+
+    estadisticas["volumenes"] = destinos
+    return errores
+
+# --- Línea de comandos ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generate an A4 PDF from images and PDF files without GUI."
+    )
+    parser.add_argument("archivos", nargs="*", help="images or PDF files, in order")
+    parser.add_argument("-p", "--proyecto",
+                        help="project .txt (one route by line) or .json (routes with metadata)")
+    parser.add_argument("--guardar-proyecto", metavar="JSON",
+                        help="also save the input list as a .json project with metadata")
+    parser.add_argument("-o", "--salida", required=True, help="output PDF")
+    parser.add_argument("-j", "--procesos", type=int, default=1,
+                        help="processes for image conversion (0 = all cores, default 1)")
+    parser.add_argument("--recodificar-jpeg", action="store_true",
+                        help="decode and re-encode JPEG files instead of embedding them as-is")
+    parser.add_argument("--modo", choices=MODOS, default="lienzo",
+                        help="lienzo: full A4 canvas at 300 DPI; nativo: keep image resolution")
+    parser.add_argument("--dpi-max", type=float,
+                        help="nativo mode: downscale images above this DPI on the page")
+    parser.add_argument("--calidad-jpeg", type=int, default=75,
+                        help="JPEG quality when images are re-encoded (default 75)")
+    parser.add_argument("--forzar-color", action="store_true",
+                        help="keep every page in color (no grayscale/bilevel detection)")
+    parser.add_argument("--limite-mb", type=float,
+                        help="maximum output size in MB: DPI and JPEG quality are chosen per page to fit")
+    parser.add_argument("--kb-pagina", type=float,
+                        help="maximum size in KB of each image page (DPI and quality chosen per page)")
+    parser.add_argument("--streaming", action="store_true",
+                        help="write pages to disk as they are ready (bounded memory for huge jobs)")
+    parser.add_argument("--compactar", action="store_true",
+                        help="share identical fonts/images between documents and use object streams")
+    parser.add_argument("--cache", metavar="DIR",
+                        help="directory of the converted page cache (reused between runs)")
+    parser.add_argument("--cache-mb", type=float, default=1024,
+                        help="cache size limit in MB, least recently used pages are evicted (default 1024)")
+    parser.add_argument("--cache-hash", action="store_true",
+                        help="identify files by content hash instead of path, size and mtime")
+    parser.add_argument("--proteger", action="store_true",
+                        help="encrypt the output (AES-256) blocking every permission not allowed")
+    parser.add_argument("--permitir", action="append", default=[], choices=sorted(BITS_PERMISOS),
+                        help="with --proteger: permission to allow (repeatable)")
+    parser.add_argument("--linealizar", action="store_true",
+                        help="write a linearized PDF (fast web view: page 1 shows before the download ends)")
+    parser.add_argument("--paginas-volumen", type=int, metavar="N",
+                        help="split the output into volumes of at most N pages (written in parallel)")
+    parser.add_argument("--mb-volumen", type=float, metavar="MB",
+                        help="split the output into volumes of at most MB megabytes (written in parallel)")
+    parser.add_argument("-v", "--progreso", action="store_true",
+                        help="print progress (pages, pages/s, ETA) to stderr")
+    parser.add_argument("--metricas", metavar="JSONL",
+                        help="write a per-file, per-stage timing report (JSON lines) to this file")
+    parser.add_argument("--perfil", metavar="PROF",
+                        help="profile this job with cProfile and save the stats to this file "
+                             "(use -j 1 to include image conversion)")
+    args = parser.parse_args(argv)
+
+    rutas = []
+    metadatos = []
+    if args.proyecto:
+        try:
+            entradas, omitidas = cargar_proyecto(args.proyecto)
+        except (OSError, ValueError) as e:
+            print(f"Error: can not open project: {e}", file=sys.stderr)
+            return 2
+        for ln, val in omitidas:
+            print(f"Omitted (line {ln}): {val}", file=sys.stderr)
+        rutas.extend(e["ruta"] for e in entradas)
+        metadatos.extend(entradas)
+    rutas.extend(args.archivos)
+    metadatos.extend([None] * len(args.archivos))
+
+    if not rutas:
+        print("Error: no files to process.", file=sys.stderr)
+        return 2
+    volumenes = bool(args.paginas_volumen or args.mb_volumen)
+    if volumenes and args.limite_mb:
+        print("Error: --limite-mb can not be used with volumes (use --kb-pagina).", file=sys.stderr)
+        return 2
+    if args.guardar_proyecto:
+        try:
+            guardar_proyecto(args.guardar_proyecto, rutas,
+                             previos={e["ruta"]: e for e in metadatos if e is not None})
+        except OSError as e:
+            print(f"Error: project could not be saved: {e}", file=sys.stderr)
+            return 2
+
+    cache = None
+    if args.cache:
+        cache = CacheDisco(args.cache, limite_mb=args.cache_mb, por_hash=args.cache_hash)
+
+    bloqueos = None
+    if args.proteger:
+        bloqueos = {p: p not in args.permitir for p in BITS_PERMISOS}
+
+    def mostrar_progreso(p):
+        print(f"[{p['hechos']}/{p['total']}] {p['paginas']} pages, "
+              f"{p['paginas_por_segundo']:.1f} pages/s, ETA {p['eta_s']:.0f}s: {p['ruta']}", file=sys.stderr)
+
+    estadisticas = {}
+    try:
+        opciones = opciones_conversion(
+            jpeg_directo=not args.recodificar_jpeg, modo=args.modo,
+            dpi_max=args.dpi_max, calidad_jpeg=args.calidad_jpeg,
+            detectar_color=not args.forzar_color,
+            bytes_pagina=int(args.kb_pagina * 1024) if args.kb_pagina else None,
+        )
+        limite = int(args.limite_mb * 1024 * 1024) if args.limite_mb else None
+        medicion = contextlib.nullcontext()
+        if args.metricas or args.perfil:
+            medicion = Informe(args.metricas, "generar", {
+                "salida": args.salida, "entradas": len(rutas), "procesos": args.procesos,
+                "streaming": args.streaming, "compactar": args.compactar, "opciones": opciones,
+                "limite_bytes": limite, "cifrado": bloqueos is not None, "linealizar": args.linealizar,
+                "paginas_volumen": args.paginas_volumen, "mb_volumen": args.mb_volumen,
+            }, perfil=args.perfil)
+        with medicion as informe:
+            if volumenes:
+                errores = generar_volumenes(
+                    rutas, args.salida, paginas_volumen=args.paginas_volumen,
+                    bytes_volumen=int(args.mb_volumen * 1024 * 1024) if args.mb_volumen else None,
+                    procesos=args.procesos, opciones=opciones, cache=cache,
+                    progreso=mostrar_progreso if args.progreso else None, bloqueos=bloqueos,
+                    compactar=args.compactar, estadisticas=estadisticas, metadatos=metadatos,
+                    informe=informe, linealizar=args.linealizar)
+            else:
+                errores = generar_documento(rutas, args.salida, procesos=args.procesos,
+                                             opciones=opciones, streaming=args.streaming, cache=cache,
+                                             progreso=mostrar_progreso if args.progreso else None,
+                                             bloqueos=bloqueos, compactar=args.compactar,
+                                             estadisticas=estadisticas, limite_bytes=limite,
+                                             metadatos=metadatos, informe=informe,
+                                             linealizar=args.linealizar)
+    except Exception as e:
+        print(f"Error: PDF can´t generated: {e}", file=sys.stderr)
+        return 2
+
+    for ruta, msg in errores:
+        print(f"{ruta}: {msg}", file=sys.stderr)
+    if cache is not None:
+        cache.limpiar()
+        print(f"Cache: {cache.aciertos} hits, {cache.fallos} misses")
+    if estadisticas["duplicados"]:
+        print(f"Duplicates: {estadisticas['duplicados']} images reused, "
+              f"{estadisticas['bytes_ahorrados'] / 1024:.0f} KB and "
+              f"{estadisticas['segundos_ahorrados']:.2f}s saved")
+    if limite and estadisticas["bytes_salida"] > limite:
+        print(f"Warning: output is {estadisticas['bytes_salida'] / 1048576:.1f} MB, "
+              f"over the {args.limite_mb} MB limit (PDF inputs are copied as-is)", file=sys.stderr)
+    if volumenes:
+        for ruta in estadisticas["volumenes"]:
+            print(f"PDF generated in: {ruta}")
+    else:
+        print(f"PDF generated in: {args.salida}")
+    return 1 if errores else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Proyectos: listas ordenadas de imágenes y PDF con las que se genera un documento.
+
+Dos formatos:
+- .txt: una ruta por línea ('#' para comentarios), el formato de siempre.
+- .json: proyecto estructurado que guarda con cada entrada sus metadatos (tamaño,
+  mtime, dimensiones, número de páginas y hash del contenido), así el motor puede
+  planificar el trabajo (duplicados, presupuesto de tamaño...) sin volver a abrir
+  los archivos.
+
+En los dos una entrada puede ser una carpeta (se recorre con os.scandir en orden
+alfabético) o un patrón glob ('**' entra en subcarpetas). Las entradas se
+comprueban en un pool de hilos: en unidades de red cada stat es un viaje de ida y
+vuelta y los hilos solapan esas esperas.
+"""
+import glob
+import hashlib
+import json
+import os
+import stat
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+FORMATO = "ocredit-proyecto"
+VERSION = 1
+HILOS = 16
+# Extensiones que se toman al expandir carpetas y patrones (las del diálogo de IMPDF)
+EXTENSIONES = (".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".tif", ".gif", ".webp", ".pdf")
+
+def es_estructurado(ruta):
+    return os.path.splitext(ruta)[1].lower() == ".json"
+
+# --- Expandir entradas ---
+def _aceptada(ruta):
+    return os.path.splitext(ruta)[1].lower() in EXTENSIONES
+
+def resolver_entrada(texto, base=None):
+    """
+    Archivos de una entrada del proyecto como lista de (ruta, stat o None): la propia
+    ruta, los archivos aceptados de una carpeta o los que casan con un patrón glob.
+    ~ y las variables de entorno se expanden; las rutas relativas se toman desde base
+    (None = directorio actual). Una ruta que no existe devuelve [].
+    """
+    ruta = os.path.expanduser(os.path.expandvars(texto))
+    if base and not os.path.isabs(ruta):
+        ruta = os.path.join(base, ruta)
+    if glob.has_magic(ruta):
+        return [(r, None) for r in sorted(glob.glob(ruta, recursive=True)) if _aceptada(r)]
+    try:
+        st = os.stat(ruta)
+    except OSError:
+        return []
+    if not stat.S_ISDIR(st.st_mode):
+        return [(ruta, st)]
+    archivos = []
+    with os.scandir(ruta) as it:
+        for e in sorted(it, key=lambda e: e.name):
+            try:
+                if e.is_file() and _aceptada(e.name):
+                    archivos.append((e.path, e.stat()))
+            except OSError:
+                continue
+    return archivos
+
+def _en_paralelo(funcion, elementos, hilos):
+    """map() en un pool de hilos conservando el orden (en serie si hay un solo elemento)."""
+    if hilos <= 1 or len(elementos) < 2:
+        return [funcion(e) for e in elementos]
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        return list(pool.map(funcion, elementos))
+
+# --- Metadatos ---
+def hash_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+def sondear(ruta, st=None, con_hash=True):
+    """
+    Metadatos de un archivo: ruta, tamano, mtime_ns, ancho y alto (px, imágenes),
+    paginas (páginas del PDF o fotogramas de la imagen) y sha256. Los que no pueden
+    leerse quedan en None; el error real lo dará la conversión.
+    """
+    st = st or os.stat(ruta)
+    meta = {"ruta": ruta, "tamano": st.st_size, "mtime_ns": st.st_mtime_ns,
+            "ancho": None, "alto": None, "paginas": None, "sha256": None}
+    try:
+        if os.path.splitext(ruta)[1].lower() == ".pdf":
+            if PdfReader is not None:
+                meta["paginas"] = len(PdfReader(ruta).pages)
+        else:
+            with Image.open(ruta) as img:  # sólo lee la cabecera
+                meta["ancho"], meta["alto"] = img.size
+                meta["paginas"] = getattr(img, "n_frames", 1)
+    except Exception:
+        pass
+    if con_hash:
+        meta["sha256"] = hash_archivo(ruta)
+    return meta
+
+def _vigente(meta, st):
+    """True si los metadatos guardados siguen valiendo para el archivo (mismo tamaño y mtime)."""
+    return (meta is not None and st is not None and meta.get("tamano") == st.st_size
+            and meta.get("mtime_ns") == st.st_mtime_ns)
+
+def vigentes(rutas, metadatos, hilos=HILOS):
+    """
+    Lista paralela a rutas con los metadatos que siguen valiendo: los de archivos
+    cuyo tamaño o mtime cambió desde que se leyeron, o que ya no existen, quedan en
+    None. Un stat por entrada con metadatos, en el pool de hilos.
+    """
+    def comprobar(par):
+        ruta, meta = par
+        if meta is None:
+            return None
+        try:
+            st = os.stat(ruta)
+        except OSError:
+            return None
+        return meta if _vigente(meta, st) else None
+
+    return _en_paralelo(comprobar, list(zip(rutas, metadatos)), hilos)
+
+# --- Leer / guardar ---
+def cargar_proyecto(ruta, hilos=HILOS):
+    """
+    Lee un proyecto .txt o .json. Devuelve (entradas, errores): entradas es la lista
+    de metadatos (ver sondear) de cada archivo, en orden, y errores una lista de
+    (línea o número de entrada, texto) con las entradas que no existen o no tienen
+    archivos. Lanza OSError si el proyecto no puede leerse y ValueError si el .json
+    no es un proyecto.
+
+    En un .txt sólo se rellenan ruta, tamano y mtime_ns (no se abren los archivos).
+    En un .json se reutilizan los metadatos guardados de los archivos que no han
+    cambiado y se sondean de nuevo los que sí.
+    """
+    if es_estructurado(ruta):
+        with open(ruta, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+        if not isinstance(datos, dict) or datos.get("formato") != FORMATO:
+            raise ValueError(f"Not an OCREdit project: {ruta}")
+        base = os.path.dirname(os.path.abspath(ruta))
+        guardadas = [e for e in datos.get("entradas", []) if isinstance(e, dict) and e.get("ruta")]
+        lineas = [(n, e["ruta"]) for n, e in enumerate(guardadas, start=1)]
+        guardados = {os.path.join(base, e["ruta"]): e for e in guardadas}
+    else:
+        with open(ruta, "r", encoding="utf-8") as f:
+            lines = f.readlines()
+        base = None
+        lineas = [(i, line.strip()) for i, line in enumerate(lines, start=1)]
+        lineas = [(i, t) for i, t in lineas if t and not t.startswith("#")]
+        guardados = None
+
+    def comprobar(texto):
+        archivos = resolver_entrada(texto, base)
+        if guardados is None:
+            return [{"ruta": r, "tamano": st.st_size if st else None,
+                     "mtime_ns": st.st_mtime_ns if st else None} for r, st in archivos]
+        resultado = []
+        for r, st in archivos:
+            try:
+                st = st or os.stat(r)
+            except OSError:
+                continue
+            meta = guardados.get(r)
+            if _vigente(meta, st):
+                resultado.append(dict(meta, ruta=r))
+            else:
+                resultado.append(sondear(r, st))
+        return resultado
+
+    entradas = []
+    errores = []
+    for (n, texto), archivos in zip(lineas, _en_paralelo(comprobar, [t for _, t in lineas], hilos)):
+        if archivos:
+            entradas.extend(archivos)
+        else:
+            errores.append((n, texto))
+    return entradas, errores
+
+def leer_proyecto(ruta):
+    """
+    Lee un proyecto (.txt o .json). Devuelve (rutas_validas, errores) donde errores
+    es una lista de (linea, texto) con las rutas que no existen. Lanza OSError si el
+    archivo no puede leerse.
+    """
+    entradas, errores = cargar_proyecto(ruta)
+    return [e["ruta"] for e in entradas], errores
+
+def guardar_proyecto(ruta, rutas, previos=None, hilos=HILOS):
+    """
+    Guarda un proyecto estructurado (.json) con los metadatos de cada ruta, sondeando
+    en paralelo. previos: {ruta: metadatos} ya conocidos; se reutilizan si el archivo
+    no ha cambiado. Las rutas que no existen se guardan sin metadatos. La escritura
+    es atómica (temporal + os.replace).
+    """
+    previos = previos or {}
+
+    def metadatos(r):
+        try:
+            st = os.stat(r)
+        except OSError:
+            return {"ruta": r}
+        meta = previos.get(r)
+        if _vigente(meta, st) and meta.get("sha256"):
+            return dict(meta, ruta=r)
+        return sondear(r, st)
+
+    datos = {"formato": FORMATO, "version": VERSION, "entradas": _en_paralelo(metadatos, list(rutas), hilos)}
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=1)
+    os.replace(temporal, ruta)
+    return datos["entradas"]
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Banco de pruebas de rendimiento de MotorPDF y BloqueoDocumentos.
+
+Genera un corpus sintético reproducible (misma semilla = mismos archivos): JPEG
+grandes, capturas PNG, escaneos bitonales, TIFF multipágina y PDF vectoriales y
+con muchas fuentes. Después mide cada etapa en un proceso nuevo, así el pico de
+memoria de una no contamina a las demás:
+
+- conversion:<categoría>  MotorPDF.convertir_imagen de cada imagen o página, con -j procesos
+- normalizacion:<categoría>  MotorPDF.normalizar_pagina_a4 de cada página y escritura
+- generacion  MotorPDF.generar_documento con todo el corpus (como el botón de IMPDF)
+- proteccion  BloqueoDocumentos.proteger_archivo del documento generado
+
+De cada etapa se guardan los segundos de cada repetición (mediana y mínimo),
+páginas por segundo, pico de RSS del proceso y de sus hijos, y bytes de salida.
+El resultado es un JSON; con --comparar se contrasta con otro y se sale con
+código 1 si alguna etapa es más lenta o genera más bytes que la tolerancia.
+
+    python Rendimiento.py -o base.json
+    python Rendimiento.py --comparar base.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from PIL import Image, ImageDraw, ImageFont, features
+
+import MotorPDF
+from Instrumentacion import rss_pico
+from MotorPDF import (
+    contar_fotogramas, generar_documento, iterar_conversiones, normalizar_pagina_a4,
+    opciones_conversion,
+)
+
+FORMATO_CORPUS = "ocredit-corpus"
+FORMATO_RESULTADOS = "ocredit-rendimiento"
+VERSION = 1
+SEMILLA = 2025
+TOLERANCIA = 10.0  # % de empeoramiento a partir del cual una etapa es una regresión
+MARGEN_S = 0.05    # además, segundos que tiene que empeorar: en las etapas cortas manda el ruido
+
+# Fuentes TrueType que se incrustan en los PDF de texto (la primera que exista)
+FUENTES_SISTEMA = [
+    os.path.join(os.environ.get("WINDIR", r"C:\Windows"), "Fonts", "arial.ttf"),
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/TTF/DejaVuSans.ttf",
+    "/System/Library/Fonts/Supplemental/Arial.ttf",
+    "/Library/Fonts/Arial.ttf",
+]
+
+PALABRAS = ("factura importe cliente fecha total pedido albarán proveedor cantidad precio "
+            "unidad referencia descripción observaciones firma sello página documento "
+            "contrato cláusula anexo registro expediente número").split()
+
+# --- Corpus: imágenes ---
+def _ruido(rng, modo, ancho, alto):
+    canales = len(modo)
+    return Image.frombytes(modo, (ancho, alto), rng.randbytes(ancho * alto * canales))
+
+def _foto(rng, ancho, alto):
+    """Foto sintética: manchas de color suaves con grano fino."""
+    base = _ruido(rng, "RGB", max(1, ancho // 48), max(1, alto // 48)).resize((ancho, alto), Image.BICUBIC)
+    grano = _ruido(rng, "L", ancho // 2, alto // 2).resize((ancho, alto), Image.BILINEAR)
+    return Image.blend(base, Image.merge("RGB", (grano, grano, grano)), 0.12)
+
+def _linea_texto(rng, palabras):
+    return " ".join(rng.choice(PALABRAS) for _ in range(palabras))
+
+def _captura(rng, ancho=1920, alto=1080):
+    """Captura de pantalla: ventanas de color plano con texto."""
+    img = Image.new("RGB", (ancho, alto), (rng.randrange(200, 256),) * 3)
+    dibujo = ImageDraw.Draw(img)
+    for _ in range(6):
+        x, y = rng.randrange(ancho - 400), rng.randrange(alto - 300)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        dibujo.rectangle((x, y, x + rng.randrange(300, 900), y + rng.randrange(200, 600)),
+                         fill=(250, 250, 250), outline=color, width=2)
+        dibujo.rectangle((x, y, x + 300, y + 24), fill=color)
+        for k in range(8):
+            dibujo.text((x + 10, y + 34 + 16 * k), _linea_texto(rng, 8), fill=(20, 20, 20))
+    return img
+
+def _escaneo(rng, ancho=2480, alto=3508):
+    """Página de texto escaneada a 300 DPI en blanco y negro, con motas."""
+    img = Image.new("L", (ancho, alto), 255)
+    dibujo = ImageDraw.Draw(img)
+    y = 250
+    while y < alto - 300:
+        x = 200
+        while x < ancho - 400:
+            largo = rng.randrange(40, 260)
+            dibujo.rectangle((x, y, x + largo, y + 28), fill=0)  # palabra
+            x += largo + rng.randrange(25, 45)
+        y += 62
+    for _ in range(400):
+        x, y = rng.randrange(ancho), rng.randrange(alto)
+        dibujo.point((x, y), fill=0)
+    return img.convert("1", dither=Image.Dither.NONE)
+
+# --- Corpus: PDF ---
+def _stream(datos, entradas=""):
+    datos = zlib.compress(datos, 6)
+    return (f"<< /Length {len(datos)} /Filter /FlateDecode {entradas}>>\nstream\n".encode("ascii")
+            + datos + b"\nendstream")
+
+def _guardar_pdf(ruta, objetos):
+    """Escribe un PDF con los objetos (bytes) numerados desde 1; el 1 es el catálogo."""
+    with open(ruta, "wb") as f:
+        f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for i, obj in enumerate(objetos, start=1):
+            offsets.append(f.tell())
+            f.write(f"{i} 0 obj\n".encode("ascii") + obj + b"\nendobj\n")
+        xref = f.tell()
+        f.write(f"xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n".encode("ascii"))
+        for off in offsets:
+            f.write(f"{off:010d} 00000 n \n".encode("ascii"))
+        f.write(f"trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii"))
+
+# tamaños variados para que la normalización tenga trabajo: Letter, A4 apaisado, A3 girado...
+PAGINAS_PDF = [(612, 792, 0), (842, 595, 0), (595, 842, 0), (842, 1191, 90), (612, 1008, 0)]
+
+def _pdf(ruta, contenidos, recursos, objetos_comunes=()):
+    """PDF con una página por contenido; objetos_comunes van tras el árbol de páginas (3, 4...)."""
+    objetos = [b"<< /Type /Catalog /Pages 2 0 R >>", None] + list(objetos_comunes)
+    hijos = []
+    for n, contenido in enumerate(contenidos):
+        ancho, alto, giro = PAGINAS_PDF[n % len(PAGINAS_PDF)]
+        objetos.append(_stream(contenido))
+        objetos.append((f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {ancho} {alto}] /Rotate {giro} "
+                        f"/Resources {recursos} /Contents {len(objetos)} 0 R >>").encode("ascii"))
+        hijos.append(f"{len(objetos)} 0 R")
+    objetos[1] = f"<< /Type /Pages /Kids [{' '.join(hijos)}] /Count {len(hijos)} >>".encode("ascii")
+    _guardar_pdf(ruta, objetos)
+
+def _contenido_vectorial(rng, trazos=600):
+    partes = []
+    for _ in range(trazos):
+        r, g, b = (rng.random() for _ in range(3))
+        puntos = " ".join(f"{rng.uniform(20, 580):.1f} {rng.uniform(20, 770):.1f}" for _ in range(6))
+        x, y = rng.uniform(20, 580), rng.uniform(20, 770)
+        partes.append(f"{r:.3f} {g:.3f} {b:.3f} RG {rng.uniform(0.2, 3):.2f} w "
+                      f"{x:.1f} {y:.1f} m {puntos} c S")
+        if rng.random() < 0.2:
+            partes.append(f"{r:.3f} {g:.3f} {b:.3f} rg {x:.1f} {y:.1f} {rng.uniform(5, 80):.1f} "
+                          f"{rng.uniform(5, 80):.1f} re f")
+    return "\n".join(partes).encode("ascii")
+
+def _fuente_sistema():
+    for ruta in FUENTES_SISTEMA:
+        if os.path.isfile(ruta):
+            return ruta
+    return None
+
+def _objetos_fuente(ruta_fuente, primero):
+    """Diccionario, descriptor y FontFile2 de una TrueType con WinAnsiEncoding (objetos primero..primero+2)."""
+    with open(ruta_fuente, "rb") as f:
+        datos = f.read()
+    medidas = ImageFont.truetype(ruta_fuente, 1000)
+    anchos = " ".join(str(int(round(medidas.getlength(chr(c))))) for c in range(32, 256))
+    nombre = "".join(c for c in os.path.splitext(os.path.basename(ruta_fuente))[0] if c.isalnum())
+    return [
+        (f"<< /Type /Font /Subtype /TrueType /BaseFont /{nombre} /FirstChar 32 /LastChar 255 "
+         f"/Widths [{anchos}] /Encoding /WinAnsiEncoding /FontDescriptor {primero + 1} 0 R >>").encode("ascii"),
+        (f"<< /Type /FontDescriptor /FontName /{nombre} /Flags 32 /FontBBox [-600 -300 2000 1100] "
+         f"/ItalicAngle 0 /Ascent 900 /Descent -220 /CapHeight 720 /StemV 80 "
+         f"/FontFile2 {primero + 2} 0 R >>").encode("ascii"),
+        _stream(datos, f"/Length1 {len(datos)} "),
+    ]
+
+def _contenido_texto(rng, fuentes, lineas=60):
+    partes = ["BT 14 TL 40 760 Td"]
+    for k in range(lineas):
+        if k % 6 == 0:
+            partes.append(f"/{rng.choice(fuentes)} {rng.choice((8, 9, 10, 11))} Tf")
+        texto = _linea_texto(rng, 12).encode("cp1252").decode("latin-1")
+        partes.append(f"({texto}) Tj T*")
+    partes.append("ET")
+    return "\n".join(partes).encode("latin-1")
+
+# --- Corpus ---
+def _cantidad(base, escala):
+    return max(1, int(round(base * escala)))
+
+def generar_corpus(directorio, escala=1.0, semilla=SEMILLA):
+    """
+    Genera (o reutiliza, si ya existe con los mismos parámetros) el corpus en
+    directorio y devuelve su manifiesto: {categoria: {"tipo", "archivos", "paginas",
+    "bytes"}} más escala, semilla y la fuente incrustada. escala multiplica el
+    número de archivos, no su tamaño.
+    """
+    manifiesto_ruta = os.path.join(directorio, "corpus.json")
+    try:
+        with open(manifiesto_ruta, "r", encoding="utf-8") as f:
+            manifiesto = json.load(f)
+        if (manifiesto.get("formato") == FORMATO_CORPUS and manifiesto.get("version") == VERSION
+                and manifiesto.get("escala") == escala and manifiesto.get("semilla") == semilla
+                and all(os.path.isfile(r) for c in manifiesto["categorias"].values() for r in c["archivos"])):
+            return manifiesto
+    except (OSError, ValueError, KeyError):
+        pass
+
+    rng = random.Random(semilla)
+    categorias = {}
+
+    def categoria(nombre, tipo):
+        carpeta = os.path.join(directorio, nombre)
+        shutil.rmtree(carpeta, ignore_errors=True)
+        os.makedirs(carpeta)
+        categorias[nombre] = {"tipo": tipo, "archivos": [], "paginas": 0, "bytes": 0}
+        return carpeta
+
+    def anotar(nombre, ruta, paginas):
+        c = categorias[nombre]
+        c["archivos"].append(ruta)
+        c["paginas"] += paginas
+        c["bytes"] += os.path.getsize(ruta)
+
+    carpeta = categoria("jpeg_grandes", "imagen")
+    for i in range(_cantidad(6, escala)):
+        ruta = os.path.join(carpeta, f"foto{i:03d}.jpg")
+        _foto(rng, 4000, 3000).save(ruta, quality=90)
+        anotar("jpeg_grandes", ruta, 1)
+
+    carpeta = categoria("capturas_png", "imagen")
+    for i in range(_cantidad(10, escala)):
+        ruta = os.path.join(carpeta, f"captura{i:03d}.png")
+        _captura(rng).save(ruta)
+        anotar("capturas_png", ruta, 1)
+
+    carpeta = categoria("escaneos_bitonales", "imagen")
+    for i in range(_cantidad(16, escala)):
+        ruta = os.path.join(carpeta, f"escaneo{i:03d}.png")
+        _escaneo(rng).save(ruta)
+        anotar("escaneos_bitonales", ruta, 1)
+
+    carpeta = categoria("tiff_multipagina", "imagen")
+    libtiff = features.check("libtiff")
+    for i in range(_cantidad(2, escala)):
+        ruta = os.path.join(carpeta, f"lote{i:03d}.tif")
+        paginas = [_escaneo(rng) for _ in range(12)]
+        paginas[0].save(ruta, save_all=True, append_images=paginas[1:],
+                        compression="group4" if libtiff else "tiff_lzw")
+        anotar("tiff_multipagina", ruta, len(paginas))
+    ruta = os.path.join(carpeta, "fotos.tif")
+    paginas = [_foto(rng, 1654, 2339) for _ in range(6)]
+    paginas[0].save(ruta, save_all=True, append_images=paginas[1:],
+                    compression="jpeg" if libtiff else "tiff_lzw")
+    anotar("tiff_multipagina", ruta, len(paginas))
+
+    carpeta = categoria("pdf_vectoriales", "pdf")
+    for i in range(_cantidad(5, escala)):
+        ruta = os.path.join(carpeta, f"plano{i:03d}.pdf")
+        _pdf(ruta, [_contenido_vectorial(rng) for _ in range(4)], "<< >>")
+        anotar("pdf_vectoriales", ruta, 4)
+
+    carpeta = categoria("pdf_fuentes", "pdf")
+    fuente = _fuente_sistema()
+    nombres = {"F1": "/Helvetica", "F2": "/Times-Roman", "F3": "/Courier", "F4": "/Helvetica-Bold"}
+    recursos = " ".join(f"/{n} << /Type /Font /Subtype /Type1 /BaseFont {b} /Encoding /WinAnsiEncoding >>"
+                        for n, b in nombres.items())
+    comunes = ()
+    if fuente:
+        comunes = _objetos_fuente(fuente, 3)
+        recursos += " /F5 3 0 R"
+    recursos = f"<< /Font << {recursos} >> >>"
+    fuentes = list(nombres) + (["F5", "F5"] if fuente else [])
+    for i in range(_cantidad(5, escala)):
+        ruta = os.path.join(carpeta, f"texto{i:03d}.pdf")
+        _pdf(ruta, [_contenido_texto(rng, fuentes) for _ in range(6)], recursos, comunes)
+        anotar("pdf_fuentes", ruta, 6)
+
+    manifiesto = {"formato": FORMATO_CORPUS, "version": VERSION, "escala": escala, "semilla": semilla,
+                  "fuente": fuente, "libtiff": libtiff, "categorias": categorias}
+    with open(manifiesto_ruta, "w", encoding="utf-8") as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=1)
+    return manifiesto
+
+# --- Medición ---
+def _etapa_conversion(archivos, procesos):
+    paginas = salida = 0
+    errores = []
+    for _, _, ruta, datos, error, _ in iterar_conversiones(
+            archivos, procesos, opciones=opciones_conversion(), fotogramas=contar_fotogramas(archivos)):
+        if error:
+            errores.append((ruta, error))
+        elif datos is not None:
+            salida += len(datos)
+            paginas += 1
+    if errores:
+        raise RuntimeError(f"{len(errores)} pages failed: {errores[0]}")
+    return paginas, salida
+
+def _etapa_normalizacion(archivos):
+    paginas = salida = 0
+    for ruta in archivos:
+        writer = MotorPDF.PdfWriter()
+        for page in MotorPDF.PdfReader(ruta).pages:
+            writer.add_page(normalizar_pagina_a4(page))
+            paginas += 1
+        bio = io.BytesIO()
+        writer.write(bio)
+        salida += len(bio.getvalue())
+    return paginas, salida
+
+def _etapa_generacion(archivos, trabajo, procesos):
+    ruta_pdf = os.path.join(trabajo, "generado.pdf")
+    estadisticas = {}
+    errores = generar_documento(archivos, ruta_pdf, procesos=procesos, compactar=True,
+                                estadisticas=estadisticas)
+    if errores:
+        raise RuntimeError(f"{len(errores)} files failed: {errores[0]}")
+    return len(MotorPDF.PdfReader(ruta_pdf).pages), estadisticas["bytes_salida"]
+
+def _etapa_proteccion(trabajo):
+    from BloqueoDocumentos import permisos_desde_bloqueos, proteger_archivo
+    generado = os.path.join(trabajo, "generado.pdf")
+    ruta_pdf = os.path.join(trabajo, "protegido.pdf")
+    shutil.copyfile(generado, ruta_pdf)
+    paginas = len(MotorPDF.PdfReader(generado).pages)
+    inicio = time.perf_counter()
+    proteger_archivo(ruta_pdf, permisos_desde_bloqueos({}), omitir_iguales=False)
+    # la copia no es parte de la etapa: se devuelve lo que tardó para descontarlo
+    return paginas, os.path.getsize(ruta_pdf), time.perf_counter() - inicio
+
+# cada etapa recibe sólo lo que usa de (archivos, trabajo, procesos)
+ETAPAS = {
+    "conversion": lambda archivos, trabajo, procesos: _etapa_conversion(archivos, procesos),
+    "normalizacion": lambda archivos, trabajo, procesos: _etapa_normalizacion(archivos),
+    "generacion": _etapa_generacion,
+    "proteccion": lambda archivos, trabajo, procesos: _etapa_proteccion(trabajo),
+}
+
+def _ejecutar_etapa(tipo, archivos, trabajo, procesos):
+    """Trabajo del proceso hijo: ejecuta la etapa y devuelve sus medidas."""
+    inicio = time.perf_counter()
+    resultado = ETAPAS[tipo](archivos, trabajo, procesos)
+    segundos = time.perf_counter() - inicio
+    if len(resultado) == 3:
+        paginas, salida, segundos = resultado
+    else:
+        paginas, salida = resultado
+    return {"segundos": segundos, "paginas": paginas, "bytes_salida": salida,
+            "rss_pico_mb": rss_pico(), "rss_pico_hijos_mb": rss_pico(hijos=True)}
+
+def medir(manifiesto, trabajo, procesos=0, repeticiones=3, etapas=None, informar=print):
+    """
+    Mide las etapas (todas, o las de la lista etapas, por nombre o tipo) con el corpus
+    del manifiesto. Cada repetición se ejecuta en un proceso nuevo ("spawn", igual
+    en todos los sistemas). Devuelve {etapa: medidas}.
+    """
+    plan = []
+    for nombre, c in manifiesto["categorias"].items():
+        tipo = "conversion" if c["tipo"] == "imagen" else "normalizacion"
+        plan.append((f"{tipo}:{nombre}", tipo, c["archivos"]))
+    todos = [r for c in manifiesto["categorias"].values() for r in c["archivos"]]
+    plan.append(("generacion", "generacion", todos))
+    plan.append(("proteccion", "proteccion", todos))
+    if etapas:
+        plan = [p for p in plan if p[0] in etapas or p[1] in etapas]
+        if any(p[1] == "proteccion" for p in plan) and not any(p[1] == "generacion" for p in plan):
+            plan.insert(len(plan) - 1, ("generacion", "generacion", todos))
+
+    resultados = {}
+    contexto = get_context("spawn")
+    for nombre, tipo, archivos in plan:
+        tiempos = []
+        medidas = None
+        try:
+            for _ in range(max(1, repeticiones)):
+                with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as pool:
+                    medidas = pool.submit(_ejecutar_etapa, tipo, archivos, trabajo, procesos).result()
+                tiempos.append(medidas["segundos"])
+        except Exception as e:
+            resultados[nombre] = {"error": str(e)}
+            informar(f"{nombre:34} error: {e}")
+            continue
+        mediana = statistics.median(tiempos)
+        resultado = {
+            "segundos": tiempos,
+            "mediana_s": mediana,
+            "minimo_s": min(tiempos),
+            "paginas": medidas["paginas"],
+            "paginas_por_segundo": medidas["paginas"] / mediana if mediana else None,
+            "rss_pico_mb": medidas["rss_pico_mb"],
+            "rss_pico_hijos_mb": medidas["rss_pico_hijos_mb"],
+            "bytes_salida": medidas["bytes_salida"],
+        }
+        resultados[nombre] = resultado
+        informar(_linea(nombre, resultado))
+    return resultados
+
+def _linea(nombre, r):
+    rss = "-" if r["rss_pico_mb"] is None else f"{r['rss_pico_mb']:.0f} MB"
+    return (f"{nombre:34} {r['mediana_s']:8.2f} s {r['paginas']:5d} pages "
+            f"{r['paginas_por_segundo'] or 0:8.1f} pages/s {rss:>8} {r['bytes_salida'] / 1e6:9.2f} MB out")
+
+def _version(modulo):
+    try:
+        return __import__(modulo).__version__
+    except Exception:
+        return None
+
+def entorno():
+    return {
+        "python": platform.python_version(),
+        "sistema": platform.platform(),
+        "procesador": platform.processor() or platform.machine(),
+        "nucleos": os.cpu_count(),
+        "pillow": _version("PIL"),
+        "pypdf": _version("pypdf"),
+        "pikepdf": _version("pikepdf"),
+        "libtiff": features.check("libtiff"),
+    }
+
+# --- Comparación ---
+def comparar(actual, base, tolerancia=TOLERANCIA):
+    """
+    Compara dos resultados etapa a etapa. Devuelve [(etapa, medida, antes, ahora,
+    cambio %, regresion)] con la mediana de segundos, el pico de RSS y los bytes de
+    salida; es regresión si la mediana (y al menos MARGEN_S) o los bytes empeoran
+    más de tolerancia %.
+    """
+    filas = []
+    for etapa, ahora in actual["etapas"].items():
+        antes = base.get("etapas", {}).get(etapa)
+        if not antes or "error" in antes or "error" in ahora:
+            continue
+        for medida, vigilada in (("mediana_s", True), ("rss_pico_mb", False), ("bytes_salida", True)):
+            a, b = antes.get(medida), ahora.get(medida)
+            if not a or b is None:
+                continue
+            cambio = (b - a) / a * 100.0
+            regresion = vigilada and cambio > tolerancia and (medida != "mediana_s" or b - a > MARGEN_S)
+            filas.append((etapa, medida, a, b, cambio, regresion))
+    return filas
+
+# --- Línea de comandos ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the PDF generation and protection pipelines on a synthetic corpus."
+    )
+    parser.add_argument("--corpus", help="corpus folder (default: a folder in the temp directory, reused)")
+    parser.add_argument("--escala", type=float, default=1.0, help="corpus size multiplier (number of files)")
+    parser.add_argument("--semilla", type=int, default=SEMILLA, help="corpus random seed")
+    parser.add_argument("-j", "--procesos", type=int, default=0,
+                        help="processes for the conversion and generation stages (0 = all cores)")
+    parser.add_argument("-n", "--repeticiones", type=int, default=3, help="runs per stage (median is reported)")
+    parser.add_argument("--etapa", action="append", default=[],
+                        help="only this stage, by name or type (repeatable), e.g. conversion or generacion")
+    parser.add_argument("-o", "--salida", help="results JSON (default: rendimiento-<date>.json)")
+    parser.add_argument("--comparar", metavar="JSON", help="baseline results to compare against")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA,
+                        help="allowed slowdown / output growth in %% before failing (default %(default)s)")
+    args = parser.parse_args(argv)
+
+    corpus = args.corpus or os.path.join(tempfile.gettempdir(), f"ocredit-corpus-{args.semilla}-{args.escala:g}")
+    os.makedirs(corpus, exist_ok=True)
+    print(f"Corpus: {corpus}")
+    manifiesto = generar_corpus(corpus, args.escala, args.semilla)
+    for nombre, c in manifiesto["categorias"].items():
+        print(f"  {nombre:22} {len(c['archivos']):4d} files {c['paginas']:5d} pages {c['bytes'] / 1e6:9.2f} MB")
+
+    trabajo = tempfile.mkdtemp(prefix="ocredit-rendimiento-")
+    try:
+        etapas = medir(manifiesto, trabajo, args.procesos, args.repeticiones, args.etapa)
+    finally:
+        shutil.rmtree(trabajo, ignore_errors=True)
+
+    resultados = {
+        "formato": FORMATO_RESULTADOS,
+        "version": VERSION,
+        "fecha": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "entorno": entorno(),
+        "parametros": {"escala": args.escala, "semilla": args.semilla, "procesos": args.procesos,
+                       "repeticiones": args.repeticiones},
+        "corpus": {n: dict(tipo=c["tipo"], archivos=len(c["archivos"]), paginas=c["paginas"], bytes=c["bytes"])
+                   for n, c in manifiesto["categorias"].items()},
+        "etapas": etapas,
+    }
+    salida = args.salida or f"rendimiento-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(resultados, f, ensure_ascii=False, indent=2)
+    print(f"Results: {salida}")
+
+    codigo = 1 if any("error" in r for r in etapas.values()) else 0
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            base = json.load(f)
+        if base.get("parametros", {}).get("escala") != args.escala:
+            print("Warning: the baseline was measured with a different corpus scale.")
+        regresiones = 0
+        for etapa, medida, antes, ahora, cambio, regresion in comparar(resultados, base, args.tolerancia):
+            marca = "  REGRESSION" if regresion else ""
+            print(f"{etapa:34} {medida:14} {antes:12.2f} -> {ahora:12.2f} {cambio:+7.1f}%{marca}")
+            regresiones += regresion
+        if regresiones:
+            print(f"{regresiones} regression(s) above {args.tolerancia:g}%.")
+            codigo = 1
+    return codigo
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,556 @@
+#!/usr/bin/env python3
+"""
+Carpetas vigiladas: convierte en PDF lo que dejan los escáneres, sin interfaz.
+
+    python Vigilancia.py C:\\Escaner -o C:\\PDF
+    python Vigilancia.py C:\\Escaner -o C:\\PDF --agrupar prefijo --inactividad 60 --proteger
+    python Vigilancia.py C:\\Escaner -o C:\\PDF --una-vez   (procesa lo que hay y termina)
+
+Cada pasada (cada --intervalo segundos) recorre las carpetas con os.scandir:
+- Un archivo nuevo se da por terminado cuando su tamaño y su mtime no cambian durante
+  --estable segundos y puede abrirse.
+- Se convierte en cuanto está terminado, en el pool de procesos, y sus páginas se
+  guardan en la caché de páginas (CachePaginas): el trabajo pesado se hace mientras
+  llegan los demás archivos del documento, no al final.
+- Los archivos se agrupan en documentos por subcarpeta, por el prefijo del nombre
+  (hasta --separador) o en un único lote. Un documento se cierra cuando lleva
+  --inactividad segundos sin recibir ni cambiar archivos y todos están convertidos;
+  entonces MotorPDF.generar_documento lo escribe (las páginas salen de la caché), si
+  se pide cifrado con los permisos de BloqueoDocumentos, y los originales se mueven a
+  _procesados (a _errores los que no pudieron convertirse).
+- Si el documento no puede escribirse (p. ej. la carpeta de salida está en una unidad
+  de red caída) se reintenta con esperas crecientes; tras --intentos fallos sus
+  archivos van a _errores. Con --una-vez no se reintenta: quedan en la carpeta.
+
+El estado es la propia carpeta: hasta que su documento está escrito ningún archivo se
+mueve, así que si el proceso se detiene basta con volver a lanzarlo (lo ya convertido
+se toma de la caché).
+
+La cola es acotada: como mucho --cola conversiones en vuelo y --cola-documentos
+documentos esperando a escribirse. En una ráfaga los archivos esperan en la carpeta,
+no en memoria, hasta que hay sitio.
+"""
+import argparse
+import heapq
+import itertools
+import os
+import queue
+import re
+import shutil
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from CachePaginas import CacheDisco
+from MotorPDF import (
+    BITS_PERMISOS, MODOS, contar_fotogramas, generar_documento, iterar_conversiones,
+    numero_procesos, opciones_conversion,
+)
+from Proyectos import EXTENSIONES
+
+# La misma caché que IMPDF: lo convertido por uno lo aprovecha el otro
+DIR_CACHE = os.path.join(os.environ.get("LOCALAPPDATA") or os.path.expanduser("~"), "OCREdit", "cache_paginas")
+
+AGRUPACIONES = ("carpeta", "prefijo", "lote")
+CARPETA_PROCESADOS = "_procesados"
+CARPETA_ERRORES = "_errores"
+
+# Estados de un archivo
+ESCRIBIENDOSE = "escribiendose"  # todavía cambia (o acaba de aparecer)
+LISTO = "listo"                  # terminado, esperando sitio en el pool
+CONVIRTIENDO = "convirtiendo"
+CONVERTIDO = "convertido"
+EN_DOCUMENTO = "en_documento"    # su documento se está escribiendo
+IGNORADO = "ignorado"            # no pudo moverse tras escribirse: no se vuelve a procesar
+
+# Reintentos de un documento que no pudo escribirse
+INTENTOS = 5
+ESPERA_REINTENTO_S = 30.0  # se dobla en cada fallo...
+ESPERA_MAX_S = 900.0       # ...hasta este máximo
+
+# --- Trabajo de los procesos del pool ---
+_caches = {}  # directorio -> CacheDisco, una por proceso
+
+def _iniciar_proceso():
+    # Ctrl+C llega a todo el grupo de procesos: sólo el principal decide cómo parar
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+def _preconvertir(ruta, opciones, dir_cache, cache_mb):
+    """
+    Convierte todas las páginas de la imagen y las deja en la caché, donde las
+    encontrará generar_documento al cerrar el documento. Devuelve la lista de errores.
+    """
+    cache = _caches.get(dir_cache)
+    if cache is None:
+        cache = _caches[dir_cache] = CacheDisco(dir_cache, limite_mb=cache_mb)
+    fotogramas = contar_fotogramas([ruta])
+    errores = []
+    for _, fotograma, _, _, error, _ in iterar_conversiones([ruta], 1, opciones=opciones, cache=cache,
+                                                            fotogramas=fotogramas):
+        if error is not None:
+            errores.append(f"page {fotograma + 1}: {error}" if fotogramas[0] > 1 else error)
+    return errores
+
+# --- Utilidades ---
+def _orden_natural(ruta):
+    """Clave de orden en la que pagina_2 va antes que pagina_10."""
+    return [int(t) if t.isdigit() else t for t in re.split(r"(\d+)", os.path.normcase(ruta))]
+
+def _se_puede_abrir(ruta):
+    # En Windows un archivo que otro proceso sigue escribiendo no puede abrirse
+    try:
+        with open(ruta, "rb") as f:
+            f.read(1)
+        return True
+    except OSError:
+        return False
+
+def _ruta_libre(ruta):
+    """ruta, o ruta con _2, _3... si ya existe."""
+    base, extension = os.path.splitext(ruta)
+    n = 1
+    while os.path.exists(ruta):
+        n += 1
+        ruta = f"{base}_{n}{extension}"
+    return ruta
+
+def _mover(ruta, directorio):
+    """Mueve ruta a directorio sin sobrescribir nada. Devuelve False si no pudo."""
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        shutil.move(ruta, _ruta_libre(os.path.join(directorio, os.path.basename(ruta))))
+        return True
+    except OSError:
+        return False
+
+def _aviso(mensaje):
+    print(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {mensaje}", flush=True)
+
+# --- Vigilante ---
+class Vigilante:
+    """
+    Vigila carpetas y genera un PDF por cada grupo de archivos. Uso:
+
+        vigilante = Vigilante(["C:/Escaner"], "C:/PDF", agrupar="prefijo")
+        vigilante.ejecutar()        # hasta detener() o Ctrl+C
+
+    agrupar: "carpeta" (un documento por subcarpeta; los archivos sueltos en la carpeta
+    vigilada forman el suyo), "prefijo" (por el nombre hasta separador, dentro de cada
+    subcarpeta) o "lote" (todo lo que llega hasta que pasan inactividad segundos).
+    opciones y bloqueos: como en MotorPDF.generar_documento. procesados y errores:
+    directorios a los que se mueven los originales (por defecto _procesados y _errores
+    dentro de cada carpeta vigilada), conservando la subcarpeta. intentos: veces que se
+    intenta escribir un documento antes de mover sus archivos a errores. aviso(mensaje)
+    recibe cada línea del registro de actividad.
+    """
+
+    def __init__(self, carpetas, salida, agrupar="carpeta", separador="_", inactividad=30.0,
+                 estable=2.0, intervalo=1.0, procesos=0, cola=None, cola_documentos=4,
+                 opciones=None, bloqueos=None, dir_cache=DIR_CACHE, cache_mb=1024,
+                 procesados=None, errores=None, intentos=INTENTOS, aviso=_aviso):
+        if agrupar not in AGRUPACIONES:
+            raise ValueError(f"agrupar must be one of {', '.join(AGRUPACIONES)}")
+        self.carpetas = [os.path.abspath(c) for c in carpetas]
+        self.salida = os.path.abspath(salida)
+        self.agrupar = agrupar
+        self.separador = separador
+        self.inactividad = inactividad
+        self.estable = estable
+        self.intervalo = intervalo
+        self.procesos = numero_procesos(procesos)
+        self.cola = max(1, cola or self.procesos * 2)
+        self.opciones = opciones or opciones_conversion()
+        self.bloqueos = bloqueos
+        self.dir_cache = dir_cache
+        self.cache_mb = cache_mb
+        self.cache = CacheDisco(dir_cache, limite_mb=cache_mb)
+        self.procesados = procesados
+        self.errores = errores
+        self.intentos = max(1, intentos)
+        self.aviso = aviso
+        self.documentos = 0
+        # Lo que nunca se recorre aunque esté dentro de una carpeta vigilada
+        self._excluidas = {os.path.normcase(os.path.abspath(d))
+                           for d in (salida, procesados, errores, dir_cache) if d}
+        self._archivos = {}   # ruta -> estado del archivo (dict), en orden de llegada
+        self._grupos = {}     # clave -> grupo abierto (dict)
+        self._futuros = {}    # Future -> (archivo, versión)
+        self._documentos = queue.Queue(maxsize=max(1, cola_documentos))
+        self._hechos = queue.Queue()  # listas de archivos ya escritos (o descartados)
+        self._fallidos = queue.Queue()  # grupos que no pudieron escribirse y se reintentarán
+        self._reintentos = []           # montículo de (momento, n, grupo) esperando su reintento
+        self._turno = itertools.count()
+        self._una_vez = False
+        self._detener = threading.Event()
+        self._despertar = threading.Event()  # una conversión o un documento terminó
+        self._pool = None
+        self._escritor = None
+
+    # --- Recorrido ---
+    def _recorrer(self, carpeta):
+        """DirEntry de los archivos aceptados bajo carpeta (y sus subcarpetas)."""
+        pila = [carpeta]
+        while pila:
+            try:
+                entradas = list(os.scandir(pila.pop()))
+            except OSError:
+                continue
+            for e in entradas:
+                if e.name.startswith((".", "~")):
+                    continue  # ocultos y temporales de Office
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        if (e.name not in (CARPETA_PROCESADOS, CARPETA_ERRORES)
+                                and os.path.normcase(e.path) not in self._excluidas):
+                            pila.append(e.path)
+                    elif e.is_file() and os.path.splitext(e.name)[1].lower() in EXTENSIONES:
+                        yield e
+                except OSError:
+                    continue
+
+    def _grupo(self, carpeta, ruta, ahora):
+        relativa = os.path.relpath(os.path.dirname(ruta), carpeta)
+        relativa = "" if relativa == os.curdir else relativa
+        if self.agrupar == "lote":
+            clave = (carpeta,)
+            nombre = os.path.basename(carpeta)
+        elif self.agrupar == "carpeta":
+            clave = (carpeta, relativa)
+            nombre = relativa.replace(os.sep, "_") or os.path.basename(carpeta)
+        else:
+            base = os.path.splitext(os.path.basename(ruta))[0]
+            prefijo = base.split(self.separador, 1)[0] if self.separador else base
+            clave = (carpeta, relativa, prefijo)
+            nombre = prefijo
+        grupo = self._grupos.get(clave)
+        if grupo is None:
+            grupo = self._grupos[clave] = {"clave": clave, "nombre": nombre, "carpeta": carpeta,
+                                           "archivos": [], "ultima": ahora}
+        return grupo
+
+    def pasada(self, vaciar=False):
+        """
+        Una vuelta: detecta archivos nuevos o cambiados, envía al pool los terminados,
+        recoge las conversiones y cierra los grupos inactivos. vaciar: cerrar los grupos
+        en cuanto estén convertidos, sin esperar la inactividad (y aceptar archivos vacíos,
+        que irán a _errores).
+        """
+        self._recoger_hechos()
+        ahora = time.monotonic()
+        vistos = set()
+        for carpeta in self.carpetas:
+            for e in self._recorrer(carpeta):
+                try:
+                    st = e.stat()
+                except OSError:
+                    continue
+                vistos.add(e.path)
+                firma = (st.st_size, st.st_mtime_ns)
+                archivo = self._archivos.get(e.path)
+                if archivo is None:
+                    grupo = self._grupo(carpeta, e.path, ahora)
+                    archivo = {"ruta": e.path, "grupo": grupo, "firma": firma, "desde": ahora,
+                               "estado": ESCRIBIENDOSE, "version": 0, "errores": []}
+                    self._archivos[e.path] = archivo
+                    grupo["archivos"].append(archivo)
+                    grupo["ultima"] = ahora
+                elif firma != archivo["firma"] and archivo["estado"] not in (EN_DOCUMENTO, IGNORADO):
+                    # sigue escribiéndose, o se reescribió después de convertirlo
+                    archivo.update(firma=firma, desde=ahora, estado=ESCRIBIENDOSE, errores=[])
+                    archivo["version"] += 1
+                    archivo["grupo"]["ultima"] = ahora
+                if (archivo["estado"] == ESCRIBIENDOSE and ahora - archivo["desde"] >= self.estable
+                        and (firma[0] > 0 or vaciar) and _se_puede_abrir(e.path)):
+                    archivo["estado"] = LISTO
+
+        # los que desaparecieron antes de escribirse su documento se olvidan
+        for ruta in [r for r, a in self._archivos.items() if r not in vistos and a["estado"] != EN_DOCUMENTO]:
+            archivo = self._archivos.pop(ruta)
+            if archivo["estado"] != IGNORADO:
+                archivo["grupo"]["archivos"].remove(archivo)
+
+        self._atender(vaciar)
+
+    def _atender(self, vaciar=False):
+        """Recoge conversiones y documentos terminados, llena el pool y cierra grupos, sin recorrer carpetas."""
+        self._recoger_hechos()
+        self._recoger_conversiones()
+        self._enviar_listos()
+        self._cerrar_grupos(time.monotonic(), vaciar)
+
+    def _enviar_listos(self):
+        for archivo in self._archivos.values():
+            if len(self._futuros) >= self.cola:
+                break  # cola llena: el resto espera en la carpeta
+            if archivo["estado"] != LISTO:
+                continue
+            if os.path.splitext(archivo["ruta"])[1].lower() == ".pdf":
+                archivo["estado"] = CONVERTIDO  # los PDF se leen al escribir el documento
+                continue
+            futuro = self._pool.submit(_preconvertir, archivo["ruta"], self.opciones,
+                                       self.dir_cache, self.cache_mb)
+            self._futuros[futuro] = (archivo, archivo["version"])
+            futuro.add_done_callback(lambda f: self._despertar.set())
+            archivo["estado"] = CONVIRTIENDO
+
+    def _recoger_conversiones(self):
+        for futuro in [f for f in self._futuros if f.done()]:
+            archivo, version = self._futuros.pop(futuro)
+            if archivo["version"] != version or archivo["estado"] != CONVIRTIENDO:
+                continue  # cambió mientras se convertía: ya está otra vez en espera
+            try:
+                archivo["errores"] = futuro.result()
+            except Exception as e:
+                # p. ej. BrokenProcessPool si un proceso muere
+                archivo["errores"] = [str(e)]
+            archivo["estado"] = CONVERTIDO
+            for error in archivo["errores"]:
+                self.aviso(f"Error: {archivo['ruta']}: {error}")
+
+    def _cerrar_grupos(self, ahora, vaciar):
+        # primero los documentos que fallaron y ya cumplieron su espera
+        while self._reintentos and self._reintentos[0][0] <= ahora:
+            try:
+                self._documentos.put_nowait(self._reintentos[0][2])
+            except queue.Full:
+                return
+            heapq.heappop(self._reintentos)
+        for clave, grupo in list(self._grupos.items()):
+            archivos = grupo["archivos"]
+            if not archivos:
+                del self._grupos[clave]
+                continue
+            if not vaciar and ahora - grupo["ultima"] < self.inactividad:
+                continue
+            if any(a["estado"] != CONVERTIDO for a in archivos):
+                continue
+            try:
+                self._documentos.put_nowait(grupo)
+            except queue.Full:
+                return  # se cerrará en otra pasada
+            del self._grupos[clave]
+            for a in archivos:
+                a["estado"] = EN_DOCUMENTO
+
+    def _recoger_hechos(self):
+        try:
+            while True:
+                for archivo in self._hechos.get_nowait():
+                    if archivo["estado"] == EN_DOCUMENTO:
+                        self._archivos.pop(archivo["ruta"], None)
+        except queue.Empty:
+            pass
+        try:
+            while True:
+                grupo = self._fallidos.get_nowait()
+                if self._una_vez:
+                    # quedan en la carpeta para la próxima ejecución
+                    for archivo in grupo["archivos"]:
+                        archivo["estado"] = IGNORADO
+                    continue
+                # sus archivos siguen EN_DOCUMENTO: el recorrido no los toma como nuevos
+                espera = min(ESPERA_REINTENTO_S * 2 ** (grupo["intentos"] - 1), ESPERA_MAX_S)
+                heapq.heappush(self._reintentos, (time.monotonic() + espera, next(self._turno), grupo))
+        except queue.Empty:
+            pass
+
+    # --- Escritura de documentos (hilo aparte) ---
+    def _hilo_escritor(self):
+        while True:
+            grupo = self._documentos.get()
+            if grupo is None:
+                return
+            try:
+                self._escribir(grupo)
+            except Exception as e:
+                grupo["intentos"] = grupo.get("intentos", 0) + 1
+                if grupo["intentos"] >= self.intentos:
+                    self.aviso(f"Error: {grupo['nombre']}: {e} (giving up after {grupo['intentos']} attempts)")
+                    self._archivar(grupo["archivos"], errores=True)
+                    self._hechos.put(grupo["archivos"])
+                else:
+                    siguiente = "left in the folder" if self._una_vez else "will retry"
+                    self.aviso(f"Error: {grupo['nombre']}: {e} "
+                               f"(attempt {grupo['intentos']} of {self.intentos}, {siguiente})")
+                    self._fallidos.put(grupo)
+            self._despertar.set()
+
+    def _destino(self, archivo, base, nombre_carpeta):
+        carpeta = archivo["grupo"]["carpeta"]
+        relativa = os.path.relpath(os.path.dirname(archivo["ruta"]), carpeta)
+        if base is None:
+            base = os.path.join(carpeta, nombre_carpeta)
+        return os.path.normpath(os.path.join(base, relativa))
+
+    def _archivar(self, archivos, errores):
+        for archivo in archivos:
+            destino = (self._destino(archivo, self.errores, CARPETA_ERRORES) if errores
+                       else self._destino(archivo, self.procesados, CARPETA_PROCESADOS))
+            if not _mover(archivo["ruta"], destino):
+                self.aviso(f"Error: can´t move {archivo['ruta']} to {destino}")
+                archivo["estado"] = IGNORADO
+
+    def _escribir(self, grupo):
+        archivos = sorted(grupo["archivos"], key=lambda a: _orden_natural(a["ruta"]))
+        fallidos = [a for a in archivos if a["errores"]]
+        validos = [a for a in archivos if not a["errores"]]
+        nombre = grupo["nombre"]
+        if self.agrupar == "lote":
+            nombre += time.strftime("_%Y%m%d_%H%M%S")
+        if validos:
+            os.makedirs(self.salida, exist_ok=True)
+            ruta_pdf = _ruta_libre(os.path.join(self.salida, nombre + ".pdf"))
+            estadisticas = {}
+            # si falla (p. ej. salida inaccesible) lo reintenta _hilo_escritor
+            errores = generar_documento([a["ruta"] for a in validos], ruta_pdf, procesos=1,
+                                        opciones=self.opciones, cache=self.cache,
+                                        bloqueos=self.bloqueos, compactar=True,
+                                        estadisticas=estadisticas)
+            con_error = {os.path.normcase(r) for r, _ in errores}
+            for ruta, mensaje in errores:
+                self.aviso(f"Error: {ruta}: {mensaje}")
+            fallidos += [a for a in validos if os.path.normcase(a["ruta"]) in con_error]
+            validos = [a for a in validos if os.path.normcase(a["ruta"]) not in con_error]
+            self.documentos += 1
+            self.aviso(f"PDF generated in: {ruta_pdf} ({len(validos)} files, "
+                       f"{estadisticas['bytes_salida'] / 1024:.0f} KB)")
+        self._archivar(validos, errores=False)
+        self._archivar(fallidos, errores=True)
+        self._hechos.put(archivos)
+
+    # --- Ciclo ---
+    def detener(self):
+        """Pide que ejecutar() termine tras la pasada en curso (desde otro hilo o una señal)."""
+        self._detener.set()
+        self._despertar.set()
+
+    def pendientes(self):
+        """Archivos vistos que aún no tienen su documento escrito."""
+        self._recoger_hechos()
+        return sum(1 for a in self._archivos.values() if a["estado"] != IGNORADO)
+
+    def ejecutar(self, una_vez=False):
+        """
+        Vigila hasta detener() o Ctrl+C. Al detenerse se escriben los documentos ya
+        cerrados; los grupos abiertos y los que esperan un reintento quedan en la
+        carpeta para la próxima vez.
+        una_vez: procesar lo que ya hay (sin esperar la inactividad) y terminar.
+        Devuelve el número de documentos escritos.
+        """
+        for carpeta in self.carpetas:
+            if not os.path.isdir(carpeta):
+                raise OSError(f"not a folder: {carpeta}")
+        self._una_vez = una_vez
+        self._pool = ProcessPoolExecutor(max_workers=self.procesos, initializer=_iniciar_proceso)
+        self._escritor = threading.Thread(target=self._hilo_escritor, daemon=True)
+        self._escritor.start()
+        self.aviso(f"Watching {', '.join(self.carpetas)} -> {self.salida} "
+                   f"(group by {self.agrupar}, {self.procesos} processes)")
+        try:
+            # Las carpetas se recorren cada intervalo; entre recorridos el bucle despierta
+            # en cuanto termina una conversión para dar su hueco en el pool al siguiente
+            proximo = 0.0
+            while not self._detener.is_set():
+                if time.monotonic() >= proximo:
+                    self.pasada(vaciar=una_vez)
+                    proximo = time.monotonic() + self.intervalo
+                else:
+                    self._atender(vaciar=una_vez)
+                if una_vez and not self.pendientes() and not self._futuros:
+                    break
+                self._despertar.wait(max(0.0, proximo - time.monotonic()))
+                self._despertar.clear()
+        except KeyboardInterrupt:
+            self.aviso("Stopping...")
+        finally:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._documentos.put(None)
+            self._escritor.join()
+            self._recoger_hechos()
+        return self.documentos
+
+# --- Línea de comandos ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Watch folders and turn the scanned files dropped there into A4 PDF documents."
+    )
+    parser.add_argument("carpetas", nargs="+", help="folders to watch (sub-folders included)")
+    parser.add_argument("-o", "--salida", required=True, help="folder for the generated PDF")
+    parser.add_argument("--agrupar", choices=AGRUPACIONES, default="carpeta",
+                        help="carpeta: one PDF per sub-folder; prefijo: per file name prefix; "
+                             "lote: everything that arrives until the idle time (default carpeta)")
+    parser.add_argument("--separador", default="_",
+                        help="with --agrupar prefijo: the prefix ends at this text (default _)")
+    parser.add_argument("--inactividad", type=float, default=30,
+                        help="seconds without new files before a document is closed (default 30)")
+    parser.add_argument("--estable", type=float, default=2,
+                        help="seconds a file must stay unchanged to be taken as complete (default 2)")
+    parser.add_argument("--intervalo", type=float, default=1, help="seconds between scans (default 1)")
+    parser.add_argument("-j", "--procesos", type=int, default=0,
+                        help="processes for image conversion (0 = all cores)")
+    parser.add_argument("--cola", type=int,
+                        help="maximum conversions in flight (default 2 per process)")
+    parser.add_argument("--cola-documentos", type=int, default=4,
+                        help="maximum closed documents waiting to be written (default 4)")
+    parser.add_argument("--procesados", metavar="DIR",
+                        help=f"move processed files here (default {CARPETA_PROCESADOS} in each watched folder)")
+    parser.add_argument("--errores", metavar="DIR",
+                        help=f"move files that failed here (default {CARPETA_ERRORES} in each watched folder)")
+    parser.add_argument("--intentos", type=int, default=INTENTOS,
+                        help=f"attempts to write a document (retried with growing waits) before "
+                             f"its files are moved to the errors folder (default {INTENTOS})")
+    parser.add_argument("--cache", metavar="DIR", default=DIR_CACHE,
+                        help="directory of the converted page cache (shared with IMPDF by default)")
+    parser.add_argument("--cache-mb", type=float, default=1024,
+                        help="cache size limit in MB (default 1024)")
+    parser.add_argument("--modo", choices=MODOS, default="lienzo",
+                        help="lienzo: full A4 canvas at 300 DPI; nativo: keep image resolution")
+    parser.add_argument("--dpi-max", type=float,
+                        help="nativo mode: downscale images above this DPI on the page")
+    parser.add_argument("--calidad-jpeg", type=int, default=75,
+                        help="JPEG quality when images are re-encoded (default 75)")
+    parser.add_argument("--recodificar-jpeg", action="store_true",
+                        help="decode and re-encode JPEG files instead of embedding them as-is")
+    parser.add_argument("--forzar-color", action="store_true",
+                        help="keep every page in color (no grayscale/bilevel detection)")
+    parser.add_argument("--kb-pagina", type=float,
+                        help="maximum size in KB of each image page (DPI and quality chosen per page)")
+    parser.add_argument("--proteger", action="store_true",
+                        help="encrypt the output (AES-256) blocking every permission not allowed")
+    parser.add_argument("--permitir", action="append", default=[], choices=sorted(BITS_PERMISOS),
+                        help="with --proteger: permission to allow (repeatable)")
+    parser.add_argument("--una-vez", action="store_true",
+                        help="process the files already in the folders and exit")
+    args = parser.parse_args(argv)
+
+    opciones = opciones_conversion(
+        jpeg_directo=not args.recodificar_jpeg, modo=args.modo,
+        dpi_max=args.dpi_max, calidad_jpeg=args.calidad_jpeg,
+        detectar_color=not args.forzar_color,
+        bytes_pagina=int(args.kb_pagina * 1024) if args.kb_pagina else None,
+    )
+    bloqueos = None
+    if args.proteger:
+        bloqueos = {p: p not in args.permitir for p in BITS_PERMISOS}
+
+    try:
+        vigilante = Vigilante(args.carpetas, args.salida, agrupar=args.agrupar, separador=args.separador,
+                              inactividad=args.inactividad, estable=args.estable,
+                              intervalo=args.intervalo, procesos=args.procesos, cola=args.cola,
+                              cola_documentos=args.cola_documentos, opciones=opciones,
+                              bloqueos=bloqueos, dir_cache=args.cache, cache_mb=args.cache_mb,
+                              procesados=args.procesados, errores=args.errores,
+                              intentos=args.intentos)
+        # detener el servicio (SIGTERM) es como Ctrl+C
+        signal.signal(signal.SIGTERM, lambda *_: vigilante.detener())
+        vigilante.ejecutar(una_vez=args.una_vez)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""
+Pruebas de los scripts de OCRedit: python -m pytest tests (desde Scripts).
+Los scripts se importan entre sí como módulos hermanos, así que su carpeta va al path.
+"""
+import os
+import sys
+
+import pytest
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCRIPTS not in sys.path:
+    sys.path.insert(0, SCRIPTS)
+
+from PIL import Image  # noqa: E402
+
+COLORES = [(200, 30, 30), (30, 200, 30), (30, 30, 200), (200, 200, 30), (30, 200, 200), (200, 30, 200)]
+
+def crear_imagen(ruta, color, tamano=(120, 160), formato=None):
+    Image.new("RGB", tamano, color).save(ruta, format=formato)
+    return str(ruta)
+
+@pytest.fixture
+def imagenes(tmp_path):
+    """Seis JPEG de colores distintos (uno por página), en orden."""
+    return [crear_imagen(tmp_path / f"img_{i}.jpg", color) for i, color in enumerate(COLORES)]
@@ -0,0 +1,89 @@
+"""BloqueoDocumentos: permisos, omisión de lo ya protegido, modo del archivo y lotes."""
+import os
+import stat
+
+import pytest
+
+from MotorPDF import generar_documento
+
+pikepdf = pytest.importorskip("pikepdf")
+import BloqueoDocumentos  # noqa: E402  (importa pikepdf)
+
+_proteger_en_proceso = BloqueoDocumentos._proteger_en_proceso
+
+def _proteger_o_morir(ruta_pdf, *args):
+    """Trabajo del pool que mata su proceso con el archivo "muere.pdf" (BrokenProcessPool)."""
+    if os.path.basename(ruta_pdf) == "muere.pdf":
+        os._exit(1)
+    return _proteger_en_proceso(ruta_pdf, *args)
+
+@pytest.fixture
+def pdf(imagenes, tmp_path):
+    ruta = str(tmp_path / "documento.pdf")
+    assert generar_documento(imagenes[:2], ruta) == []
+    return ruta
+
+def test_protege_con_los_permisos_pedidos(pdf):
+    permisos = BloqueoDocumentos.permisos_desde_bloqueos({"print_highres": False, "print_lowres": False})
+    assert BloqueoDocumentos.proteger_archivo(pdf, permisos) == "protected"
+    with pikepdf.open(pdf) as documento:
+        assert documento.encryption.R == 6
+        assert len(documento.pages) == 2
+        assert documento.allow.print_highres and not documento.allow.extract
+
+def test_omite_lo_ya_protegido_sin_temporales(pdf):
+    permisos = BloqueoDocumentos.permisos_desde_bloqueos({})
+    assert BloqueoDocumentos.proteger_archivo(pdf, permisos) == "protected"
+    antes = os.stat(pdf).st_mtime_ns
+    assert BloqueoDocumentos.proteger_archivo(pdf, permisos) == "skipped"
+    assert os.stat(pdf).st_mtime_ns == antes
+    assert os.listdir(os.path.dirname(pdf)).count("documento.pdf") == 1
+    assert not [n for n in os.listdir(os.path.dirname(pdf)) if n.endswith(".tmp")]
+    # con linealizar no vale lo ya protegido sin linealizar
+    assert BloqueoDocumentos.proteger_archivo(pdf, permisos, linealizar=True) == "protected"
+    with pikepdf.open(pdf) as documento:
+        assert documento.is_linearized
+
+@pytest.mark.skipif(os.name == "nt", reason="los permisos POSIX no se aplican en Windows")
+@pytest.mark.parametrize("modo", [0o644, 0o664, 0o600])
+def test_conserva_el_modo_del_archivo(pdf, modo):
+    os.chmod(pdf, modo)
+    assert BloqueoDocumentos.proteger_archivo(pdf, BloqueoDocumentos.permisos_desde_bloqueos({})) == "protected"
+    assert stat.S_IMODE(os.stat(pdf).st_mode) == modo
+
+def test_proteger_lote_informa_cada_archivo(imagenes, tmp_path):
+    rutas = []
+    for i in range(3):
+        ruta = str(tmp_path / f"d{i}.pdf")
+        assert generar_documento(imagenes[i:i + 1], ruta) == []
+        rutas.append(ruta)
+    roto = tmp_path / "roto.pdf"
+    roto.write_bytes(b"%PDF-1.7 roto")
+    resultados = BloqueoDocumentos.proteger_lote(rutas + [str(roto)], {}, procesos=1)
+    estados = {ruta: estado for ruta, estado, _ in resultados}
+    assert [estados[r] for r in rutas] == ["protected"] * 3
+    assert estados[str(roto)] == "failed"
+
+def test_proceso_muerto_cuenta_como_fallido(pdf, tmp_path, monkeypatch):
+    monkeypatch.setattr(BloqueoDocumentos, "_proteger_en_proceso", _proteger_o_morir)
+    muere = tmp_path / "muere.pdf"
+    muere.write_bytes(b"%PDF-1.7")
+    rutas = [str(muere), pdf]
+    resultados = BloqueoDocumentos.proteger_lote(rutas, {}, procesos=2)
+    # el pool queda roto: lo que no terminó también falla, pero el lote devuelve todo
+    assert [r for r, _, _ in resultados] == rutas
+    assert resultados[0][1] == "failed" and resultados[0][2]
+    assert resultados[1][1] in ("protected", "failed")
+
+def test_expandir_carpetas_y_patrones(tmp_path):
+    for nombre in ("b.pdf", "a.pdf", "nota.txt", "sub/c.pdf", "sub/d.PDF"):
+        (tmp_path / nombre).parent.mkdir(exist_ok=True)
+        (tmp_path / nombre).write_bytes(b"%PDF-1.7")
+    carpeta = str(tmp_path)
+    assert BloqueoDocumentos.expandir_entradas([carpeta]) == [
+        os.path.join(carpeta, "a.pdf"), os.path.join(carpeta, "b.pdf")]
+    assert len(BloqueoDocumentos.expandir_entradas([carpeta], recursivo=True)) == 4
+    patron = os.path.join(carpeta, "**", "*.pdf")
+    # carpeta y patrón juntos: sin duplicados
+    assert BloqueoDocumentos.expandir_entradas([carpeta, patron]) == [
+        os.path.join(carpeta, "a.pdf"), os.path.join(carpeta, "b.pdf"), os.path.join(carpeta, "sub", "c.pdf")]
@@ -0,0 +1,65 @@
+"""CachePaginas.CacheDisco: aciertos entre ejecuciones, claves y expulsión LRU."""
+import os
+import time
+
+from pypdf import PdfReader
+
+from CachePaginas import CacheDisco
+from MotorPDF import generar_documento, opciones_conversion, parametros_cache
+
+def _tocar(ruta, segundos):
+    st = os.stat(ruta)
+    os.utime(ruta, ns=(st.st_atime_ns, st.st_mtime_ns + int(segundos * 1e9)))
+
+def test_segunda_ejecucion_sale_de_la_cache(imagenes, tmp_path):
+    directorio = str(tmp_path / "cache")
+    primera = CacheDisco(directorio)
+    assert generar_documento(imagenes, str(tmp_path / "a.pdf"), cache=primera) == []
+    assert (primera.aciertos, primera.fallos) == (0, len(imagenes))
+    # otra ejecución (otro objeto, como otro proceso) tras editar una imagen
+    _tocar(imagenes[2], 5)
+    segunda = CacheDisco(directorio)
+    assert generar_documento(imagenes, str(tmp_path / "b.pdf"), cache=segunda) == []
+    assert (segunda.aciertos, segunda.fallos) == (len(imagenes) - 1, 1)
+    assert len(PdfReader(str(tmp_path / "b.pdf")).pages) == len(imagenes)
+
+def test_clave_depende_de_los_parametros(imagenes, tmp_path):
+    cache = CacheDisco(str(tmp_path / "cache"))
+    lienzo = parametros_cache(opciones_conversion())
+    nativo = parametros_cache(opciones_conversion(modo="nativo"))
+    assert cache.clave(imagenes[0], lienzo) == cache.clave(imagenes[0], dict(lienzo))
+    assert cache.clave(imagenes[0], lienzo) != cache.clave(imagenes[0], nativo)
+    assert cache.clave(imagenes[0], lienzo) != cache.clave(imagenes[1], lienzo)
+
+def test_por_hash_ignora_el_mtime(imagenes, tmp_path):
+    por_stat = CacheDisco(str(tmp_path / "stat"))
+    por_hash = CacheDisco(str(tmp_path / "hash"), por_hash=True)
+    antes = por_stat.clave(imagenes[0], {}), por_hash.clave(imagenes[0], {})
+    _tocar(imagenes[0], 5)
+    assert por_stat.clave(imagenes[0], {}) != antes[0]
+    assert por_hash.clave(imagenes[0], {}) == antes[1]
+
+def test_expulsion_lru(tmp_path):
+    cache = CacheDisco(str(tmp_path / "cache"), limite_mb=2500 / 2**20)
+    claves = [f"{i:02d}" + "0" * 62 for i in range(4)]
+    ahora = time.time()
+    for n, clave in enumerate(claves):
+        cache.guardar(clave, bytes(1000))
+        os.utime(cache._ruta(clave), (ahora - 100 + n, ahora - 100 + n))
+    # leer la más antigua la renueva: salen las dos siguientes
+    assert cache.obtener(claves[0]) == bytes(1000)
+    cache.limpiar()
+    assert [cache.obtener(c) is not None for c in claves] == [True, False, False, True]
+
+def test_temporales_huerfanos(tmp_path):
+    cache = CacheDisco(str(tmp_path / "cache"))
+    cache.guardar("ab" + "0" * 62, b"pagina")
+    viejo = os.path.join(cache.directorio, "ab", "viejo.tmp")
+    reciente = os.path.join(cache.directorio, "ab", "reciente.tmp")
+    for ruta in (viejo, reciente):
+        with open(ruta, "wb") as f:
+            f.write(b"a medias")
+    os.utime(viejo, (time.time() - 7200, time.time() - 7200))
+    cache.limpiar()
+    # el reciente puede ser de otra ejecución que todavía está escribiendo
+    assert not os.path.exists(viejo) and os.path.exists(reciente)
@@ -0,0 +1,275 @@
+"""Conversión de imágenes de MotorPDF: detección de color y modo de la página, JPEG directo, modo nativo,
+decodificación reducida, presupuesto de tamaño y TIFF directo."""
+import io
+import os
+
+import pytest
+from PIL import Image, ImageChops, ImageDraw, features
+from pypdf import PdfReader
+
+from AdaptadorPypdf import datos_codificados
+from conftest import crear_imagen
+from MotorPDF import (A4_HEIGHT_PT, A4_WIDTH_PT, BYTES_PAGINA_MIN, SOBRECARGA_DOCUMENTO,
+                      SOBRECARGA_PAGINA, abrir_imagen_reducida, convertir_imagen, generar_documento,
+                      _unir_tiras_jpeg, imagen_compacta, jpeg_a_pdf_directo, opciones_conversion,
+                      presupuesto_por_pagina, pts_to_pixels, tamano_nativo, tiff_a_pdf_directo)
+
+def _imagen_pdf(datos):
+    """XObject de la imagen de un PDF de una página."""
+    page = PdfReader(io.BytesIO(datos)).pages[0]
+    (imagen,) = page["/Resources"]["/XObject"].values()
+    return imagen.get_object()
+
+def _matriz(datos):
+    """Matriz con que la página de pdf_una_pagina dibuja la imagen ("q a b c d e f cm ...")."""
+    contenido = PdfReader(io.BytesIO(datos)).pages[0].get_contents().get_data()
+    return [float(v) for v in contenido.split()[1:7]]
+
+def _pagina_texto(fondo=255):
+    """Página A4 reducida con líneas de "texto" negras de bordes suavizados."""
+    img = Image.new("L", (600, 850), fondo)
+    dibujo = ImageDraw.Draw(img)
+    for y in range(60, 800, 40):
+        dibujo.rectangle((50, y, 550, y + 8), fill=0)
+        dibujo.line((50, y + 9, 550, y + 9), fill=128)  # borde suavizado
+    return img
+
+def test_texto_negro_es_bitonal():
+    assert imagen_compacta(_pagina_texto()).mode == "1"
+
+def test_sombreado_gris_claro_no_se_pierde():
+    # barras negras y un recuadro sombreado a 225 (cabecera de tabla, sello...)
+    img = _pagina_texto()
+    ImageDraw.Draw(img).rectangle((100, 300, 500, 500), fill=225)
+    compacta = imagen_compacta(img)
+    assert compacta.mode == "L"
+    assert compacta.getpixel((300, 420)) == 225
+
+def test_papel_casi_blanco_sigue_siendo_bitonal():
+    assert imagen_compacta(_pagina_texto(fondo=250)).mode == "1"
+
+def test_gris_de_una_imagen_en_color():
+    img = Image.merge("RGB", [_pagina_texto()] * 3)
+    ImageDraw.Draw(img).rectangle((100, 300, 500, 500), fill=(180, 180, 180))
+    assert imagen_compacta(img).mode == "L"
+    ImageDraw.Draw(img).rectangle((100, 300, 500, 500), fill=(200, 40, 40))
+    assert imagen_compacta(img).mode == "RGB"
+
+# --- JPEG directo ---
+@pytest.mark.parametrize("modo,espacio", [("RGB", "/DeviceRGB"), ("L", "/DeviceGray")])
+def test_jpeg_se_incrusta_sin_recomprimir(tmp_path, modo, espacio):
+    ruta = crear_imagen(tmp_path / "foto.jpg", (200, 30, 30), tamano=(800, 600))
+    Image.open(ruta).convert(modo).save(ruta)
+    datos = convertir_imagen(ruta, opciones_conversion())
+    imagen = _imagen_pdf(datos)
+    with open(ruta, "rb") as f:
+        assert datos_codificados(imagen) == f.read()
+    assert imagen["/Filter"] == "/DCTDecode" and imagen["/ColorSpace"] == espacio
+    assert (imagen["/Width"], imagen["/Height"]) == (800, 600)
+    # escalada al ancho de A4 y centrada en vertical con la matriz, no con píxeles
+    alto = 600 * A4_WIDTH_PT / 800
+    assert _matriz(datos) == pytest.approx([A4_WIDTH_PT, 0, 0, alto, 0, (A4_HEIGHT_PT - alto) / 2], abs=1e-3)
+
+def test_jpeg_no_apto_se_convierte(tmp_path):
+    ruta = str(tmp_path / "cmyk.jpg")
+    Image.new("CMYK", (300, 400), (0, 200, 200, 0)).save(ruta)
+    assert jpeg_a_pdf_directo(ruta) is None
+    imagen = _imagen_pdf(convertir_imagen(ruta, opciones_conversion()))
+    assert imagen["/ColorSpace"] in ("/DeviceRGB", "/DeviceGray")
+
+def test_jpeg_directo_desactivado(tmp_path):
+    ruta = crear_imagen(tmp_path / "foto.jpg", (200, 30, 30), tamano=(800, 600))
+    imagen = _imagen_pdf(convertir_imagen(ruta, opciones_conversion(jpeg_directo=False)))
+    with open(ruta, "rb") as f:
+        assert datos_codificados(imagen) != f.read()
+
+# --- Modo nativo ---
+def test_lienzo_pinta_a4_completo(tmp_path):
+    ruta = crear_imagen(tmp_path / "recibo.png", (250, 250, 250), tamano=(200, 300))
+    imagen = _imagen_pdf(convertir_imagen(ruta, opciones_conversion(detectar_color=False)))
+    assert (imagen["/Width"], imagen["/Height"]) == (pts_to_pixels(A4_WIDTH_PT), pts_to_pixels(A4_HEIGHT_PT))
+
+def test_nativo_conserva_la_resolucion(tmp_path):
+    ruta = crear_imagen(tmp_path / "recibo.png", (250, 250, 250), tamano=(200, 300))
+    datos = convertir_imagen(ruta, opciones_conversion(modo="nativo", detectar_color=False))
+    imagen = _imagen_pdf(datos)
+    assert (imagen["/Width"], imagen["/Height"]) == (200, 300)
+    assert imagen["/Filter"] == "/FlateDecode"  # PNG: sin pérdida
+    # los márgenes los pone la matriz: la imagen ocupa el alto de A4, centrada
+    ancho = 200 * A4_HEIGHT_PT / 300
+    assert _matriz(datos) == pytest.approx([ancho, 0, 0, A4_HEIGHT_PT, (A4_WIDTH_PT - ancho) / 2, 0], abs=1e-3)
+
+@pytest.mark.parametrize("nombre", ["escaneo.png", "escaneo.jpg"])
+def test_nativo_reduce_por_encima_de_dpi_max(tmp_path, nombre):
+    # A4 a 300 DPI; con dpi_max=150 se guarda a la mitad y el JPEG ya no va directo
+    ruta = crear_imagen(tmp_path / nombre, (200, 30, 30), tamano=(2480, 3508))
+    imagen = _imagen_pdf(convertir_imagen(ruta, opciones_conversion(modo="nativo", dpi_max=150)))
+    assert (imagen["/Width"], imagen["/Height"]) == (1240, 1754)
+    imagen = _imagen_pdf(convertir_imagen(ruta, opciones_conversion(modo="nativo", dpi_max=400)))
+    assert (imagen["/Width"], imagen["/Height"]) == (2480, 3508)
+
+def test_tamano_nativo_nunca_amplia():
+    assert tamano_nativo(200, 300) == (200, 300)
+    assert tamano_nativo(200, 300, dpi_max=600) == (200, 300)
+    assert tamano_nativo(4960, 7016, dpi_max=300) == (2480, 3508)
+
+def test_modo_desconocido():
+    with pytest.raises(ValueError):
+        opciones_conversion(modo="a3")
+
+# --- Decodificación reducida ---
+@pytest.fixture
+def redimensionados(monkeypatch):
+    """Tamaños de origen y destino de cada Image.resize."""
+    llamadas = []
+    original = Image.Image.resize
+
+    def resize(self, size, *args, **kwargs):
+        llamadas.append((self.size, tuple(size)))
+        return original(self, size, *args, **kwargs)
+    monkeypatch.setattr(Image.Image, "resize", resize)
+    return llamadas
+
+@pytest.mark.parametrize("formato,decodificado", [
+    ("JPEG", (500, 375)),      # DCT a 1/8, el menor que no queda por debajo de 400x300
+    pytest.param("JPEG2000", (500, 375), marks=pytest.mark.skipif(
+        not features.check("jpg_2000"), reason="Pillow sin OpenJPEG")),  # nivel de resolución 3
+    ("PNG", (4000, 3000)),     # sin escalado nativo: se decodifica completa
+])
+def test_decodifica_a_escala_reducida(tmp_path, redimensionados, formato, decodificado):
+    ruta = crear_imagen(tmp_path / "grande", (30, 120, 200), tamano=(4000, 3000), formato=formato)
+    img, original, leido = abrir_imagen_reducida(ruta, lambda w, h: (w // 10, h // 10))
+    assert (img.size, img.mode, original, leido) == ((400, 300), "RGB", (4000, 3000), formato)
+    assert redimensionados == [(decodificado, (400, 300))]
+
+def test_escala_exacta_no_redimensiona(tmp_path, redimensionados):
+    ruta = crear_imagen(tmp_path / "grande.jpg", (30, 120, 200), tamano=(4000, 3000))
+    img, _, _ = abrir_imagen_reducida(ruta, lambda w, h: (w // 4, h // 4))
+    assert img.size == (1000, 750) and redimensionados == []
+
+def test_solo_se_decodifica_el_fotograma_pedido(tmp_path):
+    ruta = str(tmp_path / "varias.tif")
+    paginas = [Image.new("RGB", (800, 600), color) for color in ((255, 0, 0), (0, 0, 255))]
+    paginas[0].save(ruta, save_all=True, append_images=paginas[1:])
+    img, _, _ = abrir_imagen_reducida(ruta, lambda w, h: (w // 2, h // 2), fotograma=1)
+    assert img.size == (400, 300) and img.getpixel((200, 150)) == (0, 0, 255)
+
+# --- Presupuesto de tamaño ---
+def _foto_ruidosa(ruta, tamano=(1240, 1754)):
+    """Imagen en color que apenas se comprime (el peor caso para el presupuesto)."""
+    canales = [Image.effect_noise(tamano, sigma) for sigma in (40, 60, 80)]
+    Image.merge("RGB", canales).save(ruta, quality=95)
+    return str(ruta)
+
+def _presupuesto(ruta, bytes_pagina):
+    datos = convertir_imagen(ruta, opciones_conversion(bytes_pagina=bytes_pagina))
+    return datos, _imagen_pdf(datos)
+
+def test_la_pagina_cabe_en_el_presupuesto(tmp_path):
+    ruta = _foto_ruidosa(tmp_path / "foto.jpg")
+    grande, imagen_grande = _presupuesto(ruta, 4 * 2**20)
+    pequena, imagen_pequena = _presupuesto(ruta, 150 * 1024)
+    assert len(pequena) <= 150 * 1024 < len(grande)
+    # el JPEG directo ya cabe en el presupuesto grande; en el pequeño baja DPI o calidad
+    with open(ruta, "rb") as f:
+        assert datos_codificados(imagen_grande) == f.read()
+    assert imagen_pequena["/Filter"] == "/DCTDecode"
+    assert imagen_pequena["/Width"] <= imagen_grande["/Width"]
+
+def test_escaneo_bitonal_sin_perdida(tmp_path):
+    ruta = str(tmp_path / "texto.png")
+    Image.merge("RGB", [_pagina_texto().resize((1240, 1754))] * 3).save(ruta)
+    datos, imagen = _presupuesto(ruta, 60 * 1024)
+    assert len(datos) <= 60 * 1024
+    assert imagen["/Filter"] == "/CCITTFaxDecode" and imagen["/BitsPerComponent"] == 1
+
+def test_presupuesto_imposible_usa_el_ultimo_candidato(tmp_path):
+    ruta = _foto_ruidosa(tmp_path / "foto.jpg")
+    datos, imagen = _presupuesto(ruta, BYTES_PAGINA_MIN)
+    # 75 DPI en A4 y la calidad más baja: no cabe, pero la página se genera
+    assert imagen["/Height"] == pts_to_pixels(A4_HEIGHT_PT, 75)
+    assert len(datos) > BYTES_PAGINA_MIN
+
+def test_reparto_del_limite(tmp_path, imagenes):
+    pdf = tmp_path / "anexo.pdf"
+    generar_documento(imagenes[:1], str(pdf))
+    rutas = [imagenes[0], imagenes[1], imagenes[0], str(pdf)]
+    originales = [None, None, 0, None]
+    limite = 2 * 2**20
+    fijos = SOBRECARGA_DOCUMENTO + SOBRECARGA_PAGINA + os.path.getsize(pdf)
+    assert presupuesto_por_pagina(rutas, limite, originales) == int((limite - fijos) / 2)
+    assert presupuesto_por_pagina(rutas, limite, originales, fotogramas=[3, 1, 3, 1]) == int(
+        (limite - fijos - 2 * SOBRECARGA_PAGINA) / 4)
+    assert presupuesto_por_pagina([str(pdf)], limite) is None
+    assert presupuesto_por_pagina(rutas, 1000, originales) == BYTES_PAGINA_MIN
+
+def test_documento_no_pasa_del_limite(tmp_path):
+    rutas = [_foto_ruidosa(tmp_path / f"foto_{i}.jpg") for i in range(3)]
+    salida = str(tmp_path / "salida.pdf")
+    assert generar_documento(rutas, salida, limite_bytes=600 * 1024) == []
+    assert os.path.getsize(salida) <= 600 * 1024
+    assert len(PdfReader(salida).pages) == 3
+
+# --- TIFF directo ---
+requiere_libtiff = pytest.mark.skipif(not features.check("libtiff"), reason="Pillow sin libtiff")
+
+def _tiras(ruta):
+    """Datos de cada tira de la primera página de un TIFF."""
+    with Image.open(ruta) as img:
+        offsets, largos = img.tag_v2[273], img.tag_v2[279]
+    with open(ruta, "rb") as f:
+        datos = f.read()
+    return [datos[o:o + n] for o, n in zip(offsets, largos)]
+
+def _renderizar(datos):
+    """Imagen de la página decodificada por PyMuPDF (pypdf no entiende /EncodedByteAlign)."""
+    fitz = pytest.importorskip("pymupdf")
+    with fitz.open("pdf", datos) as doc:
+        pix = fitz.Pixmap(doc, doc[0].get_images()[0][0])
+        return Image.frombytes("L" if pix.n == 1 else "RGB", (pix.width, pix.height), pix.samples)
+
+def _iguales(a, b):
+    return ImageChops.difference(a, b).getbbox() is None
+
+@requiere_libtiff
+@pytest.mark.parametrize("compresion,k", [("group3", 0), ("tiff_ccitt", 0), ("group4", -1)])
+def test_tiff_ccitt_en_varias_tiras(tmp_path, compresion, k):
+    ruta = str(tmp_path / "escaneo.tif")
+    original = _pagina_texto().convert("1")
+    original.save(ruta, compression=compresion, strip_size=100 * (original.width // 8))
+    tiras = _tiras(ruta)
+    assert len(tiras) > 1
+    imagen = _imagen_pdf(tiff_a_pdf_directo(ruta))
+    assert imagen["/Filter"] == "/CCITTFaxDecode" and imagen["/DecodeParms"]["/K"] == k
+    if compresion != "group4":
+        # G3 y Huffman modificado: las tiras se concatenan tal cual; G4 de varias
+        # tiras se vuelve a codificar en una sola
+        assert datos_codificados(imagen) == b"".join(tiras)
+    assert _iguales(_renderizar(tiff_a_pdf_directo(ruta)), original.convert("L"))
+
+@requiere_libtiff
+@pytest.mark.parametrize("modo", ["RGB", "L"])
+def test_tiff_jpeg_en_varias_tiras(tmp_path, modo):
+    ruta = str(tmp_path / "foto.tif")
+    original = Image.new("RGB", (200, 150), "white")
+    dibujo = ImageDraw.Draw(original)
+    for i in range(8):
+        dibujo.rectangle((i * 25, 0, i * 25 + 20, 150), fill=(30 * i, 200 - 20 * i, 100))
+    original.convert(modo).save(ruta, compression="jpeg", strip_size=32 * 200 * len(modo))
+    tiras = _tiras(ruta)
+    assert len(tiras) == 5  # la última, de 22 filas, incompleta
+    datos = datos_codificados(_imagen_pdf(tiff_a_pdf_directo(ruta)))
+    # un solo JPEG: DRI con el intervalo de una tira y un RSTn entre cada dos tiras
+    assert datos.count(b"\xff\xdd") == 1
+    assert [m for m in range(0xD0, 0xD8) if bytes((0xFF, m)) in datos] == [0xD0, 0xD1, 0xD2, 0xD3]
+    with Image.open(io.BytesIO(datos)) as unido, Image.open(ruta) as tiff:
+        assert unido.size == (200, 150)
+        assert _iguales(unido.convert(modo), tiff.convert(modo))
+
+@requiere_libtiff
+def test_tiras_jpeg_no_alineadas_con_los_mcu(tmp_path):
+    ruta = str(tmp_path / "foto.tif")
+    Image.new("L", (200, 150), 128).save(ruta, compression="jpeg", strip_size=32 * 200)
+    # un reinicio sólo puede ir al final de una fila de MCU (8 filas en gris)
+    assert _unir_tiras_jpeg(_tiras(ruta), 200, 150, 12) is None
+    assert _unir_tiras_jpeg(_tiras(ruta), 200, 150, 32) is not None
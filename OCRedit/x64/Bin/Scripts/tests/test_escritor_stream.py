@@ -0,0 +1,77 @@
+"""EscritorStream: salida cifrada y con object streams, y streams compartidos entre documentos."""
+import pytest
+from pypdf import PdfReader
+
+import AdaptadorPypdf
+from EscritorStream import EscritorStream
+from MotorPDF import generar_documento, permisos_pdf
+
+pikepdf = pytest.importorskip("pikepdf")
+
+BLOQUEOS = {"print_highres": False, "print_lowres": False, "extract": True}
+
+def _p_con_signo(p):
+    return p - 2**32 if p >= 2**31 else p
+
+def _comprobar(ruta, paginas):
+    lector = PdfReader(ruta)
+    assert lector.is_encrypted
+    lector.decrypt("")
+    assert len(lector.pages) == paginas
+    assert _p_con_signo(int(lector.trailer["/Encrypt"]["/P"])) == _p_con_signo(permisos_pdf(BLOQUEOS))
+    with pikepdf.open(ruta) as pdf:
+        assert len(pdf.pages) == paginas
+        assert pdf.encryption.R == 6
+        assert pdf.encryption.P == _p_con_signo(permisos_pdf(BLOQUEOS))
+        assert pdf.allow.print_highres and pdf.allow.print_lowres
+        assert not pdf.allow.extract and not pdf.allow.modify_other
+
+@pytest.mark.parametrize("compactar", [False, True])
+def test_cifrado_con_object_streams(imagenes, tmp_path, compactar):
+    salida = str(tmp_path / "salida.pdf")
+    assert generar_documento(imagenes, salida, bloqueos=BLOQUEOS, compactar=compactar, streaming=True) == []
+    _comprobar(salida, len(imagenes))
+
+def test_cifrado_sin_api_interna(imagenes, tmp_path, monkeypatch):
+    # Una versión de pypdf fuera del rango probado cifra al cerrar con PdfWriter.encrypt
+    monkeypatch.setattr(AdaptadorPypdf, "VERSIONES_PROBADAS", ((0, 0), (0, 1)))
+    monkeypatch.setattr(AdaptadorPypdf, "_avisado", True)
+    salida = str(tmp_path / "salida.pdf")
+    assert generar_documento(imagenes, salida, bloqueos=BLOQUEOS, compactar=True) == []
+    _comprobar(salida, len(imagenes))
+
+# --- Recursos compartidos entre documentos ---
+def _pdf_con_logo(tmp_path, nombre, logo):
+    salida = str(tmp_path / nombre)
+    assert generar_documento([logo], salida) == []
+    return salida
+
+def test_streams_identicos_se_escriben_una_vez(imagenes, tmp_path):
+    # dos documentos de origen distintos con la misma imagen: una sola copia en la salida
+    origenes = [_pdf_con_logo(tmp_path, f"origen_{i}.pdf", imagenes[0]) for i in range(3)]
+    salida = str(tmp_path / "unido.pdf")
+    escritor = EscritorStream(salida, compactar=True)
+    for ruta in origenes:
+        for page in PdfReader(ruta).pages:
+            escritor.agregar_pagina(page)
+    escritor.cerrar()
+    assert escritor.compartidos >= 2
+    assert escritor.bytes_ahorrados > 0
+    with pikepdf.open(salida) as pdf:
+        assert len(pdf.pages) == 3
+        imagenes_salida = {o.objgen for o in pdf.objects
+                           if isinstance(o, pikepdf.Stream) and o.get("/Subtype") == "/Image"}
+        assert len(imagenes_salida) == 1
+        # los objetos que no son streams van en object streams
+        assert any(isinstance(o, pikepdf.Stream) and o.get("/Type") == "/ObjStm" for o in pdf.objects)
+
+def test_streams_distintos_no_se_comparten(imagenes, tmp_path):
+    origenes = [_pdf_con_logo(tmp_path, f"origen_{i}.pdf", imagenes[i]) for i in range(3)]
+    salida = str(tmp_path / "unido.pdf")
+    with EscritorStream(salida) as escritor:
+        for ruta in origenes:
+            escritor.agregar_pagina(PdfReader(ruta).pages[0])
+    with pikepdf.open(salida) as pdf:
+        assert len(pdf.pages) == 3
+        assert len({o.objgen for o in pdf.objects
+                    if isinstance(o, pikepdf.Stream) and o.get("/Subtype") == "/Image"}) == 3
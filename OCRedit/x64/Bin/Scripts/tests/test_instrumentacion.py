@@ -0,0 +1,84 @@
+"""Instrumentacion: etapas y contadores del registro activo, e informe JSON-lines de un trabajo."""
+import json
+import os
+
+import pytest
+
+import Instrumentacion
+from Instrumentacion import (Informe, Registro, contar, etapa, iniciar_registro, medir_etapa,
+                             terminar_registro)
+from MotorPDF import generar_documento
+
+def _lineas(ruta):
+    with open(ruta, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f]
+
+def test_sin_registro_no_se_mide_nada():
+    terminar_registro()
+    with etapa("decodificar"):
+        contar("paginas")
+    assert terminar_registro() is None
+
+def test_etapas_y_contadores():
+    @medir_etapa("codificar")
+    def codificar():
+        contar("bytes", 10)
+
+    registro = iniciar_registro()
+    with etapa("decodificar"):
+        pass
+    codificar()
+    codificar()
+    assert terminar_registro() is registro
+    assert set(registro.etapas) == {"decodificar", "codificar"}
+    assert registro.contadores == {"bytes": 20}
+    # lo que vuelve de un proceso del pool se suma
+    registro.fusionar({"etapas": {"codificar": 1.0}, "contadores": {"bytes": 5, "paginas": 1}})
+    assert registro.etapas["codificar"] >= 1.0
+    assert registro.contadores == {"bytes": 25, "paginas": 1}
+
+@pytest.mark.parametrize("procesos,streaming", [(1, False), (2, True)])
+def test_informe_de_generar_documento(imagenes, tmp_path, procesos, streaming):
+    roto = tmp_path / "roto.jpg"
+    roto.write_bytes(b"no es una imagen")
+    rutas = imagenes[:3] + [str(roto)]
+    metricas = str(tmp_path / "metricas.jsonl")
+    salida = str(tmp_path / "salida.pdf")
+    with Informe(metricas, "generar", {"procesos": procesos}) as informe:
+        generar_documento(rutas, salida, procesos=procesos, streaming=streaming, informe=informe)
+    lineas = _lineas(metricas)
+    assert [l["tipo"] for l in lineas] == ["trabajo"] + ["entrada"] * 4 + ["cierre", "resumen"]
+    assert lineas[0]["formato"] == Instrumentacion.FORMATO and lineas[0]["parametros"] == {"procesos": procesos}
+    entradas = lineas[1:5]
+    assert [e["ruta"] for e in entradas] == rutas
+    for e, ruta in zip(entradas[:3], imagenes):
+        # las etapas de la conversión vuelven del proceso que la hizo
+        assert "incrustar" in e["etapas"]
+        assert e["paginas"] == 1 and e["bytes_leidos"] == os.path.getsize(ruta) and e["error"] is None
+        assert (e["bytes_escritos"] > 0) if streaming else e["bytes_escritos"] is None
+    assert entradas[3]["paginas"] == 0 and entradas[3]["error"]
+    assert "escribir" in lineas[5]["etapas"] and lineas[5]["contadores"]["paginas"] == 3
+    resumen = lineas[6]
+    assert resumen["entradas"] == 4 and "error" not in resumen
+    assert "escribir" in resumen["etapas"] and "incrustar" in resumen["etapas"]
+
+def test_resumen_con_error_y_lentos(tmp_path, monkeypatch):
+    monkeypatch.setattr(Instrumentacion, "UMBRAL_LENTO_S", 1.0)
+    metricas = str(tmp_path / "metricas.jsonl")
+    with pytest.raises(RuntimeError):
+        with Informe(metricas, "generar") as informe:
+            for i in range(5):
+                informe.registrar(f"rapida_{i}.jpg", Registro(), segundos=0.5)
+            informe.registrar("lenta.tif", {"etapas": {"decodificar": 3.0}}, segundos=3.0, fotograma=2)
+            raise RuntimeError("disco lleno")
+    resumen = _lineas(metricas)[-1]
+    # escrito aunque el trabajo falle, con lo medido hasta entonces
+    assert resumen["error"] == "RuntimeError: disco lleno"
+    assert resumen["entradas"] == 6 and resumen["mediana_entrada_s"] == 0.5
+    assert resumen["lentos"] == [{"ruta": "lenta.tif", "segundos": 3.0, "fotograma": 2}]
+
+def test_perfil(imagenes, tmp_path):
+    perfil = str(tmp_path / "trabajo.prof")
+    with Informe(None, "generar", perfil=perfil) as informe:
+        generar_documento(imagenes[:2], str(tmp_path / "salida.pdf"), informe=informe)
+    assert os.path.getsize(perfil) > 0
@@ -0,0 +1,74 @@
+"""ModeloLista: operaciones por lotes sobre la selección."""
+import pytest
+
+from ListaArchivos import ModeloLista
+
+@pytest.fixture
+def modelo():
+    m = ModeloLista()
+    m.agregar([f"r{i}" for i in range(8)])
+    m.avisos = 0
+
+    def contar():
+        m.avisos += 1
+    m.suscribir(contar)
+    return m
+
+def test_eliminar_seleccion(modelo):
+    modelo.seleccionar({1, 3, 4, 7})
+    modelo.eliminar()
+    assert modelo.rutas == ["r0", "r2", "r5", "r6"]
+    assert modelo.seleccion == set()
+    assert modelo.avisos == 2
+
+def test_eliminar_sin_seleccion(modelo):
+    modelo.eliminar()
+    assert len(modelo) == 8
+
+def test_subir_con_bloque_en_el_borde(modelo):
+    # r0 y r1 ya tocan el principio: se quedan; r4 y r6 suben una posición
+    modelo.seleccionar({0, 1, 4, 6})
+    modelo.mover(-1)
+    assert modelo.rutas == ["r0", "r1", "r2", "r4", "r3", "r6", "r5", "r7"]
+    assert modelo.seleccion == {0, 1, 3, 5}
+
+def test_bajar_con_bloque_en_el_borde(modelo):
+    modelo.seleccionar({2, 3, 6, 7})
+    modelo.mover(1)
+    assert modelo.rutas == ["r0", "r1", "r4", "r2", "r3", "r5", "r6", "r7"]
+    assert modelo.seleccion == {3, 4, 6, 7}
+
+def test_subir_y_bajar_se_deshacen(modelo):
+    modelo.seleccionar({2, 5})
+    modelo.mover(1)
+    modelo.mover(-1)
+    assert modelo.rutas == [f"r{i}" for i in range(8)]
+    assert modelo.seleccion == {2, 5}
+
+def test_al_principio_conserva_el_orden_relativo(modelo):
+    modelo.seleccionar({6, 2, 4})
+    modelo.mover_al_principio()
+    assert modelo.rutas == ["r2", "r4", "r6", "r0", "r1", "r3", "r5", "r7"]
+    assert modelo.seleccion == {0, 1, 2}
+
+def test_al_final_conserva_el_orden_relativo(modelo):
+    modelo.seleccionar({0, 5, 3})
+    modelo.mover_al_final()
+    assert modelo.rutas == ["r1", "r2", "r4", "r6", "r7", "r0", "r3", "r5"]
+    assert modelo.seleccion == {5, 6, 7}
+
+def test_lote_grande(modelo):
+    modelo.reemplazar([f"r{i}" for i in range(20000)])
+    modelo.seleccionar(range(0, 20000, 2))
+    modelo.mover_al_final()
+    assert modelo.rutas[:3] == ["r1", "r3", "r5"]
+    assert modelo.rutas[10000:10003] == ["r0", "r2", "r4"]
+    modelo.eliminar()
+    assert len(modelo) == 10000 and all(int(r[1:]) % 2 for r in modelo.rutas)
+
+def test_reemplazar_en_sitio(modelo):
+    rutas = modelo.rutas
+    modelo.seleccionar({1})
+    modelo.reemplazar(["a", "b"])
+    assert rutas is modelo.rutas and rutas == ["a", "b"]
+    assert modelo.seleccion == set()
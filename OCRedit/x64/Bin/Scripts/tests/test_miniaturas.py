@@ -0,0 +1,51 @@
+"""Miniaturas.ServicioMiniaturas: la identidad del archivo se comprueba en los hilos del servicio."""
+import os
+import queue
+
+import pytest
+
+from conftest import COLORES, crear_imagen
+
+Miniaturas = pytest.importorskip("Miniaturas")  # necesita tkinter
+
+def _entregas(servicio, rutas):
+    """Pide rutas, espera a que el pool termine y devuelve lo entregado."""
+    servicio.pedir(rutas)
+    # con un solo hilo, un trabajo vacío termina después de todos los pedidos
+    servicio._pool.submit(lambda: None).result()
+    entregas = []
+    try:
+        while True:
+            entregas.append(servicio.resultados.get_nowait())
+    except queue.Empty:
+        return entregas
+
+def test_solo_entrega_lo_que_cambia(imagenes, tmp_path):
+    servicio = Miniaturas.ServicioMiniaturas(str(tmp_path / "cache"), hilos=1)
+    try:
+        primeras = _entregas(servicio, imagenes[:3])
+        assert sorted(v[0] for v, _ in primeras) == sorted(imagenes[:3])
+        assert all(datos for _, datos in primeras)
+        # sin cambios en disco no se vuelve a entregar nada
+        assert _entregas(servicio, imagenes[:3]) == []
+        # el archivo cambia: llega su nueva identidad
+        crear_imagen(imagenes[1], COLORES[5], tamano=(200, 100))
+        st = os.stat(imagenes[1])
+        os.utime(imagenes[1], ns=(st.st_atime_ns, st.st_mtime_ns + 5 * 10**9))
+        cambiadas = _entregas(servicio, imagenes[:3])
+        assert [v for v, _ in cambiadas] == [Miniaturas.identidad(imagenes[1])]
+        # lo que el panel olvida se entrega otra vez
+        servicio.olvidar(imagenes[0])
+        assert [v[0] for v, _ in _entregas(servicio, imagenes[:3])] == [imagenes[0]]
+    finally:
+        servicio.cerrar()
+
+def test_fallo_se_entrega_una_vez(tmp_path):
+    rota = tmp_path / "rota.jpg"
+    rota.write_bytes(b"no es una imagen")
+    servicio = Miniaturas.ServicioMiniaturas(str(tmp_path / "cache"), hilos=1)
+    try:
+        assert [datos for _, datos in _entregas(servicio, [str(rota)])] == [None]
+        assert _entregas(servicio, [str(rota)]) == []
+    finally:
+        servicio.cerrar()
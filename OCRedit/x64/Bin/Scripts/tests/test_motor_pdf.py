@@ -0,0 +1,76 @@
+"""MotorPDF.generar_documento: orden de páginas con el pool de procesos, permisos /P y duplicados."""
+import os
+
+import pytest
+from pypdf import PdfReader
+
+from conftest import COLORES, crear_imagen
+from MotorPDF import buscar_duplicados, generar_documento, permisos_pdf
+from Proyectos import hash_archivo
+
+def _color_pagina(page):
+    """Color del centro de la imagen de la página."""
+    img = page.images[0].image.convert("RGB")
+    return img.getpixel((img.width // 2, img.height // 2))
+
+def _indice_color(color):
+    """Índice del color de COLORES más cercano (la recompresión JPEG mueve un poco los valores)."""
+    return min(range(len(COLORES)), key=lambda i: sum((a - b) ** 2 for a, b in zip(color, COLORES[i])))
+
+@pytest.mark.parametrize("procesos,streaming", [(1, False), (2, False), (2, True), (3, True)])
+def test_orden_de_paginas(imagenes, tmp_path, procesos, streaming):
+    # a la inversa, para que el orden no coincida con el de creación de los archivos
+    rutas = list(reversed(imagenes))
+    salida = str(tmp_path / "salida.pdf")
+    assert generar_documento(rutas, salida, procesos=procesos, streaming=streaming) == []
+    paginas = PdfReader(salida).pages
+    assert len(paginas) == len(rutas)
+    esperado = list(reversed(range(len(COLORES))))
+    assert [_indice_color(_color_pagina(p)) for p in paginas] == esperado
+
+def test_error_por_archivo_no_cambia_el_orden(imagenes, tmp_path):
+    roto = tmp_path / "roto.jpg"
+    roto.write_bytes(b"no es una imagen")
+    rutas = imagenes[:2] + [str(roto)] + imagenes[2:4]
+    salida = str(tmp_path / "salida.pdf")
+    errores = generar_documento(rutas, salida, procesos=2)
+    assert [r for r, _ in errores] == [str(roto)]
+    paginas = PdfReader(salida).pages
+    assert [_indice_color(_color_pagina(p)) for p in paginas] == [0, 1, 2, 3]
+
+@pytest.mark.parametrize("bloqueos", [
+    {},                                                    # todo bloqueado
+    {"print_highres": False, "print_lowres": False},      # sólo imprimir
+    {"extract": False, "modify_annotation": False},
+])
+def test_permisos_de_generar_documento(imagenes, tmp_path, bloqueos):
+    salida = str(tmp_path / "salida.pdf")
+    assert generar_documento(imagenes[:2], salida, bloqueos=bloqueos) == []
+    lector = PdfReader(salida)
+    assert lector.is_encrypted
+    lector.decrypt("")
+    assert len(lector.pages) == 2
+    p = int(lector.trailer["/Encrypt"]["/P"]) % 2**32
+    assert p == permisos_pdf(bloqueos)
+    # bits de /P (ISO 32000, tabla 22): 3 imprimir, 5 extraer, 6 anotar; 10 siempre concedido
+    assert bool(p & 1 << 2) == (bloqueos.get("print_lowres") is False or bloqueos.get("print_highres") is False)
+    assert bool(p & 1 << 4) == (bloqueos.get("extract") is False)
+    assert bool(p & 1 << 5) == (bloqueos.get("modify_annotation") is False)
+    assert p & 1 << 9
+
+def _meta(ruta, sha256):
+    st = os.stat(ruta)
+    return {"tamano": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256}
+
+def test_duplicados_con_metadatos_caducados(tmp_path):
+    # b era una copia de a cuando se abrió el proyecto; después se volvió a escanear
+    a = crear_imagen(tmp_path / "a.bmp", COLORES[0], formato="BMP")
+    b = crear_imagen(tmp_path / "b.bmp", COLORES[1], formato="BMP")
+    metadatos = [_meta(a, hash_archivo(a)), _meta(b, hash_archivo(a))]
+    assert buscar_duplicados([a, b], metadatos) == [None, 0]
+    st = os.stat(b)
+    os.utime(b, ns=(st.st_atime_ns, st.st_mtime_ns + 5 * 10**9))
+    assert buscar_duplicados([a, b], metadatos) == [None, None]
+    salida = str(tmp_path / "salida.pdf")
+    assert generar_documento([a, b], salida, metadatos=metadatos) == []
+    assert [_indice_color(_color_pagina(p)) for p in PdfReader(salida).pages] == [0, 1]
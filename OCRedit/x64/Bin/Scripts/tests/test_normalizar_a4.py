@@ -0,0 +1,127 @@
+"""MotorPDF.normalizar_pagina_a4: contenido y anotaciones con /Rotate, CropBox desplazada y A4."""
+import io
+
+import pytest
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (ArrayObject, DecodedStreamObject, DictionaryObject, FloatObject,
+                           NameObject, RectangleObject)
+
+from MotorPDF import A4_HEIGHT_PT, A4_WIDTH_PT, generar_documento, normalizar_pagina_a4
+
+MARCA = 30  # lado del cuadrado dibujado en la esquina inferior izquierda de la CropBox
+
+def _array(valores):
+    return ArrayObject(FloatObject(v) for v in valores)
+
+def _pdf(tmp_path, ancho, alto, rotacion=0, recorte=None):
+    """
+    PDF de una página con un cuadrado negro en la esquina inferior izquierda de lo
+    visible sin girar y, encima, un enlace (con /QuadPoints) y una nota con apariencia.
+    """
+    x0, y0 = recorte[:2] if recorte else (0, 0)
+    writer = PdfWriter()
+    page = writer.add_blank_page(ancho, alto)
+    contenido = DecodedStreamObject()
+    contenido.set_data(f"0 g {x0} {y0} {MARCA} {MARCA} re f".encode("ascii"))
+    page[NameObject("/Contents")] = writer._add_object(contenido)
+    if rotacion:
+        page[NameObject("/Rotate")] = FloatObject(rotacion)
+    if recorte:
+        page.cropbox = RectangleObject(recorte)
+    rect = [x0, y0, x0 + MARCA, y0 + MARCA]
+    apariencia = DecodedStreamObject()
+    apariencia.set_data(f"1 0 0 rg 0 0 {MARCA} {MARCA // 2} re f".encode("ascii"))
+    apariencia.update({
+        NameObject("/Type"): NameObject("/XObject"), NameObject("/Subtype"): NameObject("/Form"),
+        NameObject("/BBox"): _array([0, 0, MARCA, MARCA // 2]),
+    })
+    enlace = DictionaryObject({
+        NameObject("/Type"): NameObject("/Annot"), NameObject("/Subtype"): NameObject("/Link"),
+        NameObject("/Rect"): _array(rect),
+        NameObject("/QuadPoints"): _array([rect[0], rect[3], rect[2], rect[3],
+                                           rect[0], rect[1], rect[2], rect[1]]),
+    })
+    nota = DictionaryObject({
+        NameObject("/Type"): NameObject("/Annot"), NameObject("/Subtype"): NameObject("/Square"),
+        NameObject("/Rect"): _array([rect[0], rect[1], rect[2], rect[1] + MARCA // 2]),
+        NameObject("/AP"): DictionaryObject({NameObject("/N"): writer._add_object(apariencia)}),
+    })
+    page[NameObject("/Annots")] = ArrayObject([writer._add_object(enlace), writer._add_object(nota)])
+    ruta = tmp_path / f"entrada_{rotacion}.pdf"
+    with open(ruta, "wb") as f:
+        writer.write(f)
+    return str(ruta)
+
+def _matriz(page):
+    """Matriz 'cm' con la que la página normalizada dibuja el contenido original."""
+    return [float(v) for v in page.get_contents().get_data().split()[1:7]]
+
+def _caja(m, x0, y0, x1, y1):
+    a, b, c, d, e, f = m
+    xs, ys = zip(*[(a * x + c * y + e, b * x + d * y + f) for x, y in ((x0, y0), (x1, y1))])
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+def _rect(annot):
+    return [float(v) for v in annot["/Rect"]]
+
+# esquina de la página A4 normalizada en la que acaba la marca (giro horario)
+ESQUINAS = {0: ("izquierda", "abajo"), 90: ("izquierda", "arriba"),
+            180: ("derecha", "arriba"), 270: ("derecha", "abajo")}
+
+@pytest.mark.parametrize("rotacion", [0, 90, 180, 270])
+def test_anotaciones_siguen_al_contenido(tmp_path, rotacion):
+    page = PdfReader(_pdf(tmp_path, 300, 400, rotacion)).pages[0]
+    normalizar_pagina_a4(page)
+    assert "/Rotate" not in page
+    enlace, nota = (a.get_object() for a in page["/Annots"])
+    marca = _caja(_matriz(page), 0, 0, MARCA, MARCA)
+    assert _rect(enlace) == pytest.approx(marca, abs=0.05)
+    # los cuatro puntos de /QuadPoints son las esquinas del mismo rectángulo
+    quad = [float(v) for v in enlace["/QuadPoints"]]
+    esquinas = sorted((x, y) for x in marca[0::2] for y in marca[1::2])
+    for punto, esquina in zip(sorted(zip(quad[0::2], quad[1::2])), esquinas):
+        assert punto == pytest.approx(esquina, abs=0.05)
+    # la marca está en la esquina que le toca al girar la página
+    horizontal, vertical = ESQUINAS[rotacion]
+    vis_w, vis_h = (400, 300) if rotacion in (90, 270) else (300, 400)
+    escala = min(A4_WIDTH_PT / vis_w, A4_HEIGHT_PT / vis_h)
+    izquierda = (A4_WIDTH_PT - vis_w * escala) / 2
+    abajo = (A4_HEIGHT_PT - vis_h * escala) / 2
+    x = izquierda if horizontal == "izquierda" else izquierda + (vis_w - MARCA) * escala
+    y = abajo if vertical == "abajo" else abajo + (vis_h - MARCA) * escala
+    assert marca[:2] == pytest.approx([x, y], abs=0.05)
+    # la apariencia de la nota gira con la página: su caja cambia de forma si gira 90 o 270
+    ap = nota["/AP"]["/N"].get_object()
+    x0, y0, x1, y1 = [float(v) for v in ap["/BBox"]]
+    ancho, alto = (MARCA // 2, MARCA) if rotacion in (90, 270) else (MARCA, MARCA // 2)
+    assert (x1 - x0, y1 - y0) == pytest.approx((ancho, alto))
+    assert (_rect(nota)[2] - _rect(nota)[0]) / (_rect(nota)[3] - _rect(nota)[1]) == pytest.approx(ancho / alto, rel=1e-4)
+
+def test_cropbox_desplazada(tmp_path):
+    page = PdfReader(_pdf(tmp_path, 600, 800, recorte=[100, 150, 400, 550])).pages[0]
+    normalizar_pagina_a4(page)
+    escala = min(A4_WIDTH_PT / 300, A4_HEIGHT_PT / 400)
+    abajo = (A4_HEIGHT_PT - 400 * escala) / 2
+    esperado = [0, abajo, MARCA * escala, abajo + MARCA * escala]
+    enlace = page["/Annots"][0].get_object()
+    assert _caja(_matriz(page), 100, 150, 100 + MARCA, 150 + MARCA) == pytest.approx(esperado, abs=0.05)
+    assert _rect(enlace) == pytest.approx(esperado, abs=0.05)
+    assert [float(v) for v in page.cropbox] == pytest.approx([0, 0, A4_WIDTH_PT, A4_HEIGHT_PT])
+
+def test_pagina_a4_no_cambia(tmp_path):
+    page = PdfReader(_pdf(tmp_path, A4_WIDTH_PT, A4_HEIGHT_PT)).pages[0]
+    contenido = page.get_contents().get_data()
+    assert normalizar_pagina_a4(page) is page
+    assert page.get_contents().get_data() == contenido
+    assert _rect(page["/Annots"][0].get_object()) == [0, 0, MARCA, MARCA]
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_anotaciones_en_el_documento(tmp_path, streaming):
+    salida = str(tmp_path / "salida.pdf")
+    assert generar_documento([_pdf(tmp_path, 300, 400, 90)], salida, streaming=streaming) == []
+    page = PdfReader(salida).pages[0]
+    enlace, nota = (a.get_object() for a in page["/Annots"])
+    assert _rect(enlace) == pytest.approx(_caja(_matriz(page), 0, 0, MARCA, MARCA), abs=0.05)
+    ap = nota["/AP"]["/N"].get_object()
+    assert "/OCRAp0" in ap["/Resources"]["/XObject"]
+    assert io.BytesIO(ap.get_data()).read().endswith(b"/OCRAp0 Do Q")
@@ -0,0 +1,117 @@
+"""Proyectos: guardar y cargar proyectos .json (metadatos reutilizados o renovados) y .txt."""
+import json
+import os
+
+from PIL import Image
+from pypdf import PdfReader
+
+from conftest import crear_imagen
+from MotorPDF import generar_documento, metadatos_vigentes
+from Proyectos import cargar_proyecto, guardar_proyecto, hash_archivo
+
+def _tocar(ruta, segundos):
+    """Cambia el mtime del archivo sin cambiar su contenido."""
+    st = os.stat(ruta)
+    os.utime(ruta, ns=(st.st_atime_ns, st.st_mtime_ns + int(segundos * 1e9)))
+
+def test_ida_y_vuelta(imagenes, tmp_path):
+    proyecto = str(tmp_path / "proyecto.json")
+    guardadas = guardar_proyecto(proyecto, imagenes)
+    entradas, errores = cargar_proyecto(proyecto)
+    assert errores == []
+    assert [e["ruta"] for e in entradas] == imagenes
+    assert entradas == guardadas
+    primera = entradas[0]
+    assert (primera["ancho"], primera["alto"], primera["paginas"]) == (120, 160, 1)
+    assert primera["sha256"] == hash_archivo(imagenes[0])
+
+def test_metadatos_vigentes_se_reutilizan(imagenes, tmp_path):
+    proyecto = str(tmp_path / "proyecto.json")
+    guardar_proyecto(proyecto, imagenes[:2])
+    # un valor guardado que no coincide con el archivo: si se reutiliza, no se sondeó
+    with open(proyecto, encoding="utf-8") as f:
+        datos = json.load(f)
+    datos["entradas"][0]["ancho"] = 999
+    with open(proyecto, "w", encoding="utf-8") as f:
+        json.dump(datos, f)
+    entradas, _ = cargar_proyecto(proyecto)
+    assert entradas[0]["ancho"] == 999
+
+def test_metadatos_caducados_se_sondean(imagenes, tmp_path):
+    proyecto = str(tmp_path / "proyecto.json")
+    guardar_proyecto(proyecto, imagenes[:3])
+    # el segundo cambia de contenido y tamaño; el tercero sólo de mtime
+    crear_imagen(imagenes[1], (0, 0, 0), tamano=(300, 200))
+    _tocar(imagenes[2], 5)
+    with open(proyecto, encoding="utf-8") as f:
+        datos = json.load(f)
+    datos["entradas"][2]["ancho"] = 999
+    with open(proyecto, "w", encoding="utf-8") as f:
+        json.dump(datos, f)
+    entradas, errores = cargar_proyecto(proyecto)
+    assert errores == []
+    segunda, tercera = entradas[1], entradas[2]
+    assert (segunda["ancho"], segunda["alto"]) == (300, 200)
+    assert segunda["tamano"] == os.path.getsize(imagenes[1])
+    assert segunda["sha256"] == hash_archivo(imagenes[1])
+    assert tercera["ancho"] == 120
+    assert tercera["mtime_ns"] == os.stat(imagenes[2]).st_mtime_ns
+
+def test_guardar_reutiliza_previos_vigentes(imagenes, tmp_path):
+    proyecto = str(tmp_path / "proyecto.json")
+    previos = {e["ruta"]: e for e in guardar_proyecto(proyecto, imagenes[:2])}
+    previos[imagenes[0]] = dict(previos[imagenes[0]], ancho=999)
+    previos[imagenes[1]] = dict(previos[imagenes[1]], ancho=999)
+    _tocar(imagenes[1], 5)
+    entradas = guardar_proyecto(proyecto, imagenes[:2], previos=previos)
+    assert [e["ancho"] for e in entradas] == [999, 120]
+
+def test_archivos_que_faltan(imagenes, tmp_path):
+    proyecto = str(tmp_path / "proyecto.json")
+    guardar_proyecto(proyecto, imagenes[:3])
+    os.remove(imagenes[1])
+    entradas, errores = cargar_proyecto(proyecto)
+    assert [e["ruta"] for e in entradas] == [imagenes[0], imagenes[2]]
+    assert errores == [(2, imagenes[1])]
+
+def test_proyecto_txt_con_carpeta_y_patron(imagenes, tmp_path):
+    sub = tmp_path / "sub"
+    sub.mkdir()
+    extra = [crear_imagen(sub / f"p{i}.png", (10 * i, 0, 0)) for i in (2, 1)]
+    proyecto = tmp_path / "proyecto.txt"
+    proyecto.write_text(f"# comentario\n{imagenes[0]}\n{sub}\n{tmp_path / 'img_[45].jpg'}\nno_existe.jpg\n",
+                        encoding="utf-8")
+    entradas, errores = cargar_proyecto(str(proyecto))
+    assert [e["ruta"] for e in entradas] == [imagenes[0]] + sorted(extra) + imagenes[4:6]
+    assert errores == [(5, "no_existe.jpg")]
+
+# --- Metadatos caducados al generar ---
+def _tiff(ruta, fotogramas):
+    paginas = [Image.new("RGB", (80, 100), (40 * i, 0, 0)) for i in range(fotogramas)]
+    paginas[0].save(ruta, save_all=True, append_images=paginas[1:])
+    return str(ruta)
+
+def test_generar_no_usa_metadatos_caducados(tmp_path):
+    tiff = _tiff(tmp_path / "escaneo.tif", 3)
+    proyecto = str(tmp_path / "proyecto.json")
+    guardar_proyecto(proyecto, [tiff])
+    entradas, _ = cargar_proyecto(proyecto)
+    assert entradas[0]["paginas"] == 3
+    # se vuelve a escanear después de abrir el proyecto: ahora tiene una página
+    _tiff(tiff, 1)
+    _tocar(tiff, 5)
+    salida = str(tmp_path / "salida.pdf")
+    assert generar_documento([tiff], salida, metadatos=entradas) == []
+    assert len(PdfReader(salida).pages) == 1
+
+def test_metadatos_vigentes(imagenes, tmp_path):
+    proyecto = str(tmp_path / "proyecto.json")
+    guardar_proyecto(proyecto, imagenes[:3])
+    entradas, _ = cargar_proyecto(proyecto)
+    _tocar(imagenes[1], 5)
+    os.remove(imagenes[2])
+    comprobados = metadatos_vigentes(imagenes[:3], entradas)
+    assert comprobados[0] is entradas[0]
+    assert comprobados[1] is None and comprobados[2] is None
+    # una lista ya comprobada no se vuelve a comprobar
+    assert metadatos_vigentes(imagenes[:3], comprobados) is comprobados
@@ -0,0 +1,131 @@
+"""Vigilancia.Vigilante: archivos estables, documentos por carpeta y reintentos de escritura."""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from pypdf import PdfReader
+
+import Vigilancia
+from conftest import COLORES, crear_imagen
+from Vigilancia import ESCRIBIENDOSE, Vigilante
+
+@pytest.fixture
+def entrada(tmp_path):
+    """Carpeta vigilada con un documento en una subcarpeta y un archivo suelto."""
+    carpeta = tmp_path / "escaner"
+    (carpeta / "expediente").mkdir(parents=True)
+    crear_imagen(carpeta / "expediente" / "pagina_10.jpg", COLORES[1])
+    crear_imagen(carpeta / "expediente" / "pagina_2.jpg", COLORES[0])
+    crear_imagen(carpeta / "suelta.png", COLORES[2])
+    return carpeta
+
+def _vigilante(tmp_path, carpeta, **opciones):
+    avisos = []
+    vigilante = Vigilante([str(carpeta)], str(tmp_path / "pdf"), estable=0, intervalo=0.05,
+                          procesos=1, dir_cache=str(tmp_path / "cache"), aviso=avisos.append,
+                          **opciones)
+    return vigilante, avisos
+
+def _en_segundo_plano(vigilante, hasta, limite_s=20):
+    """Ejecuta el vigilante en un hilo hasta que hasta() sea cierto y lo detiene."""
+    hilo = threading.Thread(target=vigilante.ejecutar)
+    hilo.start()
+    try:
+        final = time.monotonic() + limite_s
+        while not hasta() and time.monotonic() < final:
+            time.sleep(0.05)
+    finally:
+        vigilante.detener()
+        hilo.join()
+    assert hasta()
+
+def test_un_documento_por_carpeta(tmp_path, entrada):
+    (entrada / "expediente" / "rota.jpg").write_bytes(b"no es una imagen")
+    vigilante, _ = _vigilante(tmp_path, entrada)
+    assert vigilante.ejecutar(una_vez=True) == 2
+    expediente = PdfReader(str(tmp_path / "pdf" / "expediente.pdf"))
+    # orden natural: pagina_2 antes que pagina_10
+    primera = expediente.pages[0].images[0].image.convert("RGB")
+    assert len(expediente.pages) == 2 and primera.getpixel((60, 80))[1] < 128  # COLORES[0], no el verde
+    assert len(PdfReader(str(tmp_path / "pdf" / "escaner.pdf")).pages) == 1
+    # los originales salen de la carpeta vigilada; el roto va a _errores
+    assert sorted(os.listdir(entrada / "_procesados" / "expediente")) == ["pagina_10.jpg", "pagina_2.jpg"]
+    assert sorted(os.listdir(entrada / "_procesados")) == ["expediente", "suelta.png"]
+    assert os.listdir(entrada / "_errores" / "expediente") == ["rota.jpg"]
+    assert sorted(os.listdir(entrada)) == ["_errores", "_procesados", "expediente"]
+
+def test_espera_a_que_el_archivo_deje_de_cambiar(tmp_path):
+    carpeta = tmp_path / "escaner"
+    carpeta.mkdir()
+    ruta = crear_imagen(carpeta / "pagina.jpg", COLORES[0])
+    vacio = carpeta / "vacio.jpg"
+    vacio.write_bytes(b"")
+    vigilante, _ = _vigilante(tmp_path, carpeta)
+    vigilante.estable = 0.5
+    vigilante._pool = ThreadPoolExecutor(max_workers=1)
+    try:
+        vigilante.pasada()
+        archivo = vigilante._archivos[ruta]
+        assert archivo["estado"] == ESCRIBIENDOSE
+        # el escáner sigue escribiendo: el plazo vuelve a empezar
+        time.sleep(0.2)
+        with open(ruta, "ab") as f:
+            f.write(b"\0" * 100)
+        vigilante.pasada()
+        assert archivo["estado"] == ESCRIBIENDOSE and archivo["version"] == 1
+        time.sleep(0.3)
+        vigilante.pasada()  # 0.5 s desde que apareció, pero sólo 0.3 desde el cambio
+        assert archivo["estado"] == ESCRIBIENDOSE
+        time.sleep(0.3)
+        vigilante.pasada()
+        assert archivo["estado"] != ESCRIBIENDOSE
+        # un archivo vacío nunca está terminado (salvo al vaciar la carpeta)
+        assert vigilante._archivos[str(vacio)]["estado"] == ESCRIBIENDOSE
+    finally:
+        vigilante._pool.shutdown(wait=True)
+
+def _fallar(veces, monkeypatch):
+    """generar_documento falla las primeras 'veces' llamadas, como una unidad de red caída."""
+    llamadas = []
+    original = Vigilancia.generar_documento
+
+    def generar(*args, **kwargs):
+        llamadas.append(args[1])
+        if len(llamadas) <= veces:
+            raise OSError("network path not found")
+        return original(*args, **kwargs)
+    monkeypatch.setattr(Vigilancia, "generar_documento", generar)
+    monkeypatch.setattr(Vigilancia, "ESPERA_REINTENTO_S", 0.05)
+    return llamadas
+
+def test_reintenta_hasta_escribir(tmp_path, entrada, monkeypatch):
+    llamadas = _fallar(2, monkeypatch)
+    vigilante, avisos = _vigilante(tmp_path, entrada, agrupar="lote", inactividad=0, intentos=5)
+    _en_segundo_plano(vigilante, lambda: vigilante.documentos == 1)
+    assert len(llamadas) == 3
+    assert [a for a in avisos if "attempt" in a] == [
+        "Error: escaner: network path not found (attempt 1 of 5, will retry)",
+        "Error: escaner: network path not found (attempt 2 of 5, will retry)",
+    ]
+    (pdf,) = os.listdir(tmp_path / "pdf")
+    assert len(PdfReader(str(tmp_path / "pdf" / pdf)).pages) == 3
+    assert not os.path.exists(entrada / "_errores")
+
+def test_se_rinde_tras_los_intentos(tmp_path, entrada, monkeypatch):
+    llamadas = _fallar(99, monkeypatch)
+    vigilante, avisos = _vigilante(tmp_path, entrada, agrupar="lote", inactividad=0, intentos=2)
+    _en_segundo_plano(vigilante, lambda: os.path.exists(entrada / "_errores" / "suelta.png"))
+    assert len(llamadas) == 2 and vigilante.documentos == 0
+    assert any("giving up after 2 attempts" in a for a in avisos)
+    assert sorted(os.listdir(entrada / "_errores" / "expediente")) == ["pagina_10.jpg", "pagina_2.jpg"]
+
+def test_una_vez_no_reintenta(tmp_path, entrada, monkeypatch):
+    llamadas = _fallar(99, monkeypatch)
+    vigilante, avisos = _vigilante(tmp_path, entrada, agrupar="lote")
+    assert vigilante.ejecutar(una_vez=True) == 0
+    assert len(llamadas) == 1
+    assert any("left in the folder" in a for a in avisos)
+    # nada se mueve: la próxima ejecución los vuelve a tomar
+    assert sorted(os.listdir(entrada)) == ["expediente", "suelta.png"]
@@ -0,0 +1,89 @@
+"""MotorPDF.generar_volumenes: reparto en volúmenes, todo o nada al fallar o cancelar, y linealización."""
+import multiprocessing
+import os
+import threading
+
+import pytest
+from pypdf import PdfReader
+
+import MotorPDF
+from MotorPDF import (TrabajoCancelado, _generar_volumen, generar_volumenes, opciones_conversion,
+                      planificar_volumenes)
+
+def test_planificar_por_paginas_y_bytes():
+    assert planificar_volumenes([1, 1, 1, 1, 1], paginas_volumen=2) == [[0, 1], [2, 3], [4]]
+    # una entrada de varias páginas no se parte: si no cabe sola, va sola
+    assert planificar_volumenes([1, 5, 1, 1], paginas_volumen=3) == [[0], [1], [2, 3]]
+    tamanos = [40_000, 40_000, 200_000, 10_000]
+    assert planificar_volumenes([1] * 4, tamanos, bytes_volumen=100_000) == [[0, 1], [2], [3]]
+    assert planificar_volumenes([1] * 4, tamanos, paginas_volumen=1, bytes_volumen=10**9) == [[0], [1], [2], [3]]
+
+@pytest.mark.parametrize("procesos", [1, 2])
+def test_volumenes_por_paginas(imagenes, tmp_path, procesos):
+    salida = str(tmp_path / "salida.pdf")
+    estadisticas = {}
+    assert generar_volumenes(imagenes, salida, paginas_volumen=4, procesos=procesos,
+                             estadisticas=estadisticas) == []
+    volumenes = [str(tmp_path / "salida_001.pdf"), str(tmp_path / "salida_002.pdf")]
+    assert estadisticas["volumenes"] == volumenes
+    assert [len(PdfReader(v).pages) for v in volumenes] == [4, 2]
+    assert not os.path.exists(salida)
+
+def test_volumenes_por_bytes(imagenes, tmp_path):
+    salida = str(tmp_path / "salida.pdf")
+    estadisticas = {}
+    tamano = os.path.getsize(imagenes[0])
+    assert generar_volumenes(imagenes, salida, bytes_volumen=MotorPDF.SOBRECARGA_DOCUMENTO + 3 * (
+        tamano + MotorPDF.SOBRECARGA_PAGINA), estadisticas=estadisticas) == []
+    assert len(estadisticas["volumenes"]) >= 2
+    assert sum(len(PdfReader(v).pages) for v in estadisticas["volumenes"]) == len(imagenes)
+
+def test_un_solo_volumen_usa_la_ruta_pedida(imagenes, tmp_path):
+    salida = str(tmp_path / "salida.pdf")
+    estadisticas = {}
+    generar_volumenes(imagenes[:2], salida, paginas_volumen=10, estadisticas=estadisticas)
+    assert estadisticas["volumenes"] == [salida] and os.path.exists(salida)
+
+def test_fallo_de_un_volumen_borra_los_escritos(imagenes, tmp_path, monkeypatch):
+    original = MotorPDF.generar_documento
+
+    def generar(rutas, ruta_pdf, **kwargs):
+        if ruta_pdf.endswith("_002.pdf"):
+            raise OSError("disk full")
+        return original(rutas, ruta_pdf, **kwargs)
+    monkeypatch.setattr(MotorPDF, "generar_documento", generar)
+    salida = tmp_path / "salida"
+    salida.mkdir()
+    with pytest.raises(OSError):
+        generar_volumenes(imagenes, str(salida / "salida.pdf"), paginas_volumen=2)
+    assert os.listdir(salida) == []
+
+def test_cancelar_en_el_pool(imagenes, tmp_path):
+    cancelar = threading.Event()
+    salida = tmp_path / "salida"
+    salida.mkdir()
+    with pytest.raises(TrabajoCancelado):
+        # se cancela al terminar el primer volumen; los demás se detienen o se borran
+        generar_volumenes(imagenes * 4, str(salida / "salida.pdf"), paginas_volumen=4, procesos=2,
+                          progreso=lambda _: cancelar.set(), cancelar=cancelar)
+    assert os.listdir(salida) == []
+
+def test_el_volumen_atiende_al_event_de_otro_proceso(imagenes, tmp_path):
+    parametros = dict(opciones=opciones_conversion(), cache=None, bloqueos=None, compactar=True,
+                      streaming=True, linealizar=False)
+    with multiprocessing.Manager() as gestor:
+        parada = gestor.Event()
+        parada.set()
+        with pytest.raises(TrabajoCancelado):
+            _generar_volumen(imagenes, str(tmp_path / "volumen.pdf"), None, parametros, parada)
+    assert not [n for n in os.listdir(tmp_path) if n.startswith("volumen")]
+
+def test_volumenes_linealizados(imagenes, tmp_path):
+    pikepdf = pytest.importorskip("pikepdf")
+    estadisticas = {}
+    generar_volumenes(imagenes, str(tmp_path / "salida.pdf"), paginas_volumen=3, linealizar=True,
+                      bloqueos={}, estadisticas=estadisticas)
+    assert len(estadisticas["volumenes"]) == 2
+    for volumen in estadisticas["volumenes"]:
+        with pikepdf.open(volumen) as pdf:
+            assert pdf.is_linearized and pdf.is_encrypted and len(pdf.pages) == 3